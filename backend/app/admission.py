@@ -0,0 +1,263 @@
+"""
+CityPulse Admission Control
+Gate in front of POST /reports that decides, before the multipart body is read, whether
+this worker can take another report right now.
+
+- in-flight intakes are capped (ADMISSION_MAX_INFLIGHT), and so are the upload bytes they
+  may buffer (ADMISSION_UPLOAD_MEMORY_BYTES, reserved from Content-Length)
+- a request that does not fit waits in a CoDel-style queue: while the queue keeps draining
+  it may wait up to ADMISSION_CODEL_INTERVAL_MS, but once the queue has not been empty for
+  a whole interval (a standing backlog) new arrivals only get ADMISSION_CODEL_TARGET_MS.
+  Requests that run out of time get 503 with Retry-After, so queueing delay stays bounded
+  instead of growing with the backlog
+- recent pipeline latency (EWMA over inline requests and queued enrichments) sizes
+  Retry-After, and above ADMISSION_DEFER_LATENCY_SECONDS new reports are stored right away
+  and classified later by app.enrichment (202 Accepted) instead of holding an intake slot
+  for the whole AI call
+
+Limits are per worker process.
+"""
+import asyncio
+import json
+import logging
+import math
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from typing import Callable, Deque, Optional, Tuple
+
+from app.config import get_settings
+from app.validators import MAX_IMAGE_SIZE_BYTES, MAX_IMAGES
+
+logger = logging.getLogger(__name__)
+
+# Reserved for a request without Content-Length: the largest upload validate_images accepts.
+_UNKNOWN_LENGTH_BYTES = MAX_IMAGES * MAX_IMAGE_SIZE_BYTES
+_LATENCY_ALPHA = 0.2
+_MAX_RETRY_AFTER_SECONDS = 60
+
+
+class Admission:
+    """
+    Intake slots and upload bytes for one worker, handed out through a CoDel-style queue.
+
+    Slot accounting runs on the event loop; `record_latency` may be called from any thread.
+    """
+
+    def __init__(
+        self,
+        max_inflight: int,
+        max_waiting: int,
+        memory_bytes: int,
+        target: float,
+        interval: float,
+        defer_latency: float = 0.0,
+        max_deferred: int = 0,
+    ):
+        self.max_inflight = max_inflight
+        self.max_waiting = max_waiting
+        self.memory_bytes = memory_bytes
+        self.target = target
+        self.interval = interval
+        self.defer_latency = defer_latency
+        self.max_deferred = max_deferred
+        self.inflight = 0
+        self.reserved = 0
+        self._waiters: Deque[Tuple[asyncio.Future, int]] = deque()
+        self._last_empty = time.monotonic()
+        self._latency = 0.0
+        self._latency_lock = threading.Lock()
+
+    # ---- pipeline latency ----
+
+    @property
+    def latency(self) -> float:
+        return self._latency
+
+    def record_latency(self, seconds: float) -> None:
+        with self._latency_lock:
+            self._latency = seconds if self._latency == 0.0 else (
+                _LATENCY_ALPHA * seconds + (1 - _LATENCY_ALPHA) * self._latency
+            )
+
+    def retry_after(self) -> int:
+        """Seconds a rejected client should wait: about one pipeline run, at least 1."""
+        return min(_MAX_RETRY_AFTER_SECONDS, max(1, math.ceil(self._latency)))
+
+    def should_defer(self, deferred: int) -> Optional[bool]:
+        """
+        True to store the report now and classify it later, False to run the AI inline,
+        None to reject because the enrichment backlog is full as well.
+        """
+        if self.defer_latency <= 0 or self._latency < self.defer_latency:
+            return False
+        return True if deferred < self.max_deferred else None
+
+    # ---- slots ----
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def _fits(self, size: int) -> bool:
+        # An upload bigger than the whole budget is admitted once the worker is idle.
+        return self.inflight < self.max_inflight and (
+            self.reserved + size <= self.memory_bytes or self.inflight == 0
+        )
+
+    def _take(self, size: int) -> None:
+        self.inflight += 1
+        self.reserved += size
+
+    def _wait_budget(self) -> float:
+        # CoDel's signal: a queue that has not emptied for a whole interval is a standing
+        # backlog, not a burst, so only a short wait is worth offering.
+        if time.monotonic() - self._last_empty > self.interval:
+            return self.target
+        return self.interval
+
+    async def acquire(self, size: int) -> bool:
+        """Take a slot for an upload of `size` bytes; False if none freed up in time."""
+        if not self._waiters and self._fits(size):
+            self._take(size)
+            return True
+        if len(self._waiters) >= self.max_waiting:
+            return False
+        if not self._waiters:
+            self._last_empty = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        entry = (future, size)
+        self._waiters.append(entry)
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=self._wait_budget())
+            return True
+        except asyncio.TimeoutError:
+            if future.done():
+                return True  # handed a slot just as the wait ran out
+            self._waiters.remove(entry)
+            future.cancel()
+            self._wake()
+            return False
+        except asyncio.CancelledError:
+            if future.done():
+                self.release(size)
+            else:
+                self._waiters.remove(entry)
+                future.cancel()
+            raise
+
+    def release(self, size: int) -> None:
+        self.inflight -= 1
+        self.reserved -= size
+        self._wake()
+
+    def _wake(self) -> None:
+        # FIFO: the head gets the next slot that fits it, later arrivals do not overtake it.
+        while self._waiters and self._fits(self._waiters[0][1]):
+            future, size = self._waiters.popleft()
+            self._take(size)
+            future.set_result(None)
+        if not self._waiters:
+            self._last_empty = time.monotonic()
+
+
+def _content_length(scope) -> int:
+    for name, value in scope.get("headers", ()):
+        if name == b"content-length":
+            try:
+                return max(0, int(value))
+            except ValueError:
+                break
+    return _UNKNOWN_LENGTH_BYTES
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware applying `Admission` to POST `path`.
+
+    It answers 503 before calling the app, so the upload is never read; clients sending
+    `Expect: 100-continue` do not even transmit it. An admitted request whose report should
+    be classified later gets `request.state.defer_enrichment = True`; `backlog` reports how
+    many such reports are still waiting for their classification. The endpoint sets
+    `request.state.pipeline_seconds` when it ran the AI pipeline inline, which feeds the
+    latency signal.
+    """
+
+    def __init__(
+        self,
+        app,
+        path: str = "/reports",
+        backlog: Callable[[], int] = lambda: 0,
+        admission: Optional[Admission] = None,
+    ):
+        self.app = app
+        self.path = path
+        self.backlog = backlog
+        self._admission = admission
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] != self.path:
+            await self.app(scope, receive, send)
+            return
+        admission = self._admission or get_admission()
+        if admission is None:
+            await self.app(scope, receive, send)
+            return
+
+        size = _content_length(scope)
+        if not await admission.acquire(size):
+            logger.warning(
+                "Rejected report intake: %d in flight, %d waiting, %d bytes buffered",
+                admission.inflight, admission.waiting, admission.reserved,
+            )
+            await _reject(send, admission.retry_after(), "Too many reports are being submitted; retry shortly")
+            return
+
+        state = scope.setdefault("state", {})
+        try:
+            decision = admission.should_defer(self.backlog())
+            if decision is None:
+                await _reject(send, admission.retry_after(), "Report analysis is saturated; retry shortly")
+                return
+            if decision:
+                state["defer_enrichment"] = True
+            await self.app(scope, receive, send)
+        finally:
+            admission.release(size)
+            # Only requests that ran the AI inline say anything about pipeline latency;
+            # replays, validation errors and rejects would drag the average towards 0.
+            seconds = state.get("pipeline_seconds")
+            if seconds is not None:
+                admission.record_latency(seconds)
+
+
+async def _reject(send, retry_after: int, detail: str) -> None:
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": 503,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(retry_after).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+@lru_cache
+def get_admission() -> Optional[Admission]:
+    """This worker's admission state, or None when ADMISSION_MAX_INFLIGHT is 0."""
+    settings = get_settings()
+    if settings.admission_max_inflight <= 0:
+        return None
+    return Admission(
+        max_inflight=settings.admission_max_inflight,
+        max_waiting=settings.admission_max_waiting,
+        memory_bytes=settings.admission_upload_memory_bytes,
+        target=settings.admission_codel_target_ms / 1000,
+        interval=settings.admission_codel_interval_ms / 1000,
+        defer_latency=settings.admission_defer_latency_seconds,
+        max_deferred=settings.admission_max_deferred,
+    )
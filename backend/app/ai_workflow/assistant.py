@@ -5,11 +5,11 @@ will become the brain of the CityPulse application.
 
 import os
 from typing import Optional
-import requests
 from requests import RequestException
 import logging
 logger = logging.getLogger(__name__)
 from app.validators import sanitize_api_key
+from app.ai_workflow.workflow import backboard_url, get_http_session
 from app.schemas import ClassificationEnum, SeverityEnum, PriorityEnum
 
 #TODO: Make sure that timeout= can be used inside the API call
@@ -34,7 +34,7 @@ def create_assistant():
 
     resp = None
     try:
-        resp = requests.post("https://app.backboard.io/api/assistants",
+        resp = get_http_session().post(backboard_url("assistants"),
                       headers={
                           "Content-Type": "application/json",
                           "X-API-Key": api_key
@@ -138,8 +138,8 @@ def create_assistant():
 def _find_existing_assistant_id(api_key: str, name: str) -> Optional[str]:
     resp = None
     try:
-        resp = requests.get(
-            "https://app.backboard.io/api/assistants",
+        resp = get_http_session().get(
+            backboard_url("assistants"),
             headers={
                 "Content-Type": "application/json",
                 "X-API-Key": api_key,
@@ -180,5 +180,30 @@ def _find_existing_assistant_id(api_key: str, name: str) -> Optional[str]:
 
     return None
 
+def validate_assistant(api_key: str, assistant_id: str) -> Optional[bool]:
+    """
+    Check that an assistant id exists on Backboard.
+
+    Returns True or False when Backboard answered, and None when it could not be reached,
+    so callers can tell a stale ASSISTANT_ID apart from a network problem.
+    """
+    resp = None
+    try:
+        resp = get_http_session().get(
+            backboard_url(f"assistants/{assistant_id}"),
+            headers={"X-API-Key": api_key},
+            timeout=30,
+        )
+        if resp.status_code == 404:
+            return False
+        resp.raise_for_status()
+    except RequestException as e:
+        error_msg = f"Error fetching assistant {assistant_id}: {e}"
+        if resp is not None:
+            error_msg += f" | Response: {sanitize_api_key(resp.text, api_key)}"
+        logger.error(error_msg)
+        return None
+    return True
+
 if __name__ == "__main__":
     create_assistant()
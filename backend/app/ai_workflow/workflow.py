@@ -10,17 +10,43 @@ import time
 from requests import RequestException
 import logging
 logger = logging.getLogger(__name__)
+from functools import lru_cache
 from typing import List, Any, Dict, Optional
 from fastapi import UploadFile
+from requests.adapters import HTTPAdapter
+from app.config import get_settings
 from app.validators import sanitize_api_key
 
+DEFAULT_BACKBOARD_HTTP_POOL_SIZE = 10
+
+
+def backboard_url(path: str) -> str:
+    """Build a Backboard API URL; BACKBOARD_API_URL lets benchmarks point at a local simulator."""
+    base = get_settings().backboard_api_url
+    return f"{base.rstrip('/')}/{path.lstrip('/')}"
+
+
+@lru_cache
+def get_http_session() -> requests.Session:
+    """
+    Process-wide HTTP session for Backboard calls, so TCP/TLS connections are kept alive and
+    reused across requests instead of being set up for every call. BACKBOARD_HTTP_POOL_SIZE
+    caps the connections kept open (size it to the number of concurrent AI pipelines).
+    """
+    pool_size = int(os.environ.get("BACKBOARD_HTTP_POOL_SIZE") or DEFAULT_BACKBOARD_HTTP_POOL_SIZE)
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
 #TODO: add polling if necessary
 #TODO: Get Assistant ID and put it in the backboard url
 def create_thread(assistantId: str, api_key: str):
     resp = None
     try:
-        resp = requests.post(
-            f"https://app.backboard.io/api/assistants/{assistantId}/threads",
+        resp = get_http_session().post(
+            backboard_url(f"assistants/{assistantId}/threads"),
             headers={
                 "Content-Type": "application/json",
                 "X-API-Key": api_key
@@ -57,7 +83,7 @@ def create_thread(assistantId: str, api_key: str):
 # TODO: Make sure that Content-Type does not need to be defined and verify if requests lib will automatically set it
 # TODO: Need to finish the last part of the function
 def upload_information_to_thread(api_key: str, threadId: str, description: str, imageFiles: List[UploadFile]):
-    backboardUrl = f"https://app.backboard.io/api/threads/{threadId}/messages"
+    backboardUrl = backboard_url(f"threads/{threadId}/messages")
     headers = {
             # "Content-Type": "multipart/form-data",
             "X-API-Key": api_key
@@ -82,7 +108,7 @@ def upload_information_to_thread(api_key: str, threadId: str, description: str,
 
     resp = None
     try:
-        resp = requests.post(backboardUrl, headers=headers, data=data, files=imagesArray, timeout=30)
+        resp = get_http_session().post(backboardUrl, headers=headers, data=data, files=imagesArray, timeout=30)
         resp.raise_for_status()
         return resp
     except RequestException as e:
@@ -94,14 +120,14 @@ def upload_information_to_thread(api_key: str, threadId: str, description: str,
 
 #TODO: Make sure that the timeout= is necessary in the API call
 def get_assistant_response(api_key: str, threadId: str, max_attempts: int = 8, base_delay: float = 0.5):
-    url = f"https://app.backboard.io/api/threads/{threadId}"
+    url = backboard_url(f"threads/{threadId}")
     headers = {"X-API-Key": api_key}
     timeout = 30
 
     for attempt in range(1, max_attempts + 1):
         resp = None
         try:
-            resp = requests.get(url=url, headers=headers, timeout=timeout)
+            resp = get_http_session().get(url=url, headers=headers, timeout=timeout)
             resp.raise_for_status()
         except RequestException as e:
             error_msg = f"Error getting the thread: {e}"
@@ -170,3 +196,23 @@ def run_backboard_ai(description: str, imageFiles: List[UploadFile]):
         return None, None, {}
 
 
+
+def run_backboard_follow_up(threadId: str, answer: str, imageFiles: List[UploadFile]) -> Dict[str, Any]:
+    """
+    Append a citizen's clarification answer to an existing report thread and return the
+    updated analyze_report result. The assistant already has the original description and
+    images in the thread's context, so only the answer (and any new photos) is sent.
+    """
+    api_key = os.environ.get("BACKBOARD_API_KEY")
+    if not api_key:
+        logger.error("BACKBOARD_API_KEY not found or could not be retrieved")
+        return {}
+
+    try:
+        uploaded_data = upload_information_to_thread(api_key, threadId, answer, imageFiles)
+        if uploaded_data is None:
+            return {}
+        return get_assistant_response(api_key, threadId)
+    except RequestException as e:
+        logger.error(f"Request failure in AI follow-up on thread {threadId}: {e}")
+        return {}
@@ -0,0 +1,193 @@
+"""
+CityPulse Archiver
+Moves resolved reports older than `archive_after_days` (and their events) out of the hot
+issues/issue_events tables into the issues_archive/issue_events_archive cold tier.
+
+On Postgres the cold tables are partitioned by month on creationTime; the archiver creates
+each monthly partition the first time it needs it. Moved batches can also be written to
+zstd-compressed Parquet files (requires pyarrow) for offline analytics.
+
+Each pass also drops the map grid cells whose count has fallen to zero (reports archived,
+deleted or moved away), so the tile queries do not keep scanning empty rows.
+
+    python -m app.archive                       # one pass
+    python -m app.archive --loop --interval 3600
+    python -m app.archive --older-than-days 30 --parquet-dir /var/lib/citypulse/archive
+"""
+import argparse
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, insert, select, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app import geogrid, models, outbox
+from app.config import get_settings
+from app.schemas import ReportStatus
+from app.sharding import get_router
+
+logger = logging.getLogger(__name__)
+
+
+def _shared_columns(hot, cold) -> List[str]:
+    """Columns present in both tables (the hot table also carries triage/lease state)."""
+    cold_names = set(cold.c.keys())
+    return [name for name in hot.c.keys() if name in cold_names]
+
+
+def _month_bounds(value: datetime) -> Tuple[datetime, datetime]:
+    start = value.astimezone(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    end = (start + timedelta(days=32)).replace(day=1)
+    return start, end
+
+
+def ensure_partitions(db: Session, table_name: str, timestamps: Iterable[datetime]) -> None:
+    """Create the monthly partitions of `table_name` covering `timestamps` (Postgres only)."""
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    for start in sorted({_month_bounds(ts)[0] for ts in timestamps}):
+        _, end = _month_bounds(start)
+        partition = f"{table_name}_{start:%Y_%m}"
+        db.execute(text(
+            f'CREATE TABLE IF NOT EXISTS "{partition}" PARTITION OF "{table_name}" '
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        ))
+
+
+def export_parquet(rows: List[dict], directory: str, prefix: str) -> Optional[str]:
+    """Write `rows` to a zstd-compressed Parquet file in `directory`; returns its path."""
+    if not rows:
+        return None
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("Parquet export requires the 'pyarrow' package") from e
+
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+    path = os.path.join(directory, f"{prefix}-{stamp}.parquet")
+    records = [{k: (str(v) if k in ("id", "reportId") else v) for k, v in row.items()} for row in rows]
+    pq.write_table(pa.Table.from_pylist(records), path, compression="zstd")
+    return path
+
+
+def archive_batch(
+    db: Session,
+    cutoff: datetime,
+    batch_size: int,
+    parquet_dir: Optional[str] = None,
+) -> int:
+    """
+    Move one batch of resolved reports last updated before `cutoff`. Returns how many moved.
+
+    Copy and delete happen in a single transaction, so a report is always in exactly one tier;
+    the same transaction publishes a report.archived event per report.
+    """
+    hot, cold = models.IssueTable.__table__, models.ArchivedIssueTable.__table__
+    hot_events, cold_events = models.IssueEventTable.__table__, models.ArchivedIssueEventTable.__table__
+    issue_columns = _shared_columns(hot, cold)
+    event_columns = _shared_columns(hot_events, cold_events)
+
+    try:
+        rows = db.execute(
+            select(*[hot.c[name] for name in issue_columns])
+            .where(hot.c.status == ReportStatus.RESOLVED.value, hot.c.updated_at < cutoff)
+            .order_by(hot.c.updated_at)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        ).mappings().all()
+        if not rows:
+            db.rollback()
+            return 0
+
+        ids = [row["id"] for row in rows]
+        events = db.execute(
+            select(*[hot_events.c[name] for name in event_columns]).where(hot_events.c.reportId.in_(ids))
+        ).mappings().all()
+
+        ensure_partitions(db, cold.name, (row["creationTime"] for row in rows))
+        ensure_partitions(db, cold_events.name, (event["creationTime"] for event in events))
+
+        db.execute(insert(cold), [dict(row) for row in rows])
+        if events:
+            db.execute(insert(cold_events), [dict(event) for event in events])
+
+        # Archived reports leave the map aggregates, like any other removal from `issues`.
+        for row in rows:
+            geogrid.apply_change(db, geogrid.grid_key(SimpleNamespace(**row)), None)
+
+        db.execute(delete(hot_events).where(hot_events.c.reportId.in_(ids)))
+        db.execute(delete(hot).where(hot.c.id.in_(ids)))
+        for row in rows:
+            outbox.record(db, outbox.ARCHIVED, SimpleNamespace(**row))
+        db.commit()
+    except SQLAlchemyError:
+        db.rollback()
+        raise
+
+    if parquet_dir:
+        # Best effort: the rows are already safe in the cold tables.
+        try:
+            export_parquet([dict(row) for row in rows], parquet_dir, cold.name)
+            export_parquet([dict(event) for event in events], parquet_dir, cold_events.name)
+        except (RuntimeError, OSError):
+            logger.exception("Parquet export failed for %d archived reports", len(rows))
+
+    return len(rows)
+
+
+def archive_resolved(
+    db: Session,
+    older_than: Optional[timedelta] = None,
+    batch_size: Optional[int] = None,
+    parquet_dir: Optional[str] = None,
+) -> int:
+    """Archive every eligible report, one batch per transaction. Returns the total moved."""
+    settings = get_settings()
+    older_than = older_than if older_than is not None else timedelta(days=settings.archive_after_days)
+    batch_size = batch_size or settings.archive_batch_size
+    cutoff = datetime.now(timezone.utc) - older_than
+
+    total = 0
+    while True:
+        moved = archive_batch(db, cutoff, batch_size, parquet_dir)
+        total += moved
+        if moved < batch_size:
+            break
+    if total:
+        logger.info("Archived %d resolved reports older than %s", total, cutoff.isoformat())
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move old resolved reports to the archive tier")
+    parser.add_argument("--older-than-days", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--parquet-dir", default=None)
+    parser.add_argument("--loop", action="store_true", help="Keep running every --interval seconds")
+    parser.add_argument("--interval", type=float, default=3600.0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    older_than = timedelta(days=args.older_than_days) if args.older_than_days is not None else None
+    router = get_router()
+    while True:
+        for shard in router.names:
+            with router.session(shard) as db:
+                archive_resolved(db, older_than, args.batch_size, args.parquet_dir)
+                purged = geogrid.purge_empty_cells(db)
+                if purged:
+                    logger.info("Purged %d empty grid cells on shard %s", purged, shard)
+        if not args.loop:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+"""
+CityPulse Backfill
+Resumable re-classification of existing reports, e.g. after the analyze_report tool schema
+or ClassificationEnum changes, or for rows whose AI fields came back null.
+
+Target rows are walked in id order in batches. Each batch is classified concurrently
+(bounded worker pool plus a shared rate limit on Backboard calls), then written with one
+batched UPDATE that also advances the job's checkpoint in the same transaction. A crash
+loses at most the batch in flight; re-running the same --job resumes after the checkpoint.
+A report edited, deleted or archived while its classification was running is left alone;
+one that still exists is retried with the failed ones.
+Reports whose classification failed are kept on the job and retried once the walk is over;
+the job is only done when none are left, so re-running it retries the stubborn ones again.
+
+    python -m app.backfill --job reclassify-2026-10 --only-missing --concurrency 4 --rate 2
+    python -m app.backfill --job streetlights --category broken_streetlight --batch-size 20
+"""
+import argparse
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from types import SimpleNamespace
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from starlette.datastructures import Headers, UploadFile
+
+from app import crud, geogrid, models, outbox, sharding
+from app.ai_workflow.workflow import run_backboard_ai
+from app.blobstore import get_blob_store
+from app.sharding import get_router
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BackfillFilter:
+    only_missing: bool = False
+    category: Optional[str] = None
+    status: Optional[str] = None
+    city: Optional[str] = None
+    created_after: Optional[str] = None
+    created_before: Optional[str] = None
+
+    def apply(self, stmt):
+        issue = models.IssueTable
+        if self.only_missing:
+            stmt = stmt.where(or_(
+                issue.category.is_(None),
+                issue.severity.is_(None),
+                issue.priority.is_(None),
+                issue.priority_score.is_(None),
+            ))
+        if self.category:
+            stmt = stmt.where(issue.category == self.category)
+        if self.status:
+            stmt = stmt.where(issue.status == self.status)
+        if self.city:
+            stmt = stmt.where(issue.city == self.city)
+        if self.created_after:
+            stmt = stmt.where(issue.creationTime >= datetime.fromisoformat(self.created_after))
+        if self.created_before:
+            stmt = stmt.where(issue.creationTime < datetime.fromisoformat(self.created_before))
+        return stmt
+
+
+class RateLimiter:
+    """Token bucket shared by the worker threads; `rate` acquisitions per second."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def _load_job(db: Session, name: str, params: dict) -> models.BackfillJobTable:
+    job = db.get(models.BackfillJobTable, name)
+    encoded = json.dumps(params, sort_keys=True)
+    if job is None:
+        job = models.BackfillJobTable(name=name, params=encoded, status="running")
+        db.add(job)
+        db.commit()
+        return job
+    if job.params != encoded:
+        raise SystemExit(
+            f"Job '{name}' was started with different filters ({job.params}); use a new --job name"
+        )
+    if job.status == "done":
+        logger.info("Job '%s' already finished; nothing to do", name)
+    return job
+
+
+def classify_stored(row, limiter: Optional[RateLimiter] = None) -> Tuple[object, Optional[str], dict]:
+    """Run the AI workflow for one report using its stored description and images."""
+    store = get_blob_store()
+    with ExitStack() as stack:
+        uploads = []
+        for image in row.images:
+            fileobj = stack.enter_context(store.open(image.blobId))
+            uploads.append(UploadFile(
+                file=fileobj,
+                filename=image.filename or "image.jpg",
+                headers=Headers({"content-type": image.contentType}),
+            ))
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            thread_id, _, ai_response = run_backboard_ai(description=row.description, imageFiles=uploads)
+        except Exception:
+            logger.exception("Classification failed for report %s", row.id)
+            return row.id, None, {}
+    return row.id, thread_id, ai_response or {}
+
+
+@dataclass
+class _Target:
+    id: object
+    description: str
+    category: Optional[str]
+    severity: Optional[str]
+    latitude: Optional[float]
+    longitude: Optional[float]
+    creationTime: object
+    updated_at: object  # version read with the batch; the write skips rows changed since
+    images: list
+
+
+def _next_batch(
+    db: Session, flt: BackfillFilter, cursor, batch_size: int, ids: Optional[list] = None,
+) -> List[_Target]:
+    issue = models.IssueTable
+    stmt = select(
+        issue.id, issue.description, issue.category, issue.severity,
+        issue.latitude, issue.longitude, issue.creationTime, issue.updated_at,
+    )
+    stmt = flt.apply(stmt)
+    if cursor is not None:
+        stmt = stmt.where(issue.id > cursor)
+    if ids is not None:
+        stmt = stmt.where(issue.id.in_([crud._coerce_uuid(report_id) for report_id in ids]))
+    rows = db.execute(stmt.order_by(issue.id).limit(batch_size)).all()
+    return [_Target(*row, images=crud.get_report_images(db, row.id)) for row in rows]
+
+
+def _write_batch(
+    db: Session,
+    job: models.BackfillJobTable,
+    batch: List[_Target],
+    results: dict,
+    retried: Optional[list] = None,
+) -> int:
+    """
+    One transaction: batched UPDATE of AI fields, grid deltas and the new checkpoint.
+
+    The batch's rows are re-read with a lock; a row deleted or archived since `batch` was
+    read is skipped, one changed since (other updated_at) is skipped and retried later.
+    Grid deltas come from the locked rows. Failed reports are added to the job's retry
+    list. For a retry batch (`retried` is the list of ids asked for) the cursor stays put
+    and the retried ids leave the list unless they failed again; ids that no longer match
+    the filter simply drop out.
+    """
+    failed_ids = set(json.loads(job.failedIds or "[]")) - set(retried or ())
+    params = []
+    try:
+        current = {
+            report.id: report
+            for report in db.execute(
+                select(models.IssueTable)
+                .where(models.IssueTable.id.in_([target.id for target in batch]))
+                .with_for_update()
+                .execution_options(populate_existing=True)
+            ).scalars()
+        }
+        for target in batch:
+            report = current.get(target.id)
+            if report is None:
+                continue  # deleted or archived while it was being classified
+            thread_id, ai_response = results.get(target.id, (None, {}))
+            if not thread_id or not ai_response or report.updated_at != target.updated_at:
+                failed_ids.add(str(target.id))
+                continue
+            fields = crud.ai_fields(ai_response)
+            fields["threadId"] = thread_id
+            fields["triage_rank"] = crud.triage_rank(fields["priority_score"], report.creationTime)
+            params.append({"id": target.id, **fields})
+            geogrid.apply_change(
+                db,
+                geogrid.grid_key(report),
+                geogrid.grid_key(SimpleNamespace(latitude=report.latitude, longitude=report.longitude, **fields)),
+            )
+
+        if params:
+            db.execute(update(models.IssueTable), params)
+        if retried is None:
+            job.cursor = batch[-1].id
+            job.processed += len(batch)
+        job.updated += len(params)
+        job.failedIds = json.dumps(sorted(failed_ids))
+        job.failed = len(failed_ids)
+        for city in sorted({current[row["id"]].city for row in params}):
+            sharding.fence(db, city)
+        if params:
+            for report in db.execute(
+                select(models.IssueTable)
+                .where(models.IssueTable.id.in_([row["id"] for row in params]))
+                .execution_options(populate_existing=True)
+            ).scalars():
+                outbox.record(db, outbox.UPDATED, report)
+        db.commit()
+    except (SQLAlchemyError, HTTPException):
+        db.rollback()
+        raise
+    return len(params)
+
+
+def _classify_batch(pool: ThreadPoolExecutor, limiter: RateLimiter, batch: List[_Target]) -> dict:
+    return {
+        report_id: (thread_id, ai_response)
+        for report_id, thread_id, ai_response in pool.map(lambda t: classify_stored(t, limiter), batch)
+    }
+
+
+def run(
+    db: Session,
+    job_name: str,
+    flt: BackfillFilter,
+    concurrency: int = 4,
+    rate: float = 2.0,
+    batch_size: int = 50,
+    limit: Optional[int] = None,
+    dry_run: bool = False,
+) -> models.BackfillJobTable:
+    """Process every remaining target row of `job_name`; returns the job's checkpoint row."""
+    job = _load_job(db, job_name, asdict(flt))
+    if job.status == "done":
+        return job
+
+    count_stmt = flt.apply(select(func.count()).select_from(models.IssueTable))
+    if job.cursor is not None:
+        count_stmt = count_stmt.where(models.IssueTable.id > job.cursor)
+    remaining = db.execute(count_stmt).scalar()
+    if limit is not None:
+        remaining = min(remaining, limit)
+    logger.info("Job '%s': %d reports to process (already processed: %d)", job_name, remaining, job.processed)
+    if dry_run:
+        return job
+
+    limiter = RateLimiter(rate, burst=concurrency)
+    started = time.monotonic()
+    done_this_run = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        while limit is None or done_this_run < limit:
+            size = batch_size if limit is None else min(batch_size, limit - done_this_run)
+            batch = _next_batch(db, flt, job.cursor, size)
+            if not batch:
+                break
+            db.rollback()  # no open transaction while Backboard is slow
+            _write_batch(db, job, batch, _classify_batch(pool, limiter, batch))
+
+            done_this_run += len(batch)
+            elapsed = time.monotonic() - started
+            throughput = done_this_run / elapsed if elapsed > 0 else 0.0
+            left = max(0, remaining - done_this_run)
+            eta = left / throughput if throughput > 0 else float("inf")
+            logger.info(
+                "Job '%s': %d/%d done (%d updated, %d failing) | %.2f reports/s | ETA %.0fs",
+                job_name, done_this_run, remaining, job.updated, job.failed, throughput, eta,
+            )
+        else:
+            return job  # --limit reached; the walk resumes on the next run
+
+        # Walk finished: one retry pass over the reports that failed along the way.
+        failed_ids = json.loads(job.failedIds or "[]")
+        if failed_ids:
+            logger.info("Job '%s': retrying %d failed reports", job_name, len(failed_ids))
+        for start in range(0, len(failed_ids), batch_size):
+            retried = failed_ids[start:start + batch_size]
+            batch = _next_batch(db, flt, None, len(retried), ids=retried)
+            db.rollback()
+            _write_batch(db, job, batch, _classify_batch(pool, limiter, batch), retried=retried)
+
+    if job.failed:
+        logger.warning("Job '%s': %d reports still failing; re-run the job to retry them", job_name, job.failed)
+    else:
+        job.status = "done"
+    db.commit()
+    return job
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-classify existing reports through Backboard")
+    parser.add_argument("--job", required=True, help="Checkpoint name; re-use it to resume")
+    parser.add_argument("--only-missing", action="store_true", help="Only rows with null AI fields")
+    parser.add_argument("--category", default=None)
+    parser.add_argument("--status", default=None)
+    parser.add_argument("--city", default=None)
+    parser.add_argument("--created-after", default=None, help="ISO timestamp")
+    parser.add_argument("--created-before", default=None, help="ISO timestamp")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=2.0, help="Max reports sent to Backboard per second")
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=None, help="Stop after this many reports")
+    parser.add_argument("--dry-run", action="store_true", help="Only count the target rows")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    flt = BackfillFilter(
+        only_missing=args.only_missing,
+        category=args.category,
+        status=args.status,
+        city=args.city,
+        created_after=args.created_after,
+        created_before=args.created_before,
+    )
+    # Each shard keeps its own checkpoint for the job in its backfill_jobs table.
+    router = get_router()
+    shards = [router.shard_for_city(args.city)] if args.city else router.names
+    limit = args.limit
+    for shard in shards:
+        with router.session(shard) as db:
+            before = _load_job(db, args.job, asdict(flt)).processed
+            job = run(db, args.job, flt, args.concurrency, args.rate, args.batch_size, limit, args.dry_run)
+            if limit is not None:
+                limit -= job.processed - before
+                if limit <= 0:
+                    break
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+CityPulse Blob Store
+Content-addressed storage for uploaded report images. A blob's id is the SHA-256 of its
+bytes, so identical photos are stored once no matter how many reports reference them.
+
+Backends:
+- LocalBlobStore: sharded directories on the local filesystem, mmap-backed range reads
+- S3BlobStore: any S3-compatible object store (requires boto3)
+- MemoryBlobStore: in-process stand-in for tests and benchmarks
+
+Writes stream in fixed-size chunks, so peak memory per upload does not depend on image size.
+"""
+import hashlib
+import io
+import mmap
+import os
+import tempfile
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import BinaryIO, Dict, Iterator, Optional
+
+from app.config import get_settings
+
+CHUNK_SIZE = 64 * 1024
+
+
+@dataclass(frozen=True)
+class BlobInfo:
+    id: str
+    size: int
+    created: bool  # False when an identical blob was already stored
+
+
+def hash_stream(fileobj: BinaryIO) -> tuple:
+    """SHA-256 and size of a seekable file, read in chunks; rewinds it afterwards."""
+    digest = hashlib.sha256()
+    size = 0
+    fileobj.seek(0)
+    for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b""):
+        digest.update(chunk)
+        size += len(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest(), size
+
+
+class BlobStore:
+    """Interface shared by the backends."""
+
+    def put(self, fileobj: BinaryIO) -> BlobInfo:
+        raise NotImplementedError
+
+    def size(self, blob_id: str) -> Optional[int]:
+        """Size in bytes, or None if the blob does not exist."""
+        raise NotImplementedError
+
+    def read_range(self, blob_id: str, start: int, end: int) -> Iterator[bytes]:
+        """Yield bytes [start, end] (inclusive) of the blob in chunks."""
+        raise NotImplementedError
+
+    def open(self, blob_id: str) -> BinaryIO:
+        """Readable, seekable file object over the whole blob; the caller closes it."""
+        raise NotImplementedError
+
+    def exists(self, blob_id: str) -> bool:
+        return self.size(blob_id) is not None
+
+
+class LocalBlobStore(BlobStore):
+    def __init__(self, root: str):
+        self.root = root
+        self._tmp = os.path.join(root, "tmp")
+        os.makedirs(self._tmp, exist_ok=True)
+
+    def path(self, blob_id: str) -> str:
+        # Two levels of 256-way sharding keeps directories small at millions of blobs.
+        return os.path.join(self.root, blob_id[:2], blob_id[2:4], blob_id)
+
+    def put(self, fileobj: BinaryIO) -> BlobInfo:
+        digest = hashlib.sha256()
+        size = 0
+        fileobj.seek(0)
+        fd, tmp_path = tempfile.mkstemp(dir=self._tmp)
+        try:
+            with os.fdopen(fd, "wb") as out:
+                for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b""):
+                    digest.update(chunk)
+                    size += len(chunk)
+                    out.write(chunk)
+                out.flush()
+                os.fsync(out.fileno())
+            fileobj.seek(0)
+
+            blob_id = digest.hexdigest()
+            final_path = self.path(blob_id)
+            if os.path.exists(final_path):
+                return BlobInfo(blob_id, size, created=False)
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            # Atomic; a concurrent writer of the same content just replaces identical bytes.
+            os.replace(tmp_path, final_path)
+            tmp_path = None
+            return BlobInfo(blob_id, size, created=True)
+        finally:
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    def size(self, blob_id: str) -> Optional[int]:
+        try:
+            return os.path.getsize(self.path(blob_id))
+        except OSError:
+            return None
+
+    def open(self, blob_id: str) -> BinaryIO:
+        return open(self.path(blob_id), "rb")
+
+    def read_range(self, blob_id: str, start: int, end: int) -> Iterator[bytes]:
+        with open(self.path(blob_id), "rb") as fh:
+            if end < start:
+                return
+            with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                for offset in range(start, end + 1, CHUNK_SIZE):
+                    yield mapped[offset:min(offset + CHUNK_SIZE, end + 1)]
+
+
+class S3BlobStore(BlobStore):
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: Optional[str] = None, client=None):
+        if client is None:
+            try:
+                import boto3
+            except ImportError as e:
+                raise RuntimeError("The S3 blob store requires the 'boto3' package") from e
+            client = boto3.client("s3", endpoint_url=endpoint_url or None)
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+
+    def key(self, blob_id: str) -> str:
+        key = f"{blob_id[:2]}/{blob_id[2:4]}/{blob_id}"
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def put(self, fileobj: BinaryIO) -> BlobInfo:
+        # The key depends on the content hash, so hash first, then stream the upload.
+        blob_id, size = hash_stream(fileobj)
+        if self.exists(blob_id):
+            return BlobInfo(blob_id, size, created=False)
+        self.client.upload_fileobj(fileobj, self.bucket, self.key(blob_id))
+        fileobj.seek(0)
+        return BlobInfo(blob_id, size, created=True)
+
+    def size(self, blob_id: str) -> Optional[int]:
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=self.key(blob_id))
+        except Exception as e:  # botocore ClientError; boto3 is optional so match by code
+            code = getattr(e, "response", {}).get("Error", {}).get("Code")
+            if code in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return head["ContentLength"]
+
+    def open(self, blob_id: str) -> BinaryIO:
+        spool = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+        self.client.download_fileobj(self.bucket, self.key(blob_id), spool)
+        spool.seek(0)
+        return spool
+
+    def read_range(self, blob_id: str, start: int, end: int) -> Iterator[bytes]:
+        obj = self.client.get_object(Bucket=self.bucket, Key=self.key(blob_id), Range=f"bytes={start}-{end}")
+        yield from obj["Body"].iter_chunks(CHUNK_SIZE)
+
+
+class MemoryBlobStore(BlobStore):
+    def __init__(self):
+        self._blobs: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def put(self, fileobj: BinaryIO) -> BlobInfo:
+        blob_id, size = hash_stream(fileobj)
+        with self._lock:
+            if blob_id in self._blobs:
+                return BlobInfo(blob_id, size, created=False)
+            self._blobs[blob_id] = fileobj.read()
+        fileobj.seek(0)
+        return BlobInfo(blob_id, size, created=True)
+
+    def size(self, blob_id: str) -> Optional[int]:
+        data = self._blobs.get(blob_id)
+        return None if data is None else len(data)
+
+    def open(self, blob_id: str) -> BinaryIO:
+        return io.BytesIO(self._blobs[blob_id])
+
+    def read_range(self, blob_id: str, start: int, end: int) -> Iterator[bytes]:
+        data = memoryview(self._blobs[blob_id])
+        for offset in range(start, end + 1, CHUNK_SIZE):
+            yield bytes(data[offset:min(offset + CHUNK_SIZE, end + 1)])
+
+
+@lru_cache
+def get_blob_store() -> BlobStore:
+    """Get the configured blob store backend."""
+    settings = get_settings()
+    backend = settings.blob_store_backend
+    if backend == "local":
+        return LocalBlobStore(settings.blob_store_path)
+    if backend == "s3":
+        return S3BlobStore(
+            bucket=settings.blob_s3_bucket,
+            prefix=settings.blob_s3_prefix,
+            endpoint_url=settings.blob_s3_endpoint_url,
+        )
+    if backend == "memory":
+        return MemoryBlobStore()
+    raise ValueError(f"Unknown blob_store_backend: {backend}")
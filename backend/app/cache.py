@@ -0,0 +1,139 @@
+"""
+CityPulse Cache
+Small key/value cache with per-entry TTL, used as the fast front of the idempotency store.
+
+- MemoryCache: bounded LRU inside the current process
+- SocketCache: client of one MemoryCache hosted by a cache server process on a Unix socket,
+  so N web workers share a single copy instead of each holding its own
+
+`python -m app.serve` starts the cache server next to the workers and exports
+SHARED_CACHE_SOCKET / SHARED_CACHE_AUTHKEY to them; without those the cache is per process.
+A worker that cannot reach the server treats it as a miss and carries on (every cached
+value is also in the database).
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from multiprocessing import AuthenticationError
+from multiprocessing.managers import BaseManager
+from typing import Any, Optional
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+class Cache:
+    """Interface shared by the backends. Values must be picklable."""
+
+    def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl_seconds: float) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+
+class MemoryCache(Cache):
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, value)
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: Any, ttl_seconds: float) -> None:
+        if ttl_seconds <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.time() + ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# The cache server process hosts one MemoryCache; clients get proxies to it.
+_served: Optional[MemoryCache] = None
+
+
+def _served_cache() -> MemoryCache:
+    return _served
+
+
+class _CacheManager(BaseManager):
+    pass
+
+
+_CacheManager.register("cache", callable=_served_cache, exposed=("get", "set", "delete", "__len__"))
+
+
+def serve(address: str, authkey: bytes, max_entries: int) -> None:
+    """Run the cache server on a Unix socket until the process is terminated."""
+    global _served
+    _served = MemoryCache(max_entries)
+    manager = _CacheManager(address=address, authkey=authkey)
+    manager.get_server().serve_forever()
+
+
+class SocketCache(Cache):
+    _ERRORS = (OSError, EOFError, AuthenticationError)
+
+    def __init__(self, address: str, authkey: bytes):
+        self.address = address
+        self.authkey = authkey
+        self._local = threading.local()
+
+    def _proxy(self):
+        # One connection per thread; the threadpool running sync endpoints keeps them warm.
+        proxy = getattr(self._local, "proxy", None)
+        if proxy is None:
+            manager = _CacheManager(address=self.address, authkey=self.authkey)
+            manager.connect()
+            proxy = self._local.proxy = manager.cache()
+        return proxy
+
+    def _call(self, method: str, *args):
+        try:
+            return getattr(self._proxy(), method)(*args)
+        except self._ERRORS as e:
+            self._local.proxy = None
+            logger.warning("Shared cache at %s unavailable (%s); treating as a miss", self.address, e)
+            return None
+
+    def get(self, key: str) -> Optional[Any]:
+        return self._call("get", key)
+
+    def set(self, key: str, value: Any, ttl_seconds: float) -> None:
+        self._call("set", key, value, ttl_seconds)
+
+    def delete(self, key: str) -> None:
+        self._call("delete", key)
+
+
+@lru_cache
+def get_shared_cache() -> Optional[Cache]:
+    """The cross-worker cache, or None when this process was not started by app.serve."""
+    settings = get_settings()
+    if not settings.shared_cache_socket:
+        return None
+    return SocketCache(settings.shared_cache_socket, bytes.fromhex(settings.shared_cache_authkey))
@@ -2,8 +2,12 @@
 CityPulse Configuration
 Loads environment variables and provides app settings.
 """
+import math
+import os
+
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Dict
 
 
 class Settings(BaseSettings):
@@ -11,16 +15,89 @@ class Settings(BaseSettings):
 
     # Database
     database_url: str 
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    # Connections all web workers may hold together across every shard, split over
+    # workers x shard engines (0 = no budget, use the pool settings above in every engine).
+    # Should stay below max_connections, with room left for the CLI jobs.
+    db_connection_budget: int = 80
 
     # Backboard AI Integration
     backboard_api_key: str = "" 
     backboard_workflow_id: str = ""
-    backboard_api_url: str = "https://api.backboard.ai"
+    backboard_api_url: str = "https://app.backboard.io/api"
 
     # Application
     app_name: str = "CityPulse"
     debug: bool = False
 
+    # Idempotency-Key support for POST /reports
+    idempotency_ttl_seconds: int = 24 * 60 * 60
+    idempotency_memory_entries: int = 10_000
+    idempotency_wait_seconds: float = 120.0
+    idempotency_lease_seconds: float = 180.0  # in-progress claim, extended while the request runs
+
+    # Admission control for POST /reports, per worker process (see app.admission)
+    admission_max_inflight: int = 32  # 0 = no admission control
+    admission_max_waiting: int = 64
+    admission_upload_memory_bytes: int = 256 * 1024 * 1024
+    admission_codel_target_ms: float = 50.0
+    admission_codel_interval_ms: float = 500.0
+    # Store reports and classify them in the background while the recent pipeline latency
+    # is above this (0 = always classify inline)
+    admission_defer_latency_seconds: float = 0.0
+    admission_max_deferred: int = 200
+    admission_enrichment_workers: int = 4
+
+    # Triage queue
+    triage_aging_points_per_hour: float = 0.05
+    triage_default_lease_seconds: int = 15 * 60
+
+    # Map tiles
+    tile_max_grid_zoom: int = 16
+    tile_cluster_depth: int = 3
+    tile_cache_max_age_seconds: int = 60
+
+    # Archival of resolved reports
+    archive_after_days: int = 90
+    archive_batch_size: int = 1000
+
+    # Outbox relays (python -m app.outbox)
+    outbox_batch_size: int = 100
+    outbox_poll_seconds: float = 1.0
+    # Databases other than SQLite/PostgreSQL: how long a gap in outbox ids may be an
+    # uncommitted transaction before it is skipped
+    outbox_settle_seconds: float = 5.0
+    outbox_retention_hours: float = 7 * 24
+    outbox_webhook_timeout_seconds: float = 10.0
+
+    # Uploaded image storage: "local", "s3" or "memory"
+    blob_store_backend: str = "local"
+    blob_store_path: str = "data/blobs"
+    blob_s3_bucket: str = ""
+    blob_s3_prefix: str = "blobs"
+    blob_s3_endpoint_url: str = ""
+    blob_cache_max_age_seconds: int = 7 * 24 * 60 * 60
+
+    # Startup warm-up (run from the app lifespan before serving traffic)
+    startup_warmup: bool = True
+    startup_db_connections: int = 2
+    startup_backboard_connections: int = 2
+
+    # Per-city sharding: extra shards as a JSON object {"name": "database url"}; the
+    # "default" shard is always database_url and also holds the city -> shard directory
+    shard_urls: Dict[str, str] = {}
+    shard_directory_ttl_seconds: float = 5.0
+    shard_scatter_threads: int = 8
+
+    # Multi-process serving (python -m app.serve)
+    web_workers: int = 0  # 0 = one per CPU of the container's quota, at most 8
+    shutdown_drain_seconds: float = 60.0
+    shared_cache_socket: str = ""  # set by app.serve for its workers
+    shared_cache_authkey: str = ""
+    assistant_resolved: bool = False  # set by app.serve once ASSISTANT_ID is resolved
+    shared_cache_entries: int = 50_000
+
     class Config:
         env_file = ".env"
         extra = "ignore"
@@ -31,3 +108,56 @@ def get_settings() -> Settings:
     """Get cached settings instance."""
     return Settings()
 
+
+_MAX_DEFAULT_WORKERS = 8
+
+
+def _read(path: str) -> str:
+    try:
+        with open(path, encoding="ascii") as fh:
+            return fh.read().strip()
+    except OSError:
+        return ""
+
+
+def available_cpus() -> int:
+    """
+    CPUs this process may actually use: its affinity mask, capped by a cgroup CPU quota.
+
+    os.cpu_count() is the host's count, which in a container limited to 2 CPUs on a 64-core
+    host would mean 64 workers.
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota, _, period = _read("/sys/fs/cgroup/cpu.max").partition(" ")  # cgroup v2: "max 100000"
+    if not period:  # cgroup v1
+        quota, period = _read("/sys/fs/cgroup/cpu/cpu.cfs_quota_us"), _read("/sys/fs/cgroup/cpu/cpu.cfs_period_us")
+    if quota.isdigit() and period.isdigit() and int(period) > 0:
+        cpus = min(cpus, math.ceil(int(quota) / int(period)))
+    return max(1, cpus)
+
+
+def worker_count(settings: Settings) -> int:
+    """Number of web worker processes app.serve runs."""
+    if settings.web_workers > 0:
+        return settings.web_workers
+    return min(_MAX_DEFAULT_WORKERS, available_cpus())
+
+
+def pool_limits(settings: Settings) -> tuple:
+    """
+    (pool_size, max_overflow) for one engine of one worker.
+
+    Every worker opens an engine per shard, so with a db_connection_budget each engine of
+    each worker gets an equal share of workers x shards (at least one connection), split
+    between the persistent pool and overflow and never above the pool settings.
+    """
+    if settings.db_connection_budget <= 0:
+        return settings.db_pool_size, settings.db_max_overflow
+    engines = worker_count(settings) * (1 + len(settings.shard_urls))
+    share = max(1, settings.db_connection_budget // engines)
+    pool_size = min(settings.db_pool_size, share)
+    return pool_size, min(settings.db_max_overflow, share - pool_size)
+
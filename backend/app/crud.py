@@ -1,10 +1,16 @@
+import json
+from fastapi import HTTPException
+from sqlalchemy import delete, insert, or_, select, union_all, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
 from uuid import UUID
-from datetime import datetime, timezone
-from typing import Union, Optional
-from app import models
-from app.schemas import Report
+from datetime import datetime, timedelta, timezone
+from typing import List, Sequence, Union, Optional
+from app import geogrid, models, outbox, sharding
+from app.config import get_settings
+from app.schemas import Report, ReportStatus
 
 def _parse_uuid(value: str) -> Optional[UUID]:
     try:
@@ -32,6 +38,80 @@ def _coerce_datetime(value: Union[str, datetime]) -> Optional[datetime]:
     except (ValueError, TypeError):
         return None
 
+def triage_rank(priority_score: Optional[int], creation_time: datetime) -> float:
+    """
+    Time-invariant sort key for the triage queue.
+
+    Aged priority is priority_score + rate * hours_waiting. Since "now" is the same for every
+    row, ordering by it equals ordering by priority_score - rate * hours_since_epoch(creation),
+    which never changes as time passes, so it can be stored and indexed once per row.
+    """
+    rate = get_settings().triage_aging_points_per_hour
+    created_hours = _coerce_datetime(creation_time).timestamp() / 3600
+    return float(priority_score or 0) - rate * created_hours
+
+
+def effective_priority(rank: Optional[float], now: Optional[datetime] = None) -> Optional[float]:
+    """Aged priority of a row at `now`, recovered from its stored triage_rank."""
+    if rank is None:
+        return None
+    now = now or datetime.now(timezone.utc)
+    return rank + get_settings().triage_aging_points_per_hour * now.timestamp() / 3600
+
+def ai_fields(ai_response: dict) -> dict:
+    """Map an analyze_report result onto IssueTable column names."""
+    return {
+        "category": ai_response.get("classification"),
+        "severity": ai_response.get("severity"),
+        "priority": ai_response.get("priority"),
+        "priority_score": ai_response.get("priority_score"),
+        "needs_clarification": ai_response.get("needs_clarification"),
+        "clarification": ai_response.get("clarification"),
+    }
+
+
+def _insert_ignore(db: Session, table, rows: List[dict]) -> None:
+    """INSERT rows, skipping ones whose primary key already exists."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        db.execute(pg_insert(table).on_conflict_do_nothing(), rows)
+    elif dialect == "sqlite":
+        db.execute(sqlite_insert(table).on_conflict_do_nothing(), rows)
+    else:
+        key = table.primary_key.columns.values()[0]
+        existing = set(db.execute(select(key).where(key.in_([r[key.name] for r in rows]))).scalars())
+        missing = [r for r in rows if r[key.name] not in existing]
+        if missing:
+            db.execute(insert(table), missing)
+
+
+def _link_images(
+    db: Session,
+    report_id: UUID,
+    images: Sequence[dict],
+    linked: Sequence[str] = (),
+    first_position: int = 0,
+) -> None:
+    """Record blobs and link them to a report; `linked` are blob ids it already has."""
+    _insert_ignore(db, models.BlobTable.__table__, [
+        {"id": image["blobId"], "size": image["size"], "contentType": image["contentType"]}
+        for image in images
+    ])
+    seen = set(linked)
+    links = []
+    for position, image in enumerate(images, start=first_position):
+        if image["blobId"] in seen:
+            continue  # the same photo attached twice to one report
+        seen.add(image["blobId"])
+        links.append({
+            "reportId": report_id,
+            "blobId": image["blobId"],
+            "position": position,
+            "filename": image.get("filename"),
+        })
+    if links:
+        db.execute(insert(models.IssueBlobTable.__table__), links)
+
 # -------------------------------
 # CREATE
 
@@ -41,8 +121,15 @@ def create_report(
         ai_response: dict,
         report_id: Union[str, UUID],
         thread_id: Union[str, UUID],
-        creation_time: Union[str, datetime]
+        creation_time: Union[str, datetime],
+        images: Sequence[dict] = ()
 ) -> models.IssueTable:
+    """
+    Persist an AI-enriched report.
+
+    `images` are blobs already written to the blob store, as dicts with blobId, size,
+    contentType and filename; they are recorded and linked in the same transaction.
+    """
     # Coerce report_id to UUID (model column is UUID)
     coerced_report_id = _coerce_uuid(report_id)
     if coerced_report_id is None:
@@ -56,29 +143,37 @@ def create_report(
     if coerced_creation_time is None:
         raise ValueError(f"Invalid creation_time: {creation_time}")
 
+    # A report the assistant has questions about waits for the citizen's answer
+    # (see apply_clarification) before it reaches the triage queue.
+    status = user_report.status
+    if ai_response.get("needs_clarification"):
+        status = ReportStatus.WAITING.value
+
     report = models.IssueTable(
         id=coerced_report_id,
         title=user_report.title,
         description=user_report.description,
         address=user_report.address,
         city=user_report.city,
-        status=user_report.status,
+        status=status,
         latitude=user_report.latitude,
         longitude=user_report.longitude,
         threadId=thread_id_str,
-        category=ai_response.get("classification"),
-        severity=ai_response.get("severity"),
-        priority=ai_response.get("priority"),
-        priority_score=ai_response.get("priority_score"),
-        needs_clarification=ai_response.get("needs_clarification"),
-        clarification=ai_response.get("clarification"),
+        **ai_fields(ai_response),
         #TODO: Add nbOfMatches here once the AI is programmed to get the number of matches
         creationTime=coerced_creation_time,
+        triage_rank=triage_rank(ai_response.get("priority_score"), coerced_creation_time),
     )
     db.add(report)
     try:
+        geogrid.apply_change(db, None, geogrid.grid_key(report))
+        if images:
+            db.flush()
+            _link_images(db, coerced_report_id, images)
+        sharding.fence(db, report.city)
+        outbox.record(db, outbox.CREATED, report)
         db.commit()
-    except SQLAlchemyError:
+    except (SQLAlchemyError, HTTPException):
         db.rollback()
         raise
     db.refresh(report)
@@ -88,19 +183,98 @@ def create_report(
 #-----------------
 # READ
 
-def get_reports(db: Session, status_filter: Optional[str] = None):
+def get_reports(db: Session, status_filter: Optional[str] = None, include_archived: bool = False):
     query = db.query(models.IssueTable)
     if status_filter:
         query = query.filter(models.IssueTable.status == status_filter)
-    return query.order_by(models.IssueTable.creationTime.desc()).all()
+    reports = query.order_by(models.IssueTable.creationTime.desc()).all()
+    if not include_archived:
+        return reports
+
+    archived_query = db.query(models.ArchivedIssueTable)
+    if status_filter:
+        archived_query = archived_query.filter(models.ArchivedIssueTable.status == status_filter)
+    archived = archived_query.order_by(models.ArchivedIssueTable.creationTime.desc()).all()
+    return sorted(reports + archived, key=lambda r: r.creationTime, reverse=True)
 
 
 def get_report(db: Session, report_id: Union[str, UUID]) -> Optional[models.IssueTable]:
+    """Hot-table lookup for reports that can still change (update, delete, triage)."""
     coerced_id = _coerce_uuid(report_id)
     if coerced_id is None:
         return None
     return db.query(models.IssueTable).filter(models.IssueTable.id == coerced_id).first()
 
+
+def find_report(
+    db: Session, report_id: Union[str, UUID]
+) -> Optional[Union[models.IssueTable, models.ArchivedIssueTable]]:
+    """Read-only lookup that falls back to the archive tier for old resolved reports."""
+    report = get_report(db, report_id)
+    if report is not None:
+        return report
+    coerced_id = _coerce_uuid(report_id)
+    if coerced_id is None:
+        return None
+    return db.query(models.ArchivedIssueTable).filter(models.ArchivedIssueTable.id == coerced_id).first()
+
+def get_report_rows(
+    db: Session,
+    columns: Sequence[str],
+    status_filter: Optional[str] = None,
+    include_archived: bool = False,
+) -> list:
+    """Like get_reports, but returns plain row tuples of `columns` (for the lean response path)."""
+    def _select(table):
+        stmt = select(*[table.c[name] for name in columns])
+        if status_filter:
+            stmt = stmt.where(table.c.status == status_filter)
+        return stmt
+
+    hot = models.IssueTable.__table__
+    if not include_archived:
+        return db.execute(_select(hot).order_by(hot.c.creationTime.desc())).all()
+
+    combined = union_all(_select(hot), _select(models.ArchivedIssueTable.__table__)).subquery()
+    return db.execute(select(combined).order_by(combined.c.creationTime.desc())).all()
+
+
+def find_report_row(db: Session, report_id: Union[str, UUID], columns: Sequence[str]):
+    """Like find_report, but returns a plain row tuple of `columns` or None."""
+    coerced_id = _coerce_uuid(report_id)
+    if coerced_id is None:
+        return None
+    for table in (models.IssueTable.__table__, models.ArchivedIssueTable.__table__):
+        row = db.execute(
+            select(*[table.c[name] for name in columns]).where(table.c.id == coerced_id)
+        ).first()
+        if row is not None:
+            return row
+    return None
+
+def get_report_images(db: Session, report_id: Union[str, UUID]) -> list:
+    """Images linked to a report (hot or archived), in upload order."""
+    coerced_id = _coerce_uuid(report_id)
+    if coerced_id is None:
+        return []
+    return db.execute(
+        select(
+            models.IssueBlobTable.blobId,
+            models.IssueBlobTable.filename,
+            models.IssueBlobTable.position,
+            models.BlobTable.size,
+            models.BlobTable.contentType,
+        )
+        .join(models.BlobTable, models.BlobTable.id == models.IssueBlobTable.blobId)
+        .where(models.IssueBlobTable.reportId == coerced_id)
+        .order_by(models.IssueBlobTable.position)
+    ).all()
+
+
+def get_blob(db: Session, blob_id: str) -> Optional[models.BlobTable]:
+    return db.get(models.BlobTable, blob_id)
+
+
 # -------------------------
 # UPDATE
 
@@ -129,15 +303,137 @@ def update_report(
         "longitude": new_longitude,
     }
 
+    old_grid_key = geogrid.grid_key(report)
+    old_city = report.city
     for field, value in updates.items():
         if value is not None:
             setattr(report, field, value)
+    modified = db.is_modified(report)
 
     try:
+        geogrid.apply_change(db, old_grid_key, geogrid.grid_key(report))
+        sharding.fence(db, old_city)
+        if modified:
+            outbox.record(db, outbox.UPDATED, report)
         db.commit()
+    except (SQLAlchemyError, HTTPException):
+        db.rollback()
+        raise
+
+    db.refresh(report)
+    return report
+
+
+def apply_clarification(
+    db: Session,
+    report: models.IssueTable,
+    question: Optional[str],
+    answer: str,
+    ai_response: dict,
+    images: Sequence[dict] = (),
+) -> Optional[List[str]]:
+    """
+    Patch a report with the assistant's answer to a clarification follow-up.
+
+    Only AI fields whose value changed are written; a field the assistant left out keeps its
+    stored value. The report stays WAITING while the assistant still needs clarification and
+    moves back to New otherwise. The exchange is recorded as a "clarification" event and any
+    new images are linked, all in one transaction. Returns the names of the changed columns,
+    or None if the report is no longer waiting for an answer to `question`.
+    """
+    fields = ai_fields(ai_response)
+    fields["needs_clarification"] = bool(fields["needs_clarification"])
+    if not fields["needs_clarification"]:
+        fields["clarification"] = None
+    status = ReportStatus.WAITING.value if fields["needs_clarification"] else ReportStatus.NEW.value
+
+    # Re-check and move the status in one statement: of two answers to the same question
+    # only one matches, and the row stays locked until this transaction commits.
+    try:
+        claimed = db.execute(
+            update(models.IssueTable)
+            .where(
+                models.IssueTable.id == report.id,
+                models.IssueTable.status == ReportStatus.WAITING.value,
+                models.IssueTable.clarification == question,
+            )
+            .values(status=status)
+            .execution_options(synchronize_session=False)
+        ).rowcount
     except SQLAlchemyError:
         db.rollback()
         raise
+    if not claimed:
+        db.rollback()
+        return None
+    db.refresh(report)
+
+    old_grid_key = geogrid.grid_key(report)
+    changed = [] if status == ReportStatus.WAITING.value else ["status"]
+    for column, value in fields.items():
+        if value is None and column != "clarification":
+            continue
+        if getattr(report, column) != value:
+            setattr(report, column, value)
+            changed.append(column)
+    if "priority_score" in changed:
+        report.triage_rank = triage_rank(report.priority_score, report.creationTime)
+
+    db.add(models.IssueEventTable(
+        reportId=report.id,
+        eventType="clarification",
+        payload=json.dumps({"question": question, "answer": answer, "changed": changed}),
+    ))
+    try:
+        geogrid.apply_change(db, old_grid_key, geogrid.grid_key(report))
+        if images:
+            existing = get_report_images(db, report.id)
+            _link_images(
+                db,
+                report.id,
+                images,
+                linked=[row.blobId for row in existing],
+                first_position=max((row.position for row in existing), default=-1) + 1,
+            )
+        sharding.fence(db, report.city)
+        if changed:
+            outbox.record(db, outbox.UPDATED, report)
+        db.commit()
+    except (SQLAlchemyError, HTTPException):
+        db.rollback()
+        raise
+
+    db.refresh(report)
+    return changed
+
+
+def apply_enrichment(
+    db: Session,
+    report: models.IssueTable,
+    thread_id: Optional[str],
+    ai_response: dict,
+) -> models.IssueTable:
+    """
+    Fill in the AI fields of a report that was stored before its classification ran
+    (see app.enrichment). A report still New moves to WAITING if the assistant needs
+    clarification; a status a crew already changed is kept.
+    """
+    old_grid_key = geogrid.grid_key(report)
+    for column, value in ai_fields(ai_response).items():
+        setattr(report, column, value)
+    report.threadId = str(thread_id) if thread_id is not None else None
+    report.triage_rank = triage_rank(report.priority_score, report.creationTime)
+    if ai_response.get("needs_clarification") and report.status == ReportStatus.NEW.value:
+        report.status = ReportStatus.WAITING.value
+
+    try:
+        geogrid.apply_change(db, old_grid_key, geogrid.grid_key(report))
+        sharding.fence(db, report.city)
+        outbox.record(db, outbox.UPDATED, report)
+        db.commit()
+    except (SQLAlchemyError, HTTPException):
+        db.rollback()
+        raise
 
     db.refresh(report)
     return report
@@ -151,12 +447,155 @@ def delete_report(db: Session, report_id: Union[str, UUID]) -> bool:
     if report is None:
         return False
 
-    db.delete(report)
     try:
+        db.delete(report)
+        geogrid.apply_change(db, geogrid.grid_key(report), None)
+        # Blobs themselves are shared by content hash and are kept.
+        db.execute(delete(models.IssueBlobTable).where(models.IssueBlobTable.reportId == report.id))
+        sharding.fence(db, report.city)
+        # The last state of the report goes out with its deletion.
+        outbox.record(db, outbox.DELETED, report)
         db.commit()
-    except SQLAlchemyError:
+    except (SQLAlchemyError, HTTPException):
         db.rollback()
         raise
 
     return True
 
+
+# -------------------------
+# TRIAGE QUEUE
+
+def _open_city_spellings(db: Session, city: str) -> List[str]:
+    """Spellings of `city` among the shard's open reports ('Montreal', 'Montréal', ...)."""
+    key = sharding.normalize_city(city)
+    names = db.execute(
+        select(models.IssueTable.city).where(models.IssueTable.status.in_(models.TRIAGE_STATUSES)).distinct()
+    ).scalars()
+    return [name for name in names if sharding.normalize_city(name) == key]
+
+
+def _triage_query(db: Session, now: datetime, city: Optional[str], category: Optional[str]):
+    lease_free = or_(
+        models.IssueTable.lease_expires_at.is_(None),
+        models.IssueTable.lease_expires_at < now,
+    )
+    query = db.query(models.IssueTable).filter(
+        models.IssueTable.status.in_(models.TRIAGE_STATUSES),
+        lease_free,
+    )
+    if city:
+        # Same folding as the shard directory, so every spelling routed here matches.
+        query = query.filter(models.IssueTable.city.in_(_open_city_spellings(db, city)))
+    if category:
+        query = query.filter(models.IssueTable.category == category)
+    return query.order_by(models.IssueTable.triage_rank.desc().nulls_last()), lease_free
+
+
+def get_triage_queue(
+    db: Session,
+    limit: int,
+    city: Optional[str] = None,
+    category: Optional[str] = None,
+) -> List[models.IssueTable]:
+    """Top `limit` unclaimed open reports by aged priority, without claiming them."""
+    query, _ = _triage_query(db, datetime.now(timezone.utc), city, category)
+    return query.limit(limit).all()
+
+
+def claim_reports(
+    db: Session,
+    crew: str,
+    limit: int,
+    lease_seconds: int,
+    city: Optional[str] = None,
+    category: Optional[str] = None,
+) -> List[models.IssueTable]:
+    """
+    Atomically lease up to `limit` of the highest-priority open reports to `crew`.
+
+    On Postgres the candidates are locked with FOR UPDATE SKIP LOCKED so concurrent crews
+    skip each other's rows instead of blocking. Each row is then claimed with a conditional
+    UPDATE, which keeps the claim safe on backends without row locks as well.
+    """
+    now = datetime.now(timezone.utc)
+    lease_expires_at = now + timedelta(seconds=lease_seconds)
+    query, lease_free = _triage_query(db, now, city, category)
+    candidates = query.with_for_update(skip_locked=True).limit(limit).all()
+
+    claimed_ids = []
+    try:
+        for report in candidates:
+            result = db.execute(
+                update(models.IssueTable)
+                .where(models.IssueTable.id == report.id, lease_free)
+                .values(
+                    claimed_by=crew,
+                    lease_expires_at=lease_expires_at,
+                    status=ReportStatus.IN_PROGRESS.value,
+                )
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount == 1:
+                claimed_ids.append(report.id)
+        claimed = db.query(models.IssueTable).filter(
+            models.IssueTable.id.in_(claimed_ids)
+        ).populate_existing().all() if claimed_ids else []
+        for city in sorted({report.city for report in claimed}):
+            sharding.fence(db, city)
+        for report in claimed:
+            outbox.record(db, outbox.UPDATED, report)
+        db.commit()
+    except (SQLAlchemyError, HTTPException):
+        db.rollback()
+        raise
+
+    return sorted(claimed, key=lambda r: (r.triage_rank is None, -(r.triage_rank or 0)))
+
+
+def release_report(db: Session, report_id: Union[str, UUID], crew: str) -> Optional[models.IssueTable]:
+    """Drop `crew`'s lease on a report so it goes back to the queue. Returns None if not held."""
+    report = get_report(db, report_id)
+    if report is None or report.claimed_by != crew:
+        return None
+
+    report.claimed_by = None
+    report.lease_expires_at = None
+    if report.status == ReportStatus.IN_PROGRESS.value:
+        report.status = ReportStatus.NEW.value
+    try:
+        sharding.fence(db, report.city)
+        outbox.record(db, outbox.UPDATED, report)
+        db.commit()
+    except (SQLAlchemyError, HTTPException):
+        db.rollback()
+        raise
+
+    db.refresh(report)
+    return report
+
+
+def rebuild_triage_ranks(db: Session, batch_size: int = 1000) -> int:
+    """Recompute triage_rank for every open report (needed after changing the aging rate)."""
+    updated = 0
+    last_id = None
+    while True:
+        query = db.query(
+            models.IssueTable.id, models.IssueTable.priority_score, models.IssueTable.creationTime
+        ).filter(models.IssueTable.status.in_(models.TRIAGE_STATUSES))
+        if last_id is not None:
+            query = query.filter(models.IssueTable.id > last_id)
+        rows = query.order_by(models.IssueTable.id).limit(batch_size).all()
+        if not rows:
+            return updated
+        try:
+            db.execute(
+                update(models.IssueTable),
+                [{"id": row.id, "triage_rank": triage_rank(row.priority_score, row.creationTime)} for row in rows],
+            )
+            db.commit()
+        except SQLAlchemyError:
+            db.rollback()
+            raise
+        updated += len(rows)
+        last_id = rows[-1].id
@@ -1,34 +1,70 @@
 """
 CityPulse Database Configuration
 SQLAlchemy setup for PostgreSQL connection.
+
+The engine is created on first use rather than at import, so importing the app (or a CLI
+that never touches the database) does not load the DB driver or read settings up front.
 """
 # DOCS:
 # - UGly ahh sqlalchemy doc: https://docs.sqlalchemy.org/en/20/tutorial/index.html 
 # - FastAPI + SQLAlchemy: https://fastapi.tiangolo.com/tutorial/sql-databases/
 
+from functools import lru_cache
+from typing import Optional
+
 from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.orm import sessionmaker, declarative_base
-from app.config import get_settings
-
-settings = get_settings()
-
-#Create engine 
-engine = create_engine(
-    settings.database_url,
-    pool_pre_ping=True,  # Verify connections are alive
-)
+from app.config import get_settings, pool_limits
 
-#Session factory 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+#Session factory (bound to the engine in get_engine)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
 
 #Base class
 Base = declarative_base()
 
+
+def build_engine(url: str) -> Engine:
+    """Engine with the app's pool settings; used for the primary database and every shard."""
+    settings = get_settings()
+    options = {"pool_pre_ping": True}  # Verify connections are alive
+    if make_url(url).get_backend_name() != "sqlite":
+        pool_size, max_overflow = pool_limits(settings)
+        options.update(pool_size=pool_size, max_overflow=max_overflow)
+    return create_engine(url, **options)
+
+
+@lru_cache
+def get_engine() -> Engine:
+    """Create the process-wide engine on first call."""
+    engine = build_engine(get_settings().database_url)
+    SessionLocal.configure(bind=engine)
+    return engine
+
+
+def warm_pool(connections: int, engine: Optional[Engine] = None) -> int:
+    """
+    Open up to `connections` pooled connections and hand them back to the pool, so the first
+    requests after startup do not pay for connecting. Returns how many were opened.
+    """
+    engine = engine or get_engine()
+    opened = []
+    try:
+        for _ in range(max(0, connections)):
+            conn = engine.connect()
+            opened.append(conn)
+            conn.exec_driver_sql("SELECT 1")
+    finally:
+        for conn in opened:
+            conn.close()
+    return len(opened)
+
+
 def get_db():
     """
     FastAPI dependency that provides a database session.
     """
-    db = SessionLocal()
+    db = SessionLocal(bind=get_engine())
     try:
         yield db
     finally:
@@ -0,0 +1,84 @@
+"""
+CityPulse Queued Enrichment
+Classifies reports that POST /reports stored without running the AI workflow, because
+admission control (app.admission) saw the pipeline running slow.
+
+Each report is classified from its stored description and images on a small worker pool
+and its AI fields are filled in with crud.apply_enrichment. Durations feed the admission
+latency signal, so inline classification resumes once Backboard is fast again. Queued
+reports count as in-flight enrichments for the shutdown drain; one that is lost anyway
+(crash, AI failure) keeps null AI fields and is picked up by
+`python -m app.backfill --job <name> --only-missing`.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from types import SimpleNamespace
+from uuid import UUID
+
+from app import crud, startup
+from app.admission import get_admission
+from app.backfill import classify_stored
+from app.config import get_settings
+from app.sharding import get_router
+
+logger = logging.getLogger(__name__)
+
+
+class EnrichmentQueue:
+    def __init__(self, workers: int):
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="enrich")
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        """Reports queued or being classified."""
+        return self._pending
+
+    def submit(self, report_id: UUID, shard: str) -> None:
+        with self._lock:
+            self._pending += 1
+        startup.enrichments.begin()
+        self._pool.submit(self._run, report_id, shard)
+
+    def _run(self, report_id: UUID, shard: str) -> None:
+        started = time.monotonic()
+        try:
+            _enrich(report_id, shard)
+        except Exception:
+            logger.exception("Queued enrichment failed for report %s", report_id)
+        finally:
+            admission = get_admission()
+            if admission is not None:
+                admission.record_latency(time.monotonic() - started)
+            with self._lock:
+                self._pending -= 1
+            startup.enrichments.end()
+
+
+def _enrich(report_id: UUID, shard: str) -> None:
+    with get_router().session(shard) as db:
+        report = crud.get_report(db=db, report_id=report_id)
+        if report is None:
+            return  # deleted (or archived) before its turn came
+        row = SimpleNamespace(
+            id=report.id,
+            description=report.description,
+            images=crud.get_report_images(db, report.id),
+        )
+        db.rollback()  # do not hold the connection's transaction open across the AI call
+        _, thread_id, ai_response = classify_stored(row)
+        if not thread_id or not ai_response:
+            logger.warning("Report %s stays unclassified; re-run with app.backfill --only-missing", report_id)
+            return
+        crud.apply_enrichment(db=db, report=report, thread_id=thread_id, ai_response=ai_response)
+    logger.info("Classified queued report %s", report_id)
+
+
+@lru_cache
+def get_enrichment_queue() -> EnrichmentQueue:
+    """Get the process-wide queue of reports waiting for classification."""
+    return EnrichmentQueue(get_settings().admission_enrichment_workers)
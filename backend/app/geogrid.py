@@ -0,0 +1,316 @@
+"""
+CityPulse Geo Grid
+Multi-resolution grid aggregates over report coordinates, used to serve clustered map tiles.
+
+Every report with coordinates is counted in one Web-Mercator cell per zoom level
+(0..tile_max_grid_zoom), per category/severity. crud keeps the counts up to date in the
+same transaction as the report write, so a tile is a handful of indexed rows to read.
+
+A database holding reports from before the grid existed starts with no cells, so those
+reports are missing from every tile until the grid is rebuilt once:
+
+    python -m app.geogrid rebuild
+"""
+import argparse
+import logging
+import math
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy import text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import get_settings
+from app.sharding import get_router
+
+logger = logging.getLogger(__name__)
+
+MAX_LATITUDE = 85.05112878
+
+# (category, severity, latitude, longitude); None when the report has no coordinates
+GridKey = Optional[Tuple[str, str, float, float]]
+
+
+def lonlat_to_cell(longitude: float, latitude: float, zoom: int) -> Tuple[int, int]:
+    """Web-Mercator (slippy map) tile coordinates of a point at `zoom`."""
+    n = 1 << zoom
+    lat = max(-MAX_LATITUDE, min(MAX_LATITUDE, latitude))
+    lat_rad = math.radians(lat)
+    x = int((longitude + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def grid_key(report) -> GridKey:
+    """What a report contributes to the grid, or None if it is not on the map."""
+    if report.latitude is None or report.longitude is None:
+        return None
+    return (report.category or "", report.severity or "", report.latitude, report.longitude)
+
+
+def _cell_deltas(key: GridKey, sign: int) -> List[dict]:
+    if key is None:
+        return []
+    category, severity, latitude, longitude = key
+    rows = []
+    for zoom in range(get_settings().tile_max_grid_zoom + 1):
+        cell_x, cell_y = lonlat_to_cell(longitude, latitude, zoom)
+        rows.append({
+            "zoom": zoom,
+            "cellX": cell_x,
+            "cellY": cell_y,
+            "category": category,
+            "severity": severity,
+            "count": sign,
+            "sumLatitude": sign * latitude,
+            "sumLongitude": sign * longitude,
+        })
+    return rows
+
+
+_PK = ("zoom", "cellX", "cellY", "category", "severity")
+
+
+def merge_deltas(rows: Iterable[dict]) -> List[dict]:
+    """
+    One delta per cell, in primary-key order, without the ones that cancel out.
+
+    An old and new position that share a cell (low zooms, same category and severity) would
+    otherwise put the same key twice into one multi-row upsert, which Postgres rejects; the
+    fixed order keeps concurrent writers from locking cells in opposite orders.
+    """
+    merged: Dict[tuple, dict] = {}
+    for row in rows:
+        pk = tuple(row[name] for name in _PK)
+        acc = merged.get(pk)
+        if acc is None:
+            merged[pk] = dict(row)
+        else:
+            acc["count"] += row["count"]
+            acc["sumLatitude"] += row["sumLatitude"]
+            acc["sumLongitude"] += row["sumLongitude"]
+    return [
+        merged[pk] for pk in sorted(merged)
+        if merged[pk]["count"] or merged[pk]["sumLatitude"] or merged[pk]["sumLongitude"]
+    ]
+
+
+def _upsert(db: Session, rows: List[dict]) -> None:
+    rows = merge_deltas(rows)
+    if not rows:
+        return
+    table = models.GeoGridCellTable.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = pg_insert if dialect == "postgresql" else sqlite_insert
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[c.name for c in table.primary_key.columns],
+            set_={
+                "count": table.c.count + stmt.excluded.count,
+                "sumLatitude": table.c.sumLatitude + stmt.excluded.sumLatitude,
+                "sumLongitude": table.c.sumLongitude + stmt.excluded.sumLongitude,
+            },
+        )
+        db.execute(stmt, rows)
+        return
+
+    # Portable fallback: read-modify-write through the ORM.
+    for row in rows:
+        pk = tuple(row[name] for name in _PK)
+        cell = db.get(models.GeoGridCellTable, pk)
+        if cell is None:
+            db.add(models.GeoGridCellTable(**row))
+        else:
+            cell.count += row["count"]
+            cell.sumLatitude += row["sumLatitude"]
+            cell.sumLongitude += row["sumLongitude"]
+
+
+def apply_change(db: Session, old: GridKey, new: GridKey) -> None:
+    """
+    Move a report's contribution from `old` to `new` (either may be None).
+
+    Does not commit; callers run it inside the transaction that writes the report.
+    """
+    if old == new:
+        return
+    _upsert(db, _cell_deltas(old, -1) + _cell_deltas(new, +1))
+
+
+def rebuild(db: Session, batch_size: int = 5000) -> int:
+    """
+    Recompute every grid cell from the issues table. Returns the number of reports counted.
+
+    On Postgres the cells are locked first: concurrent report writes wait for the rebuild
+    and then apply their own change on top, so the API can keep running.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("LOCK TABLE geo_grid_cells IN EXCLUSIVE MODE"))
+    totals: Dict[tuple, List[float]] = {}
+    counted = 0
+    query = db.query(
+        models.IssueTable.category,
+        models.IssueTable.severity,
+        models.IssueTable.latitude,
+        models.IssueTable.longitude,
+    ).filter(models.IssueTable.latitude.isnot(None), models.IssueTable.longitude.isnot(None))
+    for row in query.yield_per(batch_size):
+        counted += 1
+        for delta in _cell_deltas((row.category or "", row.severity or "", row.latitude, row.longitude), 1):
+            pk = (delta["zoom"], delta["cellX"], delta["cellY"], delta["category"], delta["severity"])
+            acc = totals.setdefault(pk, [0, 0.0, 0.0])
+            acc[0] += 1
+            acc[1] += delta["sumLatitude"]
+            acc[2] += delta["sumLongitude"]
+
+    rows = [
+        {
+            "zoom": pk[0], "cellX": pk[1], "cellY": pk[2], "category": pk[3], "severity": pk[4],
+            "count": acc[0], "sumLatitude": acc[1], "sumLongitude": acc[2],
+        }
+        for pk, acc in totals.items()
+    ]
+    try:
+        db.query(models.GeoGridCellTable).delete(synchronize_session=False)
+        for start in range(0, len(rows), batch_size):
+            db.execute(models.GeoGridCellTable.__table__.insert(), rows[start:start + batch_size])
+        db.commit()
+    except SQLAlchemyError:
+        db.rollback()
+        raise
+    return counted
+
+
+def tile_level(z: int) -> int:
+    """Grid level whose cells make up the clusters of a zoom-z tile."""
+    settings = get_settings()
+    return min(z + settings.tile_cluster_depth, settings.tile_max_grid_zoom)
+
+
+def tile_cells(
+    db: Session,
+    z: int,
+    x: int,
+    y: int,
+    categories: Optional[Iterable[str]] = None,
+    severities: Optional[Iterable[str]] = None,
+) -> Dict[Tuple[int, int], dict]:
+    """Summed counts and coordinates per non-empty grid cell of tile z/x/y."""
+    level = tile_level(z)
+    cell = models.GeoGridCellTable
+    if level >= z:
+        shift = level - z
+        x_range = (x << shift, (x + 1) << shift)
+        y_range = (y << shift, (y + 1) << shift)
+    else:
+        # Zoomed in past the finest grid: the single enclosing cell covers this tile.
+        shift = z - level
+        x_range = (x >> shift, (x >> shift) + 1)
+        y_range = (y >> shift, (y >> shift) + 1)
+
+    query = db.query(
+        cell.cellX, cell.cellY, cell.category, cell.severity,
+        cell.count, cell.sumLatitude, cell.sumLongitude,
+    ).filter(
+        cell.zoom == level,
+        cell.cellX >= x_range[0], cell.cellX < x_range[1],
+        cell.cellY >= y_range[0], cell.cellY < y_range[1],
+        cell.count > 0,
+    )
+    if categories:
+        query = query.filter(cell.category.in_(list(categories)))
+    if severities:
+        query = query.filter(cell.severity.in_(list(severities)))
+
+    cells: Dict[Tuple[int, int], dict] = {}
+    for row in query:
+        _add_cell(cells, (row.cellX, row.cellY), row.count, row.sumLatitude, row.sumLongitude,
+                  Counter({f"{row.category}|{row.severity}": row.count}))
+    return cells
+
+
+def _add_cell(cells: dict, key: Tuple[int, int], count: int, lat: float, lon: float, by: Counter) -> None:
+    entry = cells.setdefault(key, {"count": 0, "lat": 0.0, "lon": 0.0, "by": Counter()})
+    entry["count"] += count
+    entry["lat"] += lat
+    entry["lon"] += lon
+    entry["by"].update(by)
+
+
+def merge_cells(parts: Iterable[Dict[Tuple[int, int], dict]]) -> Dict[Tuple[int, int], dict]:
+    """Combine tile_cells results from several shards."""
+    merged: Dict[Tuple[int, int], dict] = {}
+    for cells in parts:
+        for key, entry in cells.items():
+            _add_cell(merged, key, entry["count"], entry["lat"], entry["lon"], entry["by"])
+    return merged
+
+
+def format_tile(z: int, x: int, y: int, cells: Dict[Tuple[int, int], dict]) -> dict:
+    """
+    Tile body with one cluster per cell at the centroid of its reports.
+
+    The tile is split into 2**tile_cluster_depth cells per side (capped at the finest grid
+    level).
+    """
+    return {
+        "z": z, "x": x, "y": y, "level": tile_level(z),
+        # [latitude, longitude, count, {"category|severity": count}]
+        "clusters": [
+            [
+                round(entry["lat"] / entry["count"], 6),
+                round(entry["lon"] / entry["count"], 6),
+                entry["count"],
+                dict(entry["by"]),
+            ]
+            for _, entry in sorted(cells.items())
+        ],
+    }
+
+
+def tile_clusters(
+    db: Session,
+    z: int,
+    x: int,
+    y: int,
+    categories: Optional[Iterable[str]] = None,
+    severities: Optional[Iterable[str]] = None,
+) -> dict:
+    """Clustered counts for tile z/x/y from a single database."""
+    return format_tile(z, x, y, tile_cells(db, z, x, y, categories, severities))
+
+
+def purge_empty_cells(db: Session) -> int:
+    """Drop cells whose count fell to zero after deletes/moves."""
+    deleted = db.query(models.GeoGridCellTable).filter(
+        models.GeoGridCellTable.count <= 0
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Map tile grid maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+    rebuild_parser = commands.add_parser("rebuild", help="Recompute every grid cell from the reports")
+    rebuild_parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    router = get_router()
+    try:
+        for shard in router.names:
+            with router.session(shard) as db:
+                counted = rebuild(db, args.batch_size)
+            logger.info("Rebuilt the map grid from %d reports on shard %s", counted, shard)
+    finally:
+        router.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+"""
+CityPulse Idempotency
+Idempotency-Key support for POST /reports so client retries never create duplicates.
+
+Completed responses live in the idempotency_keys table (purged after a TTL) with a
+bounded cache front for the hot retries (shared by all workers under app.serve). A duplicate that arrives while the first
+request is still running waits for it instead of starting a second AI pipeline.
+
+A running request holds its key on a short lease (IDEMPOTENCY_LEASE_SECONDS) that a
+background heartbeat keeps extending for as long as the request runs; the 24h TTL only
+starts once the response is stored. If the worker dies mid-pipeline the heartbeat stops
+with it, and a retry takes the key over once the lease has run out. Every claim carries a
+token, so an attempt whose key was taken over can no longer store or release it.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException, UploadFile
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app import models
+from app.cache import Cache, MemoryCache, get_shared_cache
+from app.config import get_settings
+from app.schemas import Report
+
+logger = logging.getLogger(__name__)
+
+MAX_KEY_LENGTH = 255
+STATUS_IN_PROGRESS = "in_progress"
+STATUS_COMPLETED = "completed"
+_POLL_INTERVAL_SECONDS = 0.25
+_PURGE_INTERVAL_SECONDS = 300
+_CACHE_PREFIX = "idempotency:"
+
+
+def _utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _as_aware(value: datetime) -> datetime:
+    # SQLite hands back naive datetimes even for timezone=True columns.
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def request_fingerprint(report: Report, images: List[UploadFile]) -> str:
+    """Hash the submitted fields and image bytes so a reused key with a different body is caught."""
+    digest = hashlib.sha256()
+    digest.update(report.model_dump_json().encode())
+    for image in images:
+        digest.update((image.filename or "").encode())
+        for chunk in iter(lambda: image.file.read(64 * 1024), b""):
+            digest.update(chunk)
+        image.file.seek(0)
+    return digest.hexdigest()
+
+
+@dataclass
+class _InFlight:
+    fingerprint: str
+    done: threading.Event = field(default_factory=threading.Event)
+    response: Optional[dict] = None
+
+
+class _Heartbeat:
+    """Extends the lease of a held key every third of the lease until stopped or lost."""
+
+    def __init__(self, bind, key: str, token: str, lease: timedelta):
+        self.key = key
+        self.token = token
+        self.lease = lease
+        self._bind = bind
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="idempotency-lease", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.lease.total_seconds() / 3):
+            try:
+                with Session(bind=self._bind) as db:
+                    renewed = db.query(models.IdempotencyKeyTable).filter(
+                        models.IdempotencyKeyTable.key == self.key,
+                        models.IdempotencyKeyTable.claimToken == self.token,
+                        models.IdempotencyKeyTable.status == STATUS_IN_PROGRESS,
+                    ).update({"expiresAt": _utc_now() + self.lease}, synchronize_session=False)
+                    db.commit()
+            except SQLAlchemyError:
+                logger.exception("Failed to extend the lease of idempotency key %s", self.key)
+                continue
+            if renewed == 0:
+                logger.warning("Idempotency key %s was taken over while its request was running", self.key)
+                return
+
+
+@dataclass
+class Claim:
+    """Result of IdempotencyStore.begin: either a response to replay or ownership of the key."""
+    key: str
+    fingerprint: str
+    replay: Optional[dict] = None
+    token: Optional[str] = None
+    heartbeat: Optional[_Heartbeat] = field(default=None, repr=False)
+
+
+class IdempotencyStore:
+    def __init__(self, ttl_seconds: int, wait_seconds: float, cache: Cache, lease_seconds: float = 180.0):
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.lease = timedelta(seconds=lease_seconds)
+        self.wait_seconds = wait_seconds
+        self.cache = cache
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, _InFlight] = {}
+        self._last_purge = 0.0
+
+    # ---- cache front ----
+
+    def _remember(self, key: str, expires_at: datetime, fingerprint: str, response: dict) -> None:
+        ttl = (expires_at - _utc_now()).total_seconds()
+        self.cache.set(_CACHE_PREFIX + key, (fingerprint, response), ttl)
+
+    def _recall(self, key: str) -> Optional[tuple]:
+        """(fingerprint, response) of a completed key, if cached."""
+        return self.cache.get(_CACHE_PREFIX + key)
+
+    # ---- public API ----
+
+    def begin(self, db: Session, key: str, fingerprint: str) -> Claim:
+        """
+        Claim `key` for this request, or return the stored response of an earlier one.
+
+        Raises HTTPException 422 if the key was used with a different payload and 409 if
+        another request holding the key did not finish within the wait timeout.
+        """
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail="Invalid Idempotency-Key header")
+
+        self._maybe_purge(db)
+        deadline = time.monotonic() + self.wait_seconds
+        while True:
+            cached = self._recall(key)
+            with self._lock:
+                inflight = self._inflight.get(key) if cached is None else None
+                owner = cached is None and inflight is None
+                if owner:
+                    inflight = self._inflight[key] = _InFlight(fingerprint)
+
+            if cached is not None:
+                self._check_fingerprint(cached[0], fingerprint)
+                return Claim(key, fingerprint, replay=cached[1])
+
+            if owner:
+                break
+
+            # Same key already running in this process: wait for it rather than re-running the pipeline.
+            self._check_fingerprint(inflight.fingerprint, fingerprint)
+            if not inflight.done.wait(max(0.0, deadline - time.monotonic())):
+                raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+            if inflight.response is not None:
+                return Claim(key, fingerprint, replay=inflight.response)
+            # The first attempt failed; loop and try to take the key ourselves.
+
+        token = uuid.uuid4().hex
+        try:
+            replay = self._claim_row(db, key, fingerprint, token, deadline)
+        except BaseException:
+            self._finish(key, None)
+            raise
+        if replay is not None:
+            self._finish(key, replay)
+            return Claim(key, fingerprint, replay=replay)
+        return Claim(key, fingerprint, token=token, heartbeat=_Heartbeat(db.get_bind(), key, token, self.lease))
+
+    def complete(self, db: Session, claim: Claim, report_id, response: dict) -> None:
+        """Persist the response for `claim`, if it still holds the key, and wake up any waiting duplicates."""
+        claim.heartbeat.stop()
+        expires_at = _utc_now() + self.ttl
+        try:
+            stored = self._owned(db, claim).update({
+                "status": STATUS_COMPLETED,
+                "claimToken": None,
+                "reportId": report_id,
+                "response": json.dumps(response),
+                "expiresAt": expires_at,
+            }, synchronize_session=False)
+            db.commit()
+        except SQLAlchemyError:
+            db.rollback()
+            # The report itself is stored; losing the key only means a retry is not deduplicated.
+            logger.exception("Failed to store idempotent response for key %s", claim.key)
+            stored = 0
+        if stored:
+            self._remember(claim.key, expires_at, claim.fingerprint, response)
+        else:
+            logger.warning("Idempotency key %s is no longer held by this request; its response is not stored", claim.key)
+        self._finish(claim.key, response)
+
+    def release(self, db: Session, claim: Claim) -> None:
+        """Give the key back after a failed attempt so the client can retry it."""
+        claim.heartbeat.stop()
+        try:
+            self._owned(db, claim).delete(synchronize_session=False)
+            db.commit()
+        except SQLAlchemyError:
+            db.rollback()
+            logger.exception("Failed to release idempotency key %s", claim.key)
+        self._finish(claim.key, None)
+
+    def purge_expired(self, db: Session) -> int:
+        """Delete expired keys; returns the number of rows removed."""
+        try:
+            deleted = db.query(models.IdempotencyKeyTable).filter(
+                models.IdempotencyKeyTable.expiresAt <= _utc_now()
+            ).delete(synchronize_session=False)
+            db.commit()
+        except SQLAlchemyError:
+            db.rollback()
+            logger.exception("Failed to purge expired idempotency keys")
+            return 0
+        return deleted
+
+    # ---- helpers ----
+
+    @staticmethod
+    def _owned(db: Session, claim: Claim):
+        """Query matching the key's row only while `claim` still holds it."""
+        return db.query(models.IdempotencyKeyTable).filter(
+            models.IdempotencyKeyTable.key == claim.key,
+            models.IdempotencyKeyTable.requestHash == claim.fingerprint,
+            models.IdempotencyKeyTable.status == STATUS_IN_PROGRESS,
+            models.IdempotencyKeyTable.claimToken == claim.token,
+        )
+
+    @staticmethod
+    def _check_fingerprint(stored: str, fingerprint: str) -> None:
+        if stored != fingerprint:
+            raise HTTPException(
+                status_code=422,
+                detail="Idempotency-Key was already used with a different request payload",
+            )
+
+    def _finish(self, key: str, response: Optional[dict]) -> None:
+        with self._lock:
+            inflight = self._inflight.pop(key, None)
+        if inflight is not None:
+            inflight.response = response
+            inflight.done.set()
+
+    def _maybe_purge(self, db: Session) -> None:
+        now = time.monotonic()
+        if now - self._last_purge < _PURGE_INTERVAL_SECONDS:
+            return
+        self._last_purge = now
+        self.purge_expired(db)
+
+    def _claim_row(self, db: Session, key: str, fingerprint: str, token: str, deadline: float) -> Optional[dict]:
+        """Insert the in-progress row, or wait for whichever process already holds it."""
+        while True:
+            row = db.get(models.IdempotencyKeyTable, key)
+            if row is not None and _as_aware(row.expiresAt) <= _utc_now():
+                # An expired response, or the lease of an attempt that died mid-pipeline.
+                if self._take_over(db, key, fingerprint, token):
+                    return None
+                db.expire_all()
+                continue
+
+            if row is None:
+                db.add(models.IdempotencyKeyTable(
+                    key=key,
+                    requestHash=fingerprint,
+                    status=STATUS_IN_PROGRESS,
+                    claimToken=token,
+                    expiresAt=_utc_now() + self.lease,
+                ))
+                try:
+                    db.commit()
+                    return None
+                except IntegrityError:
+                    # Another process inserted the key between our read and write.
+                    db.rollback()
+                    continue
+
+            self._check_fingerprint(row.requestHash, fingerprint)
+            if row.status == STATUS_COMPLETED:
+                response = json.loads(row.response)
+                self._remember(key, _as_aware(row.expiresAt), fingerprint, response)
+                return response
+
+            if time.monotonic() >= deadline:
+                raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+            time.sleep(_POLL_INTERVAL_SECONDS)
+            db.expire_all()
+
+    def _take_over(self, db: Session, key: str, fingerprint: str, token: str) -> bool:
+        """Claim an expired row; only one of several concurrent callers gets it."""
+        now = _utc_now()
+        try:
+            taken = db.query(models.IdempotencyKeyTable).filter(
+                models.IdempotencyKeyTable.key == key,
+                models.IdempotencyKeyTable.expiresAt <= now,
+            ).update({
+                "requestHash": fingerprint,
+                "status": STATUS_IN_PROGRESS,
+                "claimToken": token,
+                "reportId": None,
+                "response": None,
+                "creationTime": now,
+                "expiresAt": now + self.lease,
+            }, synchronize_session=False)
+            db.commit()
+        except SQLAlchemyError:
+            db.rollback()
+            raise
+        return taken == 1
+
+
+@lru_cache
+def get_idempotency_store() -> IdempotencyStore:
+    """Get the process-wide idempotency store."""
+    settings = get_settings()
+    return IdempotencyStore(
+        ttl_seconds=settings.idempotency_ttl_seconds,
+        wait_seconds=settings.idempotency_wait_seconds,
+        lease_seconds=settings.idempotency_lease_seconds,
+        cache=get_shared_cache() or MemoryCache(settings.idempotency_memory_entries),
+    )
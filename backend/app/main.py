@@ -1,23 +1,48 @@
 """CityPulse Backend API."""
 
 import logging
+import time
 import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
 from typing import List, Optional
 from uuid import UUID
 
-from fastapi import Depends, FastAPI, File, Form, HTTPException, UploadFile
+from fastapi import Depends, FastAPI, File, Form, Header, HTTPException, Request, Response, UploadFile
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 
-from app import crud
-from app.ai_workflow.workflow import run_backboard_ai
+from app import crud, startup
+from app.admission import AdmissionMiddleware
+from app.ai_workflow.workflow import run_backboard_ai, run_backboard_follow_up
+from app.blobstore import get_blob_store
 from app.database import get_db
-from app.schemas import IssueOut, Report, ReportUpdate
-from app.validators import validate_images
+from app.enrichment import get_enrichment_queue
+from app.idempotency import get_idempotency_store, request_fingerprint
+from app.routing import blobs, tiles, triage
+from app.schemas import IssueOut, Report, ReportStatus, ReportUpdate
+from app.serialization import issue_out_encoder
+from app.sharding import as_utc, get_router, merge_sorted
+from app.validators import detect_image_type, validate_images
 
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="CityPulse API", version="1.0.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm the DB pool and Backboard connections before the first request is accepted.
+    await run_in_threadpool(startup.warm_up)
+    yield
+    await run_in_threadpool(startup.drain)
+    startup.shutdown()
+
+
+app = FastAPI(title="CityPulse API", version="1.0.0", lifespan=lifespan)
+
+# Decides on POST /reports before the upload is read; added first so CORS headers still
+# wrap its 503s.
+app.add_middleware(AdmissionMiddleware, path="/reports", backlog=lambda: get_enrichment_queue().pending)
 
 # TODO: tighten origins/methods/headers for prod
 app.add_middleware(
@@ -27,6 +52,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.include_router(triage.router)
+app.include_router(tiles.router)
+app.include_router(blobs.router)
+
 
 @app.get("/health")
 def health():
@@ -41,6 +70,8 @@ def root():
 
 @app.post("/reports", response_model=IssueOut)
 def create_report(
+    request: Request,
+    response: Response,
     title: str = Form(...),
     description: str = Form(...),
     address: str = Form(...),
@@ -48,9 +79,17 @@ def create_report(
     latitude: Optional[float] = Form(None),
     longitude: Optional[float] = Form(None),
     issueImages: List[UploadFile] = File(...),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     db: Session = Depends(get_db),
 ):
-    """Create a new report."""
+    """Create a new report.
+
+    Clients may send an Idempotency-Key header; retries with the same key return the
+    original response instead of creating a duplicate report.
+
+    Under load admission control may answer 503 with Retry-After before the upload is read,
+    or accept the report with 202 and fill in its AI fields shortly afterwards.
+    """
     validate_images(issueImages)
 
     userReport = Report(
@@ -62,8 +101,88 @@ def create_report(
         longitude=longitude,
     )
 
+    claim = None
+    if idempotency_key is not None:
+        store = get_idempotency_store()
+        claim = store.begin(db, idempotency_key, request_fingerprint(userReport, issueImages))
+        if claim.replay is not None:
+            response.headers["Idempotent-Replayed"] = "true"
+            return claim.replay
+
+    defer = getattr(request.state, "defer_enrichment", False)
+    started = time.monotonic()
+    try:
+        with startup.enrichments.track():
+            report = _run_report_pipeline(userReport, description, issueImages, defer=defer)
+    except BaseException:
+        if claim is not None:
+            store.release(db, claim)
+        raise
+    finally:
+        if not defer:
+            # Latency signal for admission control (see AdmissionMiddleware).
+            request.state.pipeline_seconds = time.monotonic() - started
+
+    if claim is not None:
+        store.complete(db, claim, report.id, IssueOut.model_validate(report).model_dump(mode="json"))
+    if defer:
+        response.status_code = 202
+    return report
+
+
+def _run_report_pipeline(
+    userReport: Report,
+    description: str,
+    issueImages: List[UploadFile],
+    defer: bool = False,
+):
+    """
+    Run the AI workflow, store the images and persist the enriched report on its city's shard.
+
+    With `defer` the report is persisted without AI fields and queued for app.enrichment.
+    """
     report_id = uuid.uuid4()
+    shards = get_router()
+    # Resolved before the AI call so a city that is being moved fails fast with 503;
+    # crud re-checks it in the insert transaction (sharding.fence).
+    shard = shards.shard_for_city(userReport.city, for_write=True)
 
+    if defer:
+        threadId, creationTime, aiResponse = None, datetime.now(timezone.utc), {}
+    else:
+        threadId, creationTime, aiResponse = _classify(description, issueImages)
+
+    # Only once the report is going to be written, so a failed AI call leaves no blobs behind.
+    try:
+        images = _store_images(issueImages)
+    except Exception:
+        logger.exception("Failed to store report images")
+        raise HTTPException(status_code=500, detail="Failed to store images")
+
+    try:
+        with shards.session(shard) as db:
+            report = crud.create_report(
+                db=db,
+                user_report=userReport,
+                ai_response=aiResponse,
+                report_id=report_id,
+                thread_id=threadId,
+                creation_time=creationTime,
+                images=images,
+            )
+    except HTTPException:
+        raise  # the city started moving to another shard meanwhile (503)
+    except Exception:
+        logger.exception("Failed to persist report")
+        raise HTTPException(status_code=500, detail="Failed to create report")
+
+    shards.remember(report.id, shard)
+    if defer:
+        get_enrichment_queue().submit(report.id, shard)
+    return report
+
+
+def _classify(description: str, issueImages: List[UploadFile]):
     try:
         threadId, creationTime, aiResponse = run_backboard_ai(
             description=description,
@@ -77,42 +196,123 @@ def create_report(
     except Exception:
         logger.exception("Unexpected error in AI workflow")
         raise HTTPException(status_code=502, detail="AI workflow failed") from None
+    return threadId, creationTime, aiResponse
 
-    try:
-        report = crud.create_report(
-            db=db,
-            user_report=userReport,
-            ai_response=aiResponse,
-            report_id=report_id,
-            thread_id=threadId,
-            creation_time=creationTime,
-        )
-    except Exception:
-        logger.exception("Failed to persist report")
-        raise HTTPException(status_code=500, detail="Failed to create report")
 
+def _store_images(issueImages: List[UploadFile]) -> List[dict]:
+    """Stream each upload into the blob store (deduplicated by content hash)."""
+    store = get_blob_store()
+    stored = []
+    for image in issueImages:
+        info = store.put(image.file)
+        stored.append({
+            "blobId": info.id,
+            "size": info.size,
+            "contentType": detect_image_type(image),
+            "filename": image.filename,
+        })
+    return stored
+
+
+@app.post("/reports/{report_id}/clarification", response_model=IssueOut)
+def answer_clarification(
+    report_id: UUID,
+    answer: str = Form(...),
+    issueImages: List[UploadFile] = File([]),
+):
+    """Answer the assistant's clarification question for a report.
+
+    The answer (and any extra photos) is appended to the report's existing Backboard
+    thread, and only the AI fields that the updated analysis changed are written back.
+    """
+    with get_router().report_session(report_id, for_write=True) as db:
+        return _answer_clarification(db, report_id, answer, issueImages)
+
+
+def _answer_clarification(db: Session, report_id: UUID, answer: str, issueImages: List[UploadFile]):
+    report = crud.get_report(db=db, report_id=report_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Report not found")
+    if report.status != ReportStatus.WAITING.value or not report.needs_clarification:
+        raise HTTPException(status_code=409, detail="Report is not waiting for a clarification")
+    if not report.threadId:
+        raise HTTPException(status_code=409, detail="Report has no AI thread to follow up on")
+    if not answer.strip():
+        raise HTTPException(status_code=400, detail="Answer must not be empty")
+    validate_images(issueImages)
+    threadId, question = report.threadId, report.clarification
+    db.rollback()  # do not hold the connection's transaction open across the AI call
+
+    with startup.enrichments.track():
+        try:
+            aiResponse = run_backboard_follow_up(threadId, answer, issueImages)
+        except Exception:
+            logger.exception("Unexpected error in AI follow-up")
+            aiResponse = {}
+        if not aiResponse:
+            raise HTTPException(status_code=502, detail="AI workflow failed")
+
+        try:
+            images = _store_images(issueImages)
+        except Exception:
+            logger.exception("Failed to store clarification images")
+            raise HTTPException(status_code=500, detail="Failed to store images")
+
+        try:
+            changed = crud.apply_clarification(
+                db=db,
+                report=report,
+                question=question,
+                answer=answer,
+                ai_response=aiResponse,
+                images=images,
+            )
+        except HTTPException:
+            raise
+        except Exception:
+            logger.exception("Failed to persist clarification")
+            raise HTTPException(status_code=500, detail="Failed to update report")
+        if changed is None:
+            # Answered (or changed) by another request while the assistant was thinking.
+            raise HTTPException(status_code=409, detail="Report is not waiting for a clarification")
+
+    logger.info("Clarification for report %s changed %s", report_id, changed or "nothing")
     return report
 
 
 @app.get("/reports", response_model=List[IssueOut])
 def list_reports(
     status: Optional[str] = None,
-    db: Session = Depends(get_db),
+    include_archived: bool = False,
 ):
-    """List all reports."""
-    return crud.get_reports(db=db, status_filter=status)
+    """List all reports (archived ones only when include_archived is set), newest first across shards."""
+    parts = get_router().scatter(lambda db: crud.get_report_rows(
+        db=db,
+        columns=issue_out_encoder.fields,
+        status_filter=status,
+        include_archived=include_archived,
+    ))
+    rows = merge_sorted(
+        parts.values(),
+        key=lambda row: as_utc(row.creationTime),
+        reverse=True,
+        unique=lambda row: row.id,
+    )
+    return Response(content=issue_out_encoder.encode_many(rows), media_type="application/json")
 
 
 @app.get("/reports/{report_id}", response_model=IssueOut)
 def get_report(
     report_id: UUID,
-    db: Session = Depends(get_db),
 ):
-    """Get a single report by ID."""
-    report = crud.get_report(db=db, report_id=report_id)
-    if not report:
+    """Get a single report by ID, including archived ones."""
+    row = get_router().find(
+        lambda db: crud.find_report_row(db=db, report_id=report_id, columns=issue_out_encoder.fields),
+        report_id,
+    )
+    if row is None:
         raise HTTPException(status_code=404, detail="Report not found")
-    return report
+    return Response(content=issue_out_encoder.encode_one(row), media_type="application/json")
 
 
 # TODO: add authentication middleware and role check
@@ -120,19 +320,19 @@ def get_report(
 def update_report(
     report_id: UUID,
     updated_report: ReportUpdate,
-    db: Session = Depends(get_db),
 ):
     """Update a report."""
     if report_id != updated_report.report_id:
         raise HTTPException(status_code=400, detail="Path report_id does not match body report_id")
 
-    report = crud.update_report(
-        db=db,
-        report_id=updated_report.report_id,
-        new_title=updated_report.title,
-        new_description=updated_report.description,
-        new_status=updated_report.status,
-    )
+    with get_router().report_session(report_id, for_write=True) as db:
+        report = crud.update_report(
+            db=db,
+            report_id=updated_report.report_id,
+            new_title=updated_report.title,
+            new_description=updated_report.description,
+            new_status=updated_report.status,
+        )
 
     if report is None:
         raise HTTPException(status_code=404, detail="Report not found")
@@ -142,10 +342,10 @@ def update_report(
 @app.delete("/reports/{report_id}", status_code=204)
 def delete_report(
     report_id: UUID,
-    db: Session = Depends(get_db),
 ):
     """Delete a report."""
-    deleted = crud.delete_report(db=db, report_id=report_id)
+    with get_router().report_session(report_id, for_write=True) as db:
+        deleted = crud.delete_report(db=db, report_id=report_id)
     if not deleted:
         raise HTTPException(status_code=404, detail="Report not found")
     return None
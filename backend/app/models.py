@@ -6,11 +6,11 @@ SQLAlchemy models for the civic issue reporting system.
 import uuid
 from datetime import datetime, timezone 
 
-from sqlalchemy import Column, DateTime, ForeignKey, String, Text, Float, Integer, Boolean
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import BigInteger, Column, DateTime, ForeignKey, String, Text, Float, Integer, Boolean, Uuid, Index, PrimaryKeyConstraint
 from sqlalchemy.orm import relationship
 
 from app.database import Base
+from app.schemas import ReportStatus
 
 def utc_now():
     return datetime.now(timezone.utc)
@@ -18,7 +18,7 @@ def utc_now():
 class IssueTable(Base):
     __tablename__ = "issues"
     
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(Uuid(as_uuid=True), primary_key=True, default=uuid.uuid4)
 
     # Core user report fields (match schemas.Report / ReportInDB)
     title = Column(String, nullable=False)
@@ -41,17 +41,43 @@ class IssueTable(Base):
     clarification = Column(String, nullable=True)
     nbOfMatches = Column(Integer, nullable=False, default=0)
 
+    # Triage queue: time-invariant aging key (see crud.triage_rank) and crew lease
+    triage_rank = Column(Float, nullable=True)
+    claimed_by = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime(timezone=True), nullable=True)
+
     creationTime = Column(DateTime(timezone=True), default=utc_now, nullable=False)
     updated_at = Column(DateTime(timezone=True), default=utc_now, onupdate=utc_now, nullable=False)
 
     events = relationship("IssueEventTable", back_populates="issue", cascade="all, delete-orphan")
 
 
+# Statuses a crew can still pick up from the triage queue
+TRIAGE_STATUSES = (ReportStatus.NEW.value, ReportStatus.IN_PROGRESS.value)
+
+# Partial indexes over open reports only, so resolved rows never bloat the triage scans
+_open_issues = IssueTable.status.in_(TRIAGE_STATUSES)
+Index(
+    "ix_issues_triage_scoped",
+    IssueTable.city,
+    IssueTable.category,
+    IssueTable.triage_rank.desc(),
+    postgresql_where=_open_issues,
+    sqlite_where=_open_issues,
+)
+Index(
+    "ix_issues_triage",
+    IssueTable.triage_rank.desc(),
+    postgresql_where=_open_issues,
+    sqlite_where=_open_issues,
+)
+
+
 class IssueEventTable(Base):
     __tablename__ = "issue_events"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    reportId = Column(UUID(as_uuid=True), ForeignKey("issues.id"), nullable=False)
+    id = Column(Uuid(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    reportId = Column(Uuid(as_uuid=True), ForeignKey("issues.id"), nullable=False)
 
     eventType = Column(String, nullable=False)
     payload = Column(Text, nullable=True)
@@ -61,4 +87,176 @@ class IssueEventTable(Base):
     issue = relationship("IssueTable", back_populates="events")
 
 
+class BlobTable(Base):
+    """An image stored in the content-addressed blob store (id = SHA-256 of the bytes)."""
+    __tablename__ = "blobs"
+
+    id = Column(String(64), primary_key=True)
+    size = Column(Integer, nullable=False)
+    contentType = Column(String, nullable=False)
+
+    creationTime = Column(DateTime(timezone=True), default=utc_now, nullable=False)
+
+
+class IssueBlobTable(Base):
+    """Links a report to the images uploaded with it."""
+    __tablename__ = "issue_blobs"
+
+    # No FK on reportId: links stay valid after app.archive moves the report to the cold tier.
+    reportId = Column(Uuid(as_uuid=True), nullable=False, index=True)
+    blobId = Column(String(64), ForeignKey("blobs.id"), nullable=False)
+    position = Column(Integer, nullable=False, default=0)
+    filename = Column(String, nullable=True)
+
+    __table_args__ = (
+        PrimaryKeyConstraint("reportId", "blobId"),
+    )
+
+
+class BackfillJobTable(Base):
+    """Checkpoint of a re-classification run (see app.backfill)."""
+    __tablename__ = "backfill_jobs"
+
+    name = Column(String, primary_key=True)
+    params = Column(Text, nullable=False)
+    status = Column(String, nullable=False, default="running")
+    cursor = Column(Uuid(as_uuid=True), nullable=True)  # last report id fully processed
+
+    processed = Column(Integer, nullable=False, default=0)
+    updated = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    failedIds = Column(Text, nullable=False, default="[]")  # JSON list of report ids to retry
+
+    creationTime = Column(DateTime(timezone=True), default=utc_now, nullable=False)
+    updated_at = Column(DateTime(timezone=True), default=utc_now, onupdate=utc_now, nullable=False)
+
+
+# ---- Cold tier (see app.archive) ----
+# Resolved reports past the archive age are moved here. On Postgres both tables are
+# range-partitioned by month on creationTime, so the partition key is part of the PK.
+
+class ArchivedIssueTable(Base):
+    __tablename__ = "issues_archive"
+
+    id = Column(Uuid(as_uuid=True), nullable=False)
+
+    title = Column(String, nullable=False)
+    description = Column(Text, nullable=False)
+    address = Column(String, nullable=False)
+    city = Column(String, nullable=False)
+
+    status = Column(String, nullable=False)
+
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
+
+    threadId = Column(String, nullable=True)
+    category = Column(String, nullable=True)
+    severity = Column(String, nullable=True)
+    priority = Column(String, nullable=True)
+    priority_score = Column(Integer, nullable=True)
+    needs_clarification = Column(Boolean, nullable=True)
+    clarification = Column(String, nullable=True)
+    nbOfMatches = Column(Integer, nullable=False, default=0)
+
+    creationTime = Column(DateTime(timezone=True), nullable=False)
+    updated_at = Column(DateTime(timezone=True), nullable=False)
+    archivedAt = Column(DateTime(timezone=True), default=utc_now, nullable=False)
+
+    __table_args__ = (
+        PrimaryKeyConstraint("id", "creationTime"),
+        Index("ix_issues_archive_id", "id"),
+        {"postgresql_partition_by": 'RANGE ("creationTime")'},
+    )
+
+
+class ArchivedIssueEventTable(Base):
+    __tablename__ = "issue_events_archive"
+
+    id = Column(Uuid(as_uuid=True), nullable=False)
+    reportId = Column(Uuid(as_uuid=True), nullable=False, index=True)
+
+    eventType = Column(String, nullable=False)
+    payload = Column(Text, nullable=True)
+
+    creationTime = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        PrimaryKeyConstraint("id", "creationTime"),
+        {"postgresql_partition_by": 'RANGE ("creationTime")'},
+    )
+
+
+class IdempotencyKeyTable(Base):
+    """Outcome of a POST /reports call, keyed by the client's Idempotency-Key header."""
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String(255), primary_key=True)
+    requestHash = Column(String(64), nullable=False)
+    status = Column(String, nullable=False, default="in_progress")
+    claimToken = Column(String(32), nullable=True)  # which attempt holds an in-progress key
+    reportId = Column(Uuid(as_uuid=True), nullable=True)
+    response = Column(Text, nullable=True)
+
+    creationTime = Column(DateTime(timezone=True), default=utc_now, nullable=False)
+    expiresAt = Column(DateTime(timezone=True), nullable=False, index=True)
+
+
+class GeoGridCellTable(Base):
+    """Report counts per Web-Mercator grid cell, zoom level, category and severity (see app.geogrid)."""
+    __tablename__ = "geo_grid_cells"
 
+    zoom = Column(Integer, nullable=False)
+    cellX = Column(Integer, nullable=False)
+    cellY = Column(Integer, nullable=False)
+    category = Column(String, nullable=False, default="")
+    severity = Column(String, nullable=False, default="")
+
+    count = Column(Integer, nullable=False, default=0)
+    sumLatitude = Column(Float, nullable=False, default=0.0)
+    sumLongitude = Column(Float, nullable=False, default=0.0)
+
+    __table_args__ = (
+        PrimaryKeyConstraint("zoom", "cellX", "cellY", "category", "severity"),
+    )
+
+
+class CityShardTable(Base):
+    """Which shard holds a city's reports (see app.sharding); lives on the primary database."""
+    __tablename__ = "city_shards"
+
+    city = Column(String, primary_key=True)  # sharding.normalize_city() form
+    shard = Column(String, nullable=False)
+    locked = Column(Boolean, nullable=False, default=False)  # writes paused while rebalancing
+
+    updated_at = Column(DateTime(timezone=True), default=utc_now, onupdate=utc_now, nullable=False)
+
+
+# ---- Transactional outbox (see app.outbox) ----
+# crud writes one row per report change in the same transaction as the change; relays
+# deliver them to other systems in id order and record their progress per consumer.
+
+class OutboxTable(Base):
+    __tablename__ = "outbox"
+
+    # SQLite AUTOINCREMENT: ids are never reused after pruning, so offsets stay valid
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    reportId = Column(Uuid(as_uuid=True), nullable=False)
+    eventType = Column(String, nullable=False)  # report.created / report.updated / report.deleted
+    payload = Column(Text, nullable=False)  # the report as GET /reports/{id} returns it
+
+    creationTime = Column(DateTime(timezone=True), default=utc_now, nullable=False, index=True)
+
+    __table_args__ = (
+        {"sqlite_autoincrement": True},
+    )
+
+
+class OutboxOffsetTable(Base):
+    """Last outbox id a relay consumer has delivered."""
+    __tablename__ = "outbox_offsets"
+
+    consumer = Column(String, primary_key=True)
+    position = Column(BigInteger, nullable=False, default=0)
+
+    updated_at = Column(DateTime(timezone=True), default=utc_now, onupdate=utc_now, nullable=False)
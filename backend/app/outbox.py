@@ -0,0 +1,375 @@
+"""
+CityPulse Outbox
+Feeds report changes to other city systems (work orders, GIS, the open-data portal) so
+they no longer need to poll GET /reports.
+
+Every write path of a report (crud's create/update/delete, AI write-backs, triage claims
+and releases, backfill, archive, rebalance) calls `record`, which adds an outbox row in
+the same transaction as the change: a change is published if and only if it committed. A relay per consumer reads the outbox of every shard in id order
+and hands batches to a sink, then advances that consumer's offset. Delivery is
+at-least-once (a batch is retried until the sink accepts it, and redelivered if the relay
+dies before saving the offset); events of one report arrive in the order they happened.
+Consumers de-duplicate on (shard, id).
+
+    python -m app.outbox relay --consumer gis --webhook https://gis.example.org/citypulse
+    python -m app.outbox relay --consumer open-data --spool /var/lib/citypulse/outbox
+    python -m app.outbox relay --consumer work-orders --queue /var/lib/citypulse/queue --partitions 8
+    python -m app.outbox status
+    python -m app.outbox prune --older-than-hours 168
+
+Sinks:
+- WebhookSink: POSTs {"events": [...]} as JSON; any non-2xx answer is a failed delivery
+- SpoolSink: appends NDJSON lines to one file per day, for batch importers
+- QueueSink: message-queue stand-in; appends to one NDJSON log per partition, the
+  partition chosen from the report id (like a Kafka message key) so a report's events
+  stay in order. A real broker plugs in as another Sink.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List
+
+import requests
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import get_settings
+from app.schemas import IssueOut
+from app.sharding import ShardRouter, as_utc, get_router
+
+logger = logging.getLogger(__name__)
+
+CREATED = "report.created"
+UPDATED = "report.updated"
+DELETED = "report.deleted"
+ARCHIVED = "report.archived"  # left the hot table; still readable through GET /reports/{id}
+MOVED = "report.moved"  # now on the event's shard; later events of the report come from there
+
+_MAX_BACKOFF_SECONDS = 60.0
+
+
+def record(db: Session, event_type: str, report) -> None:
+    """
+    Add an outbox row describing `report` after the change being made to it.
+
+    `report` is an IssueTable instance or any row carrying the IssueOut fields (Core
+    paths pass SimpleNamespace(**mapping)). Flushes pending changes first so server-side
+    values (updated_at) are in the payload. Does not commit; callers run it as the last
+    statement of the transaction that writes the report, so the outbox id is drawn as
+    late as possible and the gap it leaves for the relay is short.
+    """
+    db.flush()
+    if db.get_bind().dialect.name == "postgresql":
+        # The relay's gap rule needs the transaction id to be assigned before the outbox id.
+        db.execute(select(func.pg_current_xact_id()))
+    snapshot = jsonable_encoder({name: getattr(report, name) for name in IssueOut.model_fields})
+    db.add(models.OutboxTable(reportId=report.id, eventType=event_type, payload=json.dumps(snapshot)))
+
+
+# ---- sinks ----
+
+class Sink:
+    """Destination of a relay. `deliver` must raise unless every event was accepted."""
+
+    def deliver(self, events: List[dict]) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class WebhookSink(Sink):
+    def __init__(self, url: str, timeout: float):
+        self.url = url
+        self.timeout = timeout
+        self._session = requests.Session()
+
+    def deliver(self, events: List[dict]) -> None:
+        first, last = events[0], events[-1]
+        response = self._session.post(
+            self.url,
+            json={"events": events},
+            headers={"X-CityPulse-Delivery": f"{first['shard']}:{first['id']}-{last['id']}"},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+
+    def close(self) -> None:
+        self._session.close()
+
+
+def _append_lines(path: str, events: List[dict]) -> None:
+    data = "".join(json.dumps(event, separators=(",", ":")) + "\n" for event in events)
+    with open(path, "a", encoding="utf-8") as fh:
+        fh.write(data)
+        fh.flush()
+        os.fsync(fh.fileno())
+
+
+class SpoolSink(Sink):
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def deliver(self, events: List[dict]) -> None:
+        day = datetime.now(timezone.utc).strftime("%Y%m%d")
+        _append_lines(os.path.join(self.directory, f"outbox-{day}.ndjson"), events)
+
+
+class QueueSink(Sink):
+    def __init__(self, directory: str, partitions: int):
+        self.directory = directory
+        self.partitions = max(1, partitions)
+        os.makedirs(directory, exist_ok=True)
+
+    def partition(self, report_id: str) -> int:
+        digest = hashlib.blake2b(report_id.encode(), digest_size=8).digest()
+        return int.from_bytes(digest, "big") % self.partitions
+
+    def deliver(self, events: List[dict]) -> None:
+        by_partition = {}
+        for event in events:
+            by_partition.setdefault(self.partition(event["reportId"]), []).append(event)
+        for partition, batch in sorted(by_partition.items()):
+            _append_lines(os.path.join(self.directory, f"partition-{partition}.ndjson"), batch)
+
+
+# ---- relay ----
+
+def _offset(db: Session, consumer: str) -> models.OutboxOffsetTable:
+    offset = db.get(models.OutboxOffsetTable, consumer)
+    if offset is None:
+        offset = models.OutboxOffsetTable(consumer=consumer, position=0)
+        db.add(offset)
+        db.commit()
+    return offset
+
+
+def ready_rows(
+    rows: List[models.OutboxTable],
+    position: int,
+    gap_closed: Callable[[int, models.OutboxTable], bool],
+) -> List[models.OutboxTable]:
+    """
+    The rows after `position` that can be delivered without breaking id order.
+
+    Ids are handed out when a transaction inserts, not when it commits, so a missing id may
+    belong to a transaction that is still running. Delivery stops at such a gap until
+    `gap_closed(missing id, row after the gap)` says no transaction can still commit it.
+    """
+    ready = []
+    expected = position + 1
+    for row in rows:
+        if row.id != expected and not gap_closed(expected, row):
+            break
+        ready.append(row)
+        expected = row.id + 1
+    return ready
+
+
+def _envelope(shard: str, row: models.OutboxTable) -> dict:
+    return {
+        "id": row.id,
+        "shard": shard,
+        "event": row.eventType,
+        "reportId": str(row.reportId),
+        "occurredAt": as_utc(row.creationTime).isoformat(),
+        "report": json.loads(row.payload),
+    }
+
+
+class Relay:
+    def __init__(self, consumer: str, sink: Sink, router: ShardRouter, batch_size: int, settle_seconds: float):
+        self.consumer = consumer
+        self.sink = sink
+        self.router = router
+        self.batch_size = batch_size
+        self.settle = timedelta(seconds=settle_seconds)
+        self._retry_at = {}  # shard -> (monotonic time, current backoff)
+        self._gaps = {}  # shard -> (missing id, transaction horizon when first seen)
+
+    def _gap_rule(self, db: Session, shard: str) -> Callable[[int, models.OutboxTable], bool]:
+        """
+        How to tell, on this shard's database, that a missing id will never be committed.
+
+        - SQLite: one writer at a time, and AUTOINCREMENT ids are drawn under the write
+          lock, so a later committed id means the missing one was rolled back.
+        - PostgreSQL: the writer of the missing id already had a transaction id (`record`
+          makes sure of it), below the snapshot xmax seen with the gap. Once the oldest
+          running transaction is past that horizon, the writer has finished either way.
+        - Anything else: wait until the row after the gap is `settle` old.
+        """
+        dialect = db.get_bind().dialect.name
+        if dialect == "sqlite":
+            return lambda expected, row: True
+        if dialect == "postgresql":
+            def closed(expected: int, row: models.OutboxTable) -> bool:
+                xmin, xmax = db.execute(text(
+                    "SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint,"
+                    " pg_snapshot_xmax(pg_current_snapshot())::text::bigint"
+                )).one()
+                gap, horizon = self._gaps.get(shard, (None, None))
+                if gap != expected:
+                    self._gaps[shard] = (expected, xmax)
+                    horizon = xmax
+                if xmin < horizon:
+                    return False
+                self._gaps.pop(shard, None)
+                return True
+            return closed
+        cutoff = datetime.now(timezone.utc) - self.settle
+        return lambda expected, row: as_utc(row.creationTime) <= cutoff
+
+    def deliver_batch(self, shard: str) -> int:
+        """Deliver the next batch of one shard; returns how many events went out."""
+        with self.router.session(shard) as db:
+            offset = _offset(db, self.consumer)
+            rows = db.execute(
+                select(models.OutboxTable)
+                .where(models.OutboxTable.id > offset.position)
+                .order_by(models.OutboxTable.id)
+                .limit(self.batch_size)
+            ).scalars().all()
+            batch = ready_rows(rows, offset.position, self._gap_rule(db, shard))
+            if not batch:
+                return 0
+            events = [_envelope(shard, row) for row in batch]
+            db.rollback()  # no open transaction while the sink is slow
+            self.sink.deliver(events)
+            offset.position = events[-1]["id"]
+            try:
+                db.commit()
+            except SQLAlchemyError:
+                db.rollback()
+                raise
+        return len(batch)
+
+    def run_once(self) -> int:
+        """One pass over the shards, draining each as far as it is ready. Returns events delivered."""
+        delivered = 0
+        for shard in self.router.names:
+            retry_at, backoff = self._retry_at.get(shard, (0.0, 0.0))
+            if time.monotonic() < retry_at:
+                continue
+            try:
+                while True:
+                    sent = self.deliver_batch(shard)
+                    delivered += sent
+                    if sent < self.batch_size:
+                        break
+                self._retry_at.pop(shard, None)
+            except Exception:
+                # The same batch is retried after the backoff, so nothing is skipped or reordered.
+                backoff = min(_MAX_BACKOFF_SECONDS, backoff * 2 if backoff else 1.0)
+                self._retry_at[shard] = (time.monotonic() + backoff, backoff)
+                logger.exception("Delivery to %s failed for shard %s; retrying in %.0fs", self.consumer, shard, backoff)
+        return delivered
+
+    def run(self, poll_seconds: float) -> None:
+        while True:
+            delivered = self.run_once()
+            if delivered:
+                logger.info("Delivered %d events to %s", delivered, self.consumer)
+            else:
+                time.sleep(poll_seconds)
+
+
+# ---- maintenance ----
+
+def lagging(db: Session, position: int) -> List[str]:
+    """Consumers of this shard that have not yet received every event up to `position`."""
+    return list(db.execute(
+        select(models.OutboxOffsetTable.consumer).where(models.OutboxOffsetTable.position < position)
+    ).scalars())
+
+
+def status(router: ShardRouter) -> None:
+    print(f"{'shard':<12} {'consumer':<24} {'position':>10} {'behind':>8}")
+    for shard, (last, offsets) in router.scatter(lambda db: (
+        db.execute(select(func.max(models.OutboxTable.id))).scalar() or 0,
+        db.execute(select(models.OutboxOffsetTable.consumer, models.OutboxOffsetTable.position)).all(),
+    )).items():
+        for consumer, position in offsets or [("-", 0)]:
+            print(f"{shard:<12} {consumer:<24} {position:>10} {last - position:>8}")
+
+
+def prune(router: ShardRouter, older_than: timedelta) -> int:
+    """Delete outbox rows every consumer has received that are older than `older_than`."""
+    cutoff = datetime.now(timezone.utc) - older_than
+
+    def prune_shard(db: Session) -> int:
+        position = db.execute(select(func.min(models.OutboxOffsetTable.position))).scalar()
+        if position is None:
+            return 0  # no consumer yet; keep everything for the first one
+        try:
+            result = db.execute(delete(models.OutboxTable).where(
+                models.OutboxTable.id <= position, models.OutboxTable.creationTime < cutoff,
+            ))
+            db.commit()
+        except SQLAlchemyError:
+            db.rollback()
+            raise
+        return result.rowcount
+
+    total = sum(router.scatter(prune_shard).values())
+    logger.info("Pruned %d delivered outbox rows older than %s", total, cutoff.isoformat())
+    return total
+
+
+def _sink(args) -> Sink:
+    if args.webhook:
+        return WebhookSink(args.webhook, get_settings().outbox_webhook_timeout_seconds)
+    if args.spool:
+        return SpoolSink(args.spool)
+    return QueueSink(args.queue, args.partitions)
+
+
+def main():
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description="Deliver report changes from the outbox")
+    commands = parser.add_subparsers(dest="command", required=True)
+    relay_parser = commands.add_parser("relay", help="Deliver new outbox rows to one consumer")
+    relay_parser.add_argument("--consumer", required=True, help="Offset name; one relay per consumer")
+    sinks = relay_parser.add_mutually_exclusive_group(required=True)
+    sinks.add_argument("--webhook", help="POST batches to this URL")
+    sinks.add_argument("--spool", help="Append NDJSON to daily files in this directory")
+    sinks.add_argument("--queue", help="Append NDJSON to per-partition logs in this directory")
+    relay_parser.add_argument("--partitions", type=int, default=8)
+    relay_parser.add_argument("--batch-size", type=int, default=settings.outbox_batch_size)
+    relay_parser.add_argument("--poll-interval", type=float, default=settings.outbox_poll_seconds)
+    relay_parser.add_argument("--once", action="store_true", help="Deliver what is ready and exit")
+    commands.add_parser("status", help="Position of every consumer on every shard")
+    prune_parser = commands.add_parser("prune", help="Delete rows every consumer has received")
+    prune_parser.add_argument("--older-than-hours", type=float, default=settings.outbox_retention_hours)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    router = get_router()
+    try:
+        if args.command == "status":
+            status(router)
+        elif args.command == "prune":
+            prune(router, timedelta(hours=args.older_than_hours))
+        else:
+            sink = _sink(args)
+            relay = Relay(args.consumer, sink, router, args.batch_size, settings.outbox_settle_seconds)
+            try:
+                if args.once:
+                    logger.info("Delivered %d events to %s", relay.run_once(), args.consumer)
+                else:
+                    relay.run(args.poll_interval)
+            finally:
+                sink.close()
+    finally:
+        router.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,461 @@
+"""
+CityPulse Rebalance
+Inspects and changes which shard holds each city (see app.sharding).
+
+    python -m app.rebalance status                  # reports per city and shard, directory entries
+    python -m app.rebalance init                    # record where existing cities live today
+    python -m app.rebalance plan                    # suggest moves that even out the shards
+    python -m app.rebalance move --city "Montréal" --to shard2
+
+Run `init` once before adding a shard to SHARD_URLS: cities without a directory entry are
+placed by hash, and the hash changes with the number of shards.
+
+A move locks the city (writes to it get 503 with Retry-After), waits for every process to
+see the lock, copies the city's reports, events, image links and archived rows to the
+target in batches, repeats a delta copy of rows that changed meanwhile until a pass finds
+nothing, points the directory at the target and deletes from the source exactly the rows
+it copied (hot ones only if unchanged since). It then waits for the change-feed consumers
+to receive the source's events, publishes report.moved from the target and unlocks.
+Writers re-check the lock in their own transaction (sharding.fence), so nothing is
+committed to the source behind the copy. Each batch is one transaction and current copies
+are skipped, so an interrupted move can simply be run again.
+"""
+import argparse
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app import archive, crud, geogrid, models, outbox
+from app.sharding import ShardRouter, get_router, normalize_city
+
+logger = logging.getLogger(__name__)
+
+# city key -> shard -> (hot reports, archived reports)
+CityCounts = Dict[str, Dict[str, Tuple[int, int]]]
+
+
+def city_counts(router: ShardRouter) -> CityCounts:
+    def count(db: Session) -> Dict[str, List[int]]:
+        totals = defaultdict(lambda: [0, 0])
+        for slot, table in enumerate((models.IssueTable, models.ArchivedIssueTable)):
+            for city, n in db.execute(select(table.city, func.count()).group_by(table.city)):
+                totals[normalize_city(city)][slot] += n
+        return totals
+
+    counts: CityCounts = defaultdict(dict)
+    for shard, totals in router.scatter(count).items():
+        for key, (hot, archived) in totals.items():
+            counts[key][shard] = (hot, archived)
+    return counts
+
+
+def status(router: ShardRouter) -> None:
+    directory = router.directory(refresh=True)
+    counts = city_counts(router)
+    print(f"{'city':<32} {'directory':<12} {'shard':<12} {'reports':>9} {'archived':>9}")
+    for key in sorted(set(counts) | set(directory)):
+        entry = directory.get(key)
+        placed = f"{entry[0]}{' (locked)' if entry[1] else ''}" if entry else "-"
+        for shard, (hot, archived) in sorted(counts.get(key, {}).items()) or [("-", (0, 0))]:
+            print(f"{key:<32} {placed:<12} {shard:<12} {hot:>9} {archived:>9}")
+    print()
+    for shard in router.names:
+        total = sum(sum(per.get(shard, (0, 0))) for per in counts.values())
+        print(f"{shard:<12} {total:>9} reports")
+
+
+def init(router: ShardRouter) -> int:
+    """Add a directory entry for every city that has reports but none yet. Returns how many."""
+    directory = router.directory(refresh=True)
+    placed = {}
+    for key, per_shard in city_counts(router).items():
+        if key in directory:
+            continue
+        shard = max(per_shard, key=lambda name: sum(per_shard[name]))
+        if len(per_shard) > 1:
+            logger.warning("City '%s' has reports on %s; recording %s", key, sorted(per_shard), shard)
+        placed[key] = shard
+    for key, (shard, _) in directory.items():
+        _set_entry(router, shard, key, shard=shard)  # entries checked by sharding.fence
+    for key, shard in placed.items():
+        _place(router, key, [shard], shard=shard)
+    logger.info("Recorded %d cities in the shard directory", len(placed))
+    return len(placed)
+
+
+def plan(router: ShardRouter) -> List[Tuple[str, str, str]]:
+    """Greedy moves (city, from, to) of the biggest city that narrows the gap between the fullest and emptiest shard."""
+    directory = router.directory(refresh=True)
+    counts = city_counts(router)
+    load = {name: 0 for name in router.names}
+    cities: Dict[str, Dict[str, int]] = {name: {} for name in router.names}
+    for key, per_shard in counts.items():
+        shard = directory[key][0] if key in directory else max(per_shard, key=lambda name: sum(per_shard[name]))
+        size = sum(sum(n) for n in per_shard.values())
+        load[shard] += size
+        cities[shard][key] = size
+
+    moves = []
+    while True:
+        heavy = max(load, key=load.get)
+        light = min(load, key=load.get)
+        gap = load[heavy] - load[light]
+        fits = [(size, key) for key, size in cities[heavy].items() if 0 < size < gap]
+        if not fits:
+            break
+        size, key = max(fits)
+        moves.append((key, heavy, light))
+        del cities[heavy][key]
+        cities[light][key] = size
+        load[heavy] -= size
+        load[light] += size
+    for key, source, target in moves:
+        print(f'python -m app.rebalance move --city "{key}" --to {target}    # from {source}')
+    if not moves:
+        print("Shards are as balanced as whole cities allow")
+    return moves
+
+
+def _set_entry(router: ShardRouter, on: str, key: str, **values) -> None:
+    """Write the city_shards row of `key` on shard `on` (on the default shard: the directory)."""
+    with router.session(on) as db:
+        entry = db.get(models.CityShardTable, key)
+        if entry is None:
+            db.add(models.CityShardTable(city=key, **values))
+        else:
+            for name, value in values.items():
+                setattr(entry, name, value)
+        db.commit()
+
+
+def _place(router: ShardRouter, key: str, shards: Sequence[str] = (), **values) -> None:
+    """Update the directory and the entries `sharding.fence` checks on `shards`."""
+    for name in dict.fromkeys([router.names[0], *shards]):
+        _set_entry(router, name, key, **values)
+
+
+def _city_names(db: Session, key: str) -> List[str]:
+    """Spellings of the city stored on a shard (e.g. 'Montreal' and 'Montréal')."""
+    names = set()
+    for table in (models.IssueTable, models.ArchivedIssueTable):
+        names.update(db.execute(select(table.city).distinct()).scalars())
+    return sorted(name for name in names if normalize_city(name) == key)
+
+
+def _remove_hot(target: Session, ids: Sequence) -> None:
+    """Drop hot copies (with events, links and map counts) from the target; no commit."""
+    issues, events = models.IssueTable.__table__, models.IssueEventTable.__table__
+    for row in target.execute(select(issues).where(issues.c.id.in_(ids))).all():
+        geogrid.apply_change(target, geogrid.grid_key(row), None)
+    target.execute(delete(models.IssueBlobTable.__table__).where(models.IssueBlobTable.reportId.in_(ids)))
+    target.execute(delete(events).where(events.c.reportId.in_(ids)))
+    target.execute(delete(issues).where(issues.c.id.in_(ids)))
+
+
+def _copy_reports(source: Session, target: Session, ids: Sequence) -> Dict[object, datetime]:
+    """
+    Bring the target's copies of hot reports `ids` (with events and image links) in line
+    with the source, in one target transaction that also updates its map aggregates.
+    Copies that are already current are left alone; ids no longer hot on the source lose
+    their target copy. Returns {id: updated_at} of the versions now on both shards.
+    """
+    issues, events = models.IssueTable.__table__, models.IssueEventTable.__table__
+    links = models.IssueBlobTable.__table__
+    rows = source.execute(select(issues).where(issues.c.id.in_(ids))).mappings().all()
+    versions = {row["id"]: row["updated_at"] for row in rows}
+    existing = dict(target.execute(select(issues.c.id, issues.c.updated_at).where(issues.c.id.in_(ids))).all())
+    rows = [row for row in rows if existing.get(row["id"]) != row["updated_at"]]
+    gone = [report_id for report_id in ids if report_id not in versions and report_id in existing]
+    if not rows and not gone:
+        return versions
+    moving = [row["id"] for row in rows]
+    event_rows = source.execute(select(events).where(events.c.reportId.in_(moving))).mappings().all()
+    link_rows = source.execute(select(links).where(links.c.reportId.in_(moving))).mappings().all()
+    blob_rows = source.execute(
+        select(models.BlobTable.__table__).where(models.BlobTable.id.in_({link["blobId"] for link in link_rows}))
+    ).mappings().all() if link_rows else []
+
+    try:
+        _remove_hot(target, moving + gone)
+        for row in rows:
+            geogrid.apply_change(target, None, geogrid.grid_key(SimpleNamespace(**row)))
+        if rows:
+            target.execute(insert(issues), [dict(row) for row in rows])
+        if event_rows:
+            target.execute(insert(events), [dict(row) for row in event_rows])
+        if blob_rows:
+            crud._insert_ignore(target, models.BlobTable.__table__, [dict(row) for row in blob_rows])
+        if link_rows:
+            target.execute(insert(links), [dict(row) for row in link_rows])
+        target.commit()
+    except SQLAlchemyError:
+        target.rollback()
+        raise
+    return versions
+
+
+def _copy_archived(source: Session, target: Session, ids: Sequence) -> List:
+    """Copy archived reports missing on the target; returns the ids now on both shards."""
+    issues, events = models.ArchivedIssueTable.__table__, models.ArchivedIssueEventTable.__table__
+    links = models.IssueBlobTable.__table__
+    already = set(target.execute(select(issues.c.id).where(issues.c.id.in_(ids))).scalars())
+    found = source.execute(select(issues).where(issues.c.id.in_(ids))).mappings().all()
+    rows = [row for row in found if row["id"] not in already]
+    if not rows:
+        return [row["id"] for row in found]
+    moving = [row["id"] for row in rows]
+    event_rows = source.execute(select(events).where(events.c.reportId.in_(moving))).mappings().all()
+    link_rows = source.execute(select(links).where(links.c.reportId.in_(moving))).mappings().all()
+    blob_rows = source.execute(
+        select(models.BlobTable.__table__).where(models.BlobTable.id.in_({link["blobId"] for link in link_rows}))
+    ).mappings().all() if link_rows else []
+
+    try:
+        # Archived on the source after its hot row was copied: the hot copy goes.
+        _remove_hot(target, moving)
+        archive.ensure_partitions(target, issues.name, (row["creationTime"] for row in rows))
+        archive.ensure_partitions(target, events.name, (row["creationTime"] for row in event_rows))
+        target.execute(insert(issues), [dict(row) for row in rows])
+        if event_rows:
+            target.execute(insert(events), [dict(row) for row in event_rows])
+        if blob_rows:
+            crud._insert_ignore(target, models.BlobTable.__table__, [dict(row) for row in blob_rows])
+        if link_rows:
+            crud._insert_ignore(target, links, [dict(row) for row in link_rows])
+        target.commit()
+    except SQLAlchemyError:
+        target.rollback()
+        raise
+    return [row["id"] for row in found]
+
+
+def _delete_reports(source: Session, versions: Dict[object, datetime], archived_ids: Sequence) -> List:
+    """
+    Delete copied reports from the source: hot ones only while still at the copied version
+    (rows are locked first where the database supports it), archived ones outright.
+    Returns the hot ids skipped because they changed after their copy.
+    """
+    issues, events = models.IssueTable.__table__, models.IssueEventTable.__table__
+    archived, archived_events = models.ArchivedIssueTable.__table__, models.ArchivedIssueEventTable.__table__
+    try:
+        rows = source.execute(
+            select(issues).where(issues.c.id.in_(list(versions))).with_for_update()
+        ).all()
+        changed = [row.id for row in rows if row.updated_at != versions[row.id]]
+        ids = [row.id for row in rows if row.updated_at == versions[row.id]]
+        for row in rows:
+            if row.id in ids:
+                geogrid.apply_change(source, geogrid.grid_key(row), None)
+        ids += list(archived_ids)
+        source.execute(delete(models.IssueBlobTable.__table__).where(models.IssueBlobTable.reportId.in_(ids)))
+        source.execute(delete(events).where(events.c.reportId.in_(ids)))
+        source.execute(delete(issues).where(issues.c.id.in_(ids)))
+        source.execute(delete(archived_events).where(archived_events.c.reportId.in_(archived_ids)))
+        source.execute(delete(archived).where(archived.c.id.in_(archived_ids)))
+        source.commit()
+    except SQLAlchemyError:
+        source.rollback()
+        raise
+    return changed
+
+
+def _batches(db: Session, table, names: List[str], batch_size: int):
+    """Ids of a city's rows in `table`, in id order, `batch_size` at a time."""
+    last = None
+    while True:
+        stmt = select(table.id).where(table.city.in_(names)).distinct().order_by(table.id).limit(batch_size)
+        if last is not None:
+            stmt = stmt.where(table.id > last)
+        ids = list(db.execute(stmt).scalars())
+        if not ids:
+            return
+        yield ids
+        last = ids[-1]
+
+
+def _chunks(ids: Sequence, size: int):
+    ids = list(ids)
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def _catch_up(src: Session, dst: Session, names: List[str], versions: Dict, archived_ids: set, batch_size: int) -> int:
+    """
+    One delta pass: copy the city's hot rows that are new or changed since their copy
+    (or gone from the source) and archived rows not yet copied. Returns how many ids it
+    had to look at again; 0 means the target is caught up.
+    """
+    issues = models.IssueTable
+    current = dict(src.execute(select(issues.id, issues.updated_at).where(issues.city.in_(names))).all())
+    stale = [report_id for report_id, updated_at in current.items() if versions.get(report_id) != updated_at]
+    stale += [report_id for report_id in versions if report_id not in current]
+    for ids in _chunks(stale, batch_size):
+        for report_id in ids:
+            versions.pop(report_id, None)
+        versions.update(_copy_reports(src, dst, ids))
+    src.rollback()
+
+    archived = models.ArchivedIssueTable
+    missing = [
+        report_id for report_id in src.execute(select(archived.id).where(archived.city.in_(names))).scalars()
+        if report_id not in archived_ids
+    ]
+    for ids in _chunks(missing, batch_size):
+        archived_ids.update(_copy_archived(src, dst, ids))
+    src.rollback()
+    return len(stale) + len(missing)
+
+
+def _await_outbox(src: Session, key: str, timeout: float) -> None:
+    """Wait until every consumer of the source has received all of its events so far."""
+    position = src.execute(select(func.max(models.OutboxTable.id))).scalar() or 0
+    deadline = time.monotonic() + timeout
+    while True:
+        behind = outbox.lagging(src, position)
+        src.rollback()
+        if not behind:
+            return
+        if time.monotonic() >= deadline:
+            logger.warning(
+                "Consumers %s are still behind on the source; they may get events of '%s' out of order",
+                ", ".join(sorted(behind)), key,
+            )
+            return
+        time.sleep(1.0)
+
+
+def _announce(dst: Session, ids: Sequence, batch_size: int) -> None:
+    """Publish report.moved from the target for each moved hot report."""
+    for chunk in _chunks(ids, batch_size):
+        try:
+            for report in dst.execute(select(models.IssueTable).where(models.IssueTable.id.in_(chunk))).scalars():
+                outbox.record(dst, outbox.MOVED, report)
+            dst.commit()
+        except SQLAlchemyError:
+            dst.rollback()
+            raise
+
+
+def move(
+    router: ShardRouter,
+    city: str,
+    target: str,
+    batch_size: int = 500,
+    settle_seconds: Optional[float] = None,
+    max_passes: int = 20,
+    outbox_wait_seconds: float = 300.0,
+) -> int:
+    """Move every report of `city` to shard `target`. Returns how many reports were copied."""
+    if target not in router.names:
+        raise SystemExit(f"Unknown shard '{target}'; configured: {', '.join(router.names)}")
+    key = normalize_city(city)
+    entry = router.directory(refresh=True).get(key)
+    source = entry[0] if entry is not None else router.hashed_shard(key)
+    if source == target:
+        _place(router, key, [target], shard=target, locked=False)
+        logger.info("City '%s' is already on %s", key, target)
+        return 0
+
+    # Locking the source's own entry waits for writers that already passed the fence;
+    # writers that passed the directory check before the lock fail at the fence.
+    _place(router, key, [source], shard=source, locked=True)
+    settle = router.directory_ttl if settle_seconds is None else settle_seconds
+    logger.info("Locked '%s'; waiting %.1fs for writers to notice", key, settle)
+    time.sleep(settle)
+
+    versions: Dict[object, datetime] = {}  # hot report id -> updated_at of the copy on the target
+    archived_ids: set = set()
+    with router.session(source) as src, router.session(target) as dst:
+        names = _city_names(src, key)
+        for ids in _batches(src, models.IssueTable, names, batch_size):
+            versions.update(_copy_reports(src, dst, ids))
+            logger.info("Copied %d reports of '%s' to %s", len(versions), key, target)
+        for ids in _batches(src, models.ArchivedIssueTable, names, batch_size):
+            archived_ids.update(_copy_archived(src, dst, ids))
+            logger.info("Copied %d archived reports of '%s' to %s", len(archived_ids), key, target)
+
+        # Writers that passed the lock check just before it took effect (and crew leases,
+        # which are not city-scoped) may have touched rows after they were copied: repeat
+        # the delta until a pass finds nothing, then once more after the directory flip.
+        for _ in range(max_passes):
+            if not _catch_up(src, dst, names, versions, archived_ids, batch_size):
+                break
+        else:
+            raise SystemExit(f"'{key}' kept changing during {max_passes} passes; it stays locked on {source}, re-run the move")
+
+        _place(router, key, [source], shard=target, locked=True)
+        _catch_up(src, dst, names, versions, archived_ids, batch_size)
+        copied = len(versions) + len(archived_ids)
+        moved = list(versions)
+
+        # Delete only what was copied, and hot rows only at their copied version.
+        for _ in range(max_passes):
+            changed = []
+            for ids in _chunks(versions, batch_size):
+                changed += _delete_reports(src, {report_id: versions[report_id] for report_id in ids}, [])
+            for ids in _chunks(archived_ids, batch_size):
+                _delete_reports(src, {}, ids)
+            if not changed:
+                break
+            logger.info("Re-copying %d reports that changed before their deletion", len(changed))
+            versions = _copy_reports(src, dst, changed)
+            archived_ids = set()
+        left = sum(
+            src.execute(select(func.count()).select_from(table).where(table.city.in_(names))).scalar()
+            for table in (models.IssueTable, models.ArchivedIssueTable)
+        )
+        src.rollback()
+        if left:
+            logger.warning("%d reports of '%s' are still on %s; re-run the move to finish", left, key, source)
+
+        # Per-report order across shards: the city stays locked until consumers have the
+        # source's events, and report.moved is the first event the target publishes.
+        _await_outbox(src, key, outbox_wait_seconds)
+        _announce(dst, moved, batch_size)
+
+    _place(router, key, [source, target], shard=target, locked=False)
+    logger.info("Moved '%s' from %s to %s (%d reports)", key, source, target, copied)
+    return copied
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and rebalance the per-city shards")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("status", help="Reports per city and shard")
+    commands.add_parser("init", help="Record the current shard of every city in the directory")
+    commands.add_parser("plan", help="Suggest moves that even out the shards")
+    move_parser = commands.add_parser("move", help="Move one city to another shard")
+    move_parser.add_argument("--city", required=True)
+    move_parser.add_argument("--to", required=True, dest="target")
+    move_parser.add_argument("--batch-size", type=int, default=500)
+    move_parser.add_argument("--settle-seconds", type=float, default=None,
+                             help="Wait after locking (default: SHARD_DIRECTORY_TTL_SECONDS)")
+    move_parser.add_argument("--outbox-wait-seconds", type=float, default=300.0,
+                             help="Max wait for change-feed consumers to drain the source before unlocking")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    router = get_router()
+    try:
+        if args.command == "status":
+            status(router)
+        elif args.command == "init":
+            init(router)
+        elif args.command == "plan":
+            plan(router)
+        else:
+            move(router, args.city, args.target, args.batch_size, args.settle_seconds,
+                 outbox_wait_seconds=args.outbox_wait_seconds)
+    finally:
+        router.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+'''
+Image endpoints: list the photos attached to a report and serve blobs from the
+content-addressed store, with HTTP range support.
+'''
+
+import re
+from typing import List, Optional, Tuple
+from uuid import UUID
+
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+
+from app import crud
+from app.blobstore import get_blob_store
+from app.config import get_settings
+from app.schemas import ReportImage
+from app.sharding import get_router
+
+router = APIRouter(tags=["images"])
+
+_BLOB_ID = re.compile(r"^[0-9a-f]{64}$")
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Resolve a single-range Range header to inclusive (start, end).
+
+    Returns None to serve the whole blob (no header, or a multi-range request, which we are
+    allowed to ignore) and raises 416 for a range that cannot be satisfied.
+    """
+    if not header:
+        return None
+    match = _RANGE.match(header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if first == "" and last == "":
+        return None
+    if first == "":
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+
+@router.get("/reports/{report_id}/images", response_model=List[ReportImage])
+def list_report_images(
+    report_id: UUID,
+):
+    """Images uploaded with a report."""
+    with get_router().report_session(report_id) as db:
+        if crud.find_report(db=db, report_id=report_id) is None:
+            raise HTTPException(status_code=404, detail="Report not found")
+        rows = crud.get_report_images(db=db, report_id=report_id)
+    return [
+        ReportImage(
+            blobId=row.blobId,
+            filename=row.filename,
+            size=row.size,
+            contentType=row.contentType,
+            url=f"/blobs/{row.blobId}",
+        )
+        for row in rows
+    ]
+
+
+@router.get("/blobs/{blob_id}")
+def get_blob(
+    blob_id: str,
+    request: Request,
+):
+    """Serve a stored image; supports Range requests and conditional GETs."""
+    if not _BLOB_ID.match(blob_id):
+        raise HTTPException(status_code=404, detail="Blob not found")
+    blob = get_router().find(lambda db: crud.get_blob(db=db, blob_id=blob_id))
+    store = get_blob_store()
+    size = store.size(blob_id) if blob is not None else None
+    if size is None:
+        raise HTTPException(status_code=404, detail="Blob not found")
+
+    etag = f'"{blob_id}"'
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        # Content-addressed: the bytes behind this URL can never change.
+        "Cache-Control": f"public, max-age={get_settings().blob_cache_max_age_seconds}, immutable",
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    byte_range = parse_range(request.headers.get("range"), size)
+    if byte_range is None:
+        start, end, status_code = 0, size - 1, 200
+    else:
+        (start, end), status_code = byte_range, 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+
+    return StreamingResponse(
+        store.read_range(blob_id, start, end),
+        status_code=status_code,
+        media_type=blob.contentType,
+        headers=headers,
+    )
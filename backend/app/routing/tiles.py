@@ -0,0 +1,51 @@
+'''
+Map tile endpoint: clustered report counts for a z/x/y Web-Mercator tile, read from the
+precomputed grid aggregates in app.geogrid (summed across shards).
+'''
+
+import hashlib
+import json
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+
+from app import geogrid
+from app.config import get_settings
+from app.sharding import get_router
+from app.schemas import ClassificationEnum, SeverityEnum
+
+router = APIRouter(prefix="/tiles", tags=["tiles"])
+
+MAX_TILE_ZOOM = 22
+
+
+@router.get("/{z}/{x}/{y}.json")
+def get_tile(
+    z: int,
+    x: int,
+    y: int,
+    request: Request,
+    category: Optional[List[ClassificationEnum]] = Query(None),
+    severity: Optional[List[SeverityEnum]] = Query(None),
+):
+    """
+    Clustered report counts for one map tile.
+
+    Body: {"z", "x", "y", "level", "clusters": [[lat, lon, count, {"category|severity": n}], ...]}
+    """
+    if not 0 <= z <= MAX_TILE_ZOOM or not (0 <= x < (1 << z) and 0 <= y < (1 << z)):
+        raise HTTPException(status_code=404, detail="Tile out of range")
+
+    categories = [c.value for c in category] if category else None
+    severities = [s.value for s in severity] if severity else None
+    cells = get_router().scatter(lambda db: geogrid.tile_cells(db, z, x, y, categories, severities))
+    tile = geogrid.format_tile(z, x, y, geogrid.merge_cells(cells.values()))
+    body = json.dumps(tile, separators=(",", ":")).encode()
+    etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+    headers = {
+        "Cache-Control": f"public, max-age={get_settings().tile_cache_max_age_seconds}",
+        "ETag": etag,
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,112 @@
+'''
+Triage queue endpoints: dispatchers peek at and crews claim the highest-priority open
+reports, optionally scoped to a city and/or category. A city-scoped queue lives on that
+city's shard; the unscoped queue is merged from every shard.
+'''
+
+from collections import Counter
+from datetime import datetime, timezone
+from typing import List, Optional
+from uuid import UUID
+
+from fastapi import APIRouter, HTTPException, Query
+
+from app import crud
+from app.config import get_settings
+from app.sharding import get_router, merge_sorted
+from app.schemas import ClassificationEnum, TriageClaim, TriageItem, TriageRelease
+
+router = APIRouter(prefix="/triage", tags=["triage"])
+
+
+def _to_items(reports) -> List[TriageItem]:
+    now = datetime.now(timezone.utc)
+    items = []
+    for report in reports:
+        item = TriageItem.model_validate(report)
+        item.effective_priority = crud.effective_priority(report.triage_rank, now)
+        items.append(item)
+    return items
+
+
+def _rank_key(report):
+    # Same order as the queue query: triage_rank descending, nulls last.
+    return (report.triage_rank is None, -(report.triage_rank or 0.0))
+
+
+@router.get("/next", response_model=List[TriageItem])
+def next_work_items(
+    city: Optional[str] = None,
+    category: Optional[ClassificationEnum] = None,
+    limit: int = Query(10, ge=1, le=100),
+):
+    """Top open, unclaimed reports by aged priority (read-only)."""
+    shards = get_router()
+
+    def peek(db):
+        return crud.get_triage_queue(
+            db=db,
+            limit=limit,
+            city=city,
+            category=category.value if category else None,
+        )
+
+    if city:
+        with shards.session(shards.shard_for_city(city)) as db:
+            return _to_items(peek(db))
+    return _to_items(merge_sorted(shards.scatter(peek).values(), key=_rank_key, limit=limit))
+
+
+@router.post("/claim", response_model=List[TriageItem])
+def claim_work_items(
+    claim: TriageClaim,
+):
+    """Lease the next work items to a crew; rows leased to someone else are skipped."""
+    shards = get_router()
+    category = claim.category.value if claim.category else None
+
+    def lease(db, limit: int):
+        return crud.claim_reports(
+            db=db,
+            crew=claim.crew,
+            limit=limit,
+            lease_seconds=claim.lease_seconds or get_settings().triage_default_lease_seconds,
+            city=claim.city,
+            category=category,
+        )
+
+    if claim.city or not shards.sharded:
+        # A read lookup: claiming for a city nobody reported in must not place it in the directory.
+        shards.check_writable(claim.city)
+        with shards.session(shards.shard_for_city(claim.city)) as db:
+            return _to_items(lease(db, claim.limit))
+
+    # Peek at every shard's head of queue to decide how many rows each one contributes to
+    # the global top `limit`, then claim exactly that many on each shard in parallel.
+    heads = shards.scatter(lambda db: [
+        (report.triage_rank, db.info["shard"])
+        for report in crud.get_triage_queue(db=db, limit=claim.limit, category=category)
+    ])
+    winners = merge_sorted(
+        heads.values(),
+        key=lambda head: (head[0] is None, -(head[0] or 0.0)),
+        limit=claim.limit,
+    )
+    quotas = Counter(shard for _, shard in winners)
+    if not quotas:
+        return []
+    claimed = shards.scatter(lambda db: lease(db, quotas[db.info["shard"]]), shards=list(quotas))
+    return _to_items(merge_sorted(claimed.values(), key=_rank_key))
+
+
+@router.post("/{report_id}/release", response_model=TriageItem)
+def release_work_item(
+    report_id: UUID,
+    release: TriageRelease,
+):
+    """Give a claimed report back to the queue."""
+    with get_router().report_session(report_id, for_write=True) as db:
+        report = crud.release_report(db=db, report_id=report_id, crew=release.crew)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Report not found or not claimed by this crew")
+    return _to_items([report])[0]
@@ -4,7 +4,7 @@ Request/response models for API validation.
 
 """
 from enum import Enum
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
 from datetime import datetime
 from typing import Optional, List
 from uuid import UUID
@@ -100,6 +100,35 @@ class IssueOut(ReportInDB):
     pass
 
 
+class ReportImage(BaseModel):
+    blobId: str
+    filename: Optional[str] = None
+    size: int
+    contentType: str
+    url: str
+
+
+# ---- Triage queue ----
+
+class TriageClaim(BaseModel):
+    crew: str
+    city: Optional[str] = None
+    category: Optional[ClassificationEnum] = None
+    limit: int = Field(default=1, ge=1, le=100)
+    lease_seconds: Optional[int] = Field(default=None, ge=1, le=24 * 60 * 60)
+
+
+class TriageRelease(BaseModel):
+    crew: str
+
+
+class TriageItem(IssueOut):
+    priority_score: Optional[int] = None
+    effective_priority: Optional[float] = None
+    claimed_by: Optional[str] = None
+    lease_expires_at: Optional[datetime] = None
+
+
 
 
 
@@ -0,0 +1,93 @@
+"""
+CityPulse Serialization
+Lean response path for report endpoints: plain row tuples are encoded straight to JSON bytes
+with orjson, skipping ORM instances, Pydantic validation and jsonable_encoder.
+
+The output is byte-for-byte what FastAPI produces for the same schema as response_model
+(Pydantic JSON mode, then compact json.dumps). Rows the fast path cannot reproduce exactly
+(unknown enum values, NaN/inf, floats Python prints in exponent form) go through that
+reference path instead, so they fail or render exactly as before.
+"""
+import enum
+import json
+import math
+import typing
+from typing import Any, Iterable, List, Sequence, Type
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel, TypeAdapter
+
+from app.schemas import IssueOut
+
+_ORJSON_OPTIONS = orjson.OPT_UTC_Z
+
+
+def _unwrap_optional(annotation):
+    if typing.get_origin(annotation) is typing.Union:
+        args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        if len(args) == 1:
+            return args[0]
+    return annotation
+
+
+def _float_is_lean(value: float) -> bool:
+    # repr() switches to exponent notation outside [1e-4, 1e16); orjson writes those
+    # differently ("1e20" vs "1e+20"), and json.dumps(allow_nan=False) rejects NaN/inf.
+    if value != value or math.isinf(value):
+        return False
+    magnitude = abs(value)
+    return magnitude == 0 or 1e-4 <= magnitude < 1e16
+
+
+class RowEncoder:
+    """Encoder compiled once per response schema; rows must follow `fields` order."""
+
+    def __init__(self, schema: Type[BaseModel]):
+        self.schema = schema
+        self.fields: List[str] = list(schema.model_fields)
+        self._enum_checks = []
+        self._float_indexes = []
+        for index, name in enumerate(self.fields):
+            annotation = _unwrap_optional(schema.model_fields[name].annotation)
+            if isinstance(annotation, type) and issubclass(annotation, enum.Enum):
+                self._enum_checks.append((index, frozenset(member.value for member in annotation)))
+            elif annotation is float:
+                self._float_indexes.append(index)
+        self._list_adapter = TypeAdapter(List[schema])
+
+    def _is_lean(self, row: Sequence[Any]) -> bool:
+        for index, allowed in self._enum_checks:
+            value = row[index]
+            if value is not None and value not in allowed:
+                return False
+        for index in self._float_indexes:
+            value = row[index]
+            if value is not None and not _float_is_lean(value):
+                return False
+        return True
+
+    def _reference(self, rows: Sequence[Sequence[Any]], many: bool) -> bytes:
+        """What FastAPI would send: validate, dump in JSON mode, json.dumps compactly."""
+        mappings = [dict(zip(self.fields, row)) for row in rows]
+        validated = self._list_adapter.validate_python(mappings)
+        content = self._list_adapter.dump_python(validated, mode="json")
+        content = jsonable_encoder(content if many else content[0])
+        return json.dumps(
+            content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+        ).encode("utf-8")
+
+    def encode_one(self, row: Sequence[Any]) -> bytes:
+        if not self._is_lean(row):
+            return self._reference([row], many=False)
+        return orjson.dumps(dict(zip(self.fields, row)), option=_ORJSON_OPTIONS)
+
+    def encode_many(self, rows: Iterable[Sequence[Any]]) -> bytes:
+        rows = list(rows)
+        if not all(self._is_lean(row) for row in rows):
+            return self._reference(rows, many=True)
+        fields = self.fields
+        return orjson.dumps([dict(zip(fields, row)) for row in rows], option=_ORJSON_OPTIONS)
+
+
+issue_out_encoder = RowEncoder(IssueOut)
@@ -0,0 +1,95 @@
+"""
+CityPulse Server
+Production entry point: runs the API in several uvicorn worker processes so JSON encoding
+and validation use every core, instead of the single process `uvicorn app.main:app` gives.
+
+- WEB_WORKERS workers (default: one per CPU of the container's quota, at most 8)
+- a shared cache server on a Unix socket (see app.cache), so the idempotency front is held
+  once rather than once per worker
+- each worker sizes its DB pools from DB_CONNECTION_BUDGET (see config.pool_limits)
+- the Backboard assistant is resolved (found or created) once here and ASSISTANT_ID is
+  handed to the workers, so they do not each create one
+- on SIGTERM, workers stop accepting connections and get SHUTDOWN_DRAIN_SECONDS to finish
+  in-flight requests, AI enrichments included, before they exit
+
+    python -m app.serve --host 0.0.0.0 --port 8000
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import secrets
+import shutil
+import tempfile
+import time
+
+from app import cache, startup
+from app.config import get_settings, worker_count
+
+logger = logging.getLogger(__name__)
+
+
+def _start_cache_server(address: str, authkey: bytes, max_entries: int) -> multiprocessing.Process:
+    ctx = multiprocessing.get_context("spawn")
+    proc = ctx.Process(target=cache.serve, args=(address, authkey, max_entries), name="citypulse-cache", daemon=True)
+    proc.start()
+    deadline = time.monotonic() + 10
+    while not os.path.exists(address):
+        if not proc.is_alive() or time.monotonic() > deadline:
+            raise RuntimeError("Shared cache server did not start")
+        time.sleep(0.05)
+    return proc
+
+
+def main():
+    import uvicorn
+
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description="Run the CityPulse API with multiple worker processes")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=worker_count(settings))
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    workers = max(1, args.workers)
+    # Workers are spawned with this environment, so they size their pools for the real count.
+    os.environ["WEB_WORKERS"] = str(workers)
+
+    try:
+        startup.resolve_assistant()
+        os.environ["ASSISTANT_RESOLVED"] = "true"
+    except Exception:
+        logger.exception("Could not resolve the Backboard assistant; workers will try at startup")
+
+    socket_dir = None
+    cache_proc = None
+    if workers > 1:
+        socket_dir = tempfile.mkdtemp(prefix="citypulse-")
+        address = os.path.join(socket_dir, "cache.sock")
+        authkey = secrets.token_bytes(32)
+        cache_proc = _start_cache_server(address, authkey, settings.shared_cache_entries)
+        os.environ["SHARED_CACHE_SOCKET"] = address
+        os.environ["SHARED_CACHE_AUTHKEY"] = authkey.hex()
+
+    logger.info("Starting %d worker(s) on %s:%d", workers, args.host, args.port)
+    try:
+        uvicorn.run(
+            "app.main:app",
+            host=args.host,
+            port=args.port,
+            workers=workers,
+            log_level=args.log_level,
+            timeout_graceful_shutdown=int(settings.shutdown_drain_seconds),
+        )
+    finally:
+        if cache_proc is not None:
+            cache_proc.terminate()
+            cache_proc.join(timeout=5)
+        if socket_dir is not None:
+            shutil.rmtree(socket_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+"""
+CityPulse Sharding
+Per-city placement of reports across several databases ("shards"), so one large city's
+load stays on its own database instead of slowing everyone down.
+
+- Every shard carries the full schema and has its own engine/pool (database.build_engine).
+  The "default" shard is DATABASE_URL; more come from SHARD_URLS. A shard URL may also be
+  another schema on the same server (e.g. `?options=-csearch_path%3Dcity_x` on Postgres).
+- The city_shards directory on the default shard maps each normalized city to its shard.
+  A city seen for the first time is placed by a stable hash of its name and recorded, so
+  adding shards later never moves existing cities implicitly.
+- New reports route by city; reads and writes of one report route to the shard that holds
+  it (looked up once, then cached). List, triage and tile queries over all cities scatter
+  to every shard in parallel and merge the results.
+- `python -m app.rebalance` moves a city between shards; while it runs the city is locked
+  and writes to it get 503. Writes re-check the lock in their own transaction (`fence`),
+  against the copy of the city's entry kept on the shard they write to.
+
+With only the default shard configured every helper here collapses to the single database.
+"""
+import hashlib
+import heapq
+import logging
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar, Union
+from uuid import UUID
+
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, sessionmaker
+
+from app import database, models
+from app.cache import MemoryCache
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SHARD = "default"
+_LOCATION_ENTRIES = 100_000
+_LOCATION_TTL_SECONDS = 3600
+
+T = TypeVar("T")
+
+
+def normalize_city(city: Optional[str]) -> str:
+    """Directory key of a city: accents stripped, case-folded, whitespace collapsed."""
+    decomposed = unicodedata.normalize("NFKD", city or "")
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return " ".join(stripped.casefold().split())
+
+
+def as_utc(value: datetime) -> datetime:
+    # SQLite shards hand back naive datetimes; make them comparable with Postgres ones.
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def merge_sorted(
+    parts: Iterable[List[T]],
+    key: Callable[[T], object],
+    reverse: bool = False,
+    limit: Optional[int] = None,
+    unique: Optional[Callable[[T], object]] = None,
+) -> List[T]:
+    """
+    Merge per-shard results that are each already sorted by `key`.
+
+    `unique` drops repeats of the same item (a report briefly present on two shards while
+    its city is being moved).
+    """
+    parts = list(parts)
+    if len(parts) == 1:
+        return parts[0][:limit] if limit is not None else parts[0]
+    merged = []
+    seen = set()
+    for item in heapq.merge(*parts, key=key, reverse=reverse):
+        if unique is not None:
+            ident = unique(item)
+            if ident in seen:
+                continue
+            seen.add(ident)
+        merged.append(item)
+        if limit is not None and len(merged) >= limit:
+            break
+    return merged
+
+
+class ShardRouter:
+    def __init__(self, urls: Dict[str, str], directory_ttl: float, scatter_threads: int):
+        self.names = [DEFAULT_SHARD] + sorted(name for name in urls if name != DEFAULT_SHARD)
+        self.directory_ttl = directory_ttl
+        self._urls = urls
+        self._factories: Dict[str, sessionmaker] = {}
+        self._factory_lock = threading.Lock()
+        self._directory: Dict[str, Tuple[str, bool]] = {}  # city key -> (shard, locked)
+        self._directory_loaded = float("-inf")
+        self._directory_lock = threading.Lock()
+        self._locations = MemoryCache(_LOCATION_ENTRIES)  # report id -> shard
+        self._pool = (
+            ThreadPoolExecutor(max_workers=scatter_threads, thread_name_prefix="shard")
+            if self.sharded else None
+        )
+
+    @property
+    def sharded(self) -> bool:
+        return len(self.names) > 1
+
+    # ---- engines and sessions ----
+
+    def _factory(self, shard: str) -> sessionmaker:
+        with self._factory_lock:
+            factory = self._factories.get(shard)
+            if factory is None:
+                if shard == DEFAULT_SHARD:
+                    engine = database.get_engine()
+                elif shard in self._urls:
+                    engine = database.build_engine(self._urls[shard])
+                else:
+                    raise KeyError(f"Unknown shard: {shard}")
+                factory = self._factories[shard] = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+        return factory
+
+    def engine(self, shard: str) -> Engine:
+        return self._factory(shard).kw["bind"]
+
+    @contextmanager
+    def session(self, shard: str) -> Iterator[Session]:
+        db = self._factory(shard)()
+        db.info["shard"] = shard
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def dispose(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+        for factory in list(self._factories.values()):
+            factory.kw["bind"].dispose()
+
+    # ---- city directory ----
+
+    def directory(self, refresh: bool = False) -> Dict[str, Tuple[str, bool]]:
+        if not refresh and time.monotonic() - self._directory_loaded < self.directory_ttl:
+            return self._directory
+        with self._directory_lock:
+            if refresh or time.monotonic() - self._directory_loaded >= self.directory_ttl:
+                with self.session(DEFAULT_SHARD) as db:
+                    rows = db.execute(select(
+                        models.CityShardTable.city, models.CityShardTable.shard, models.CityShardTable.locked
+                    )).all()
+                self._directory = {row.city: (row.shard, row.locked) for row in rows}
+                self._directory_loaded = time.monotonic()
+        return self._directory
+
+    def hashed_shard(self, city_key: str) -> str:
+        digest = hashlib.blake2b(city_key.encode(), digest_size=8).digest()
+        return self.names[int.from_bytes(digest, "big") % len(self.names)]
+
+    def check_writable(self, city: Optional[str]) -> None:
+        """Raise 503 while `city` is being moved between shards."""
+        if not self.sharded:
+            return
+        entry = self.directory().get(normalize_city(city))
+        if entry is not None and entry[1]:
+            raise HTTPException(
+                status_code=503,
+                detail="Reports for this city are being moved; retry shortly",
+                headers={"Retry-After": str(max(1, round(self.directory_ttl)))},
+            )
+
+    def shard_for_city(self, city: Optional[str], for_write: bool = False) -> str:
+        """Shard holding `city`; a write for a city seen for the first time records its placement."""
+        if not self.sharded:
+            return DEFAULT_SHARD
+        key = normalize_city(city)
+        entry = self.directory().get(key)
+        if entry is None:
+            if not for_write:
+                return self.hashed_shard(key)
+            entry = self._assign(key)
+        if for_write:
+            self.check_writable(city)
+        return entry[0]
+
+    def _assign(self, key: str) -> Tuple[str, bool]:
+        with self.session(DEFAULT_SHARD) as db:
+            db.add(models.CityShardTable(city=key, shard=self.hashed_shard(key)))
+            try:
+                db.commit()
+            except IntegrityError:
+                db.rollback()  # another worker placed the city first
+            row = db.get(models.CityShardTable, key)
+            entry = (row.shard, row.locked)
+        if entry[0] != DEFAULT_SHARD:
+            # The shard's own entry, which `fence` checks (and a move locks) in-transaction.
+            with self.session(entry[0]) as db:
+                db.add(models.CityShardTable(city=key, shard=entry[0]))
+                try:
+                    db.commit()
+                except IntegrityError:
+                    db.rollback()
+        with self._directory_lock:
+            self._directory = {**self._directory, key: entry}
+        logger.info("Placed city '%s' on shard %s", key, entry[0])
+        return entry
+
+    # ---- reports ----
+
+    def remember(self, report_id: Union[str, UUID], shard: str) -> None:
+        if self.sharded:
+            self._locations.set(str(report_id), shard, _LOCATION_TTL_SECONDS)
+
+    def locate(self, report_id: Union[str, UUID]) -> Optional[str]:
+        """Shard holding a report (hot or archived), or None if no shard has it."""
+        if not self.sharded:
+            return DEFAULT_SHARD
+        return self.find(lambda db: db.info["shard"] if _holds_report(db, report_id) else None, report_id)
+
+    def find(self, fn: Callable[[Session], Optional[T]], report_id: Union[str, UUID, None] = None) -> Optional[T]:
+        """
+        First non-None `fn(db)` over the shards. With a `report_id`, the shard known to hold
+        that report is tried alone first, and the shard that answered is remembered.
+        """
+        if report_id is not None and self.sharded:
+            cached = self._locations.get(str(report_id))
+            if cached is not None:
+                with self.session(cached) as db:
+                    result = fn(db)
+                if result is not None:
+                    return result
+        for name, result in self.scatter(fn).items():
+            if result is not None:
+                if report_id is not None:
+                    self.remember(report_id, name)
+                return result
+        return None
+
+    @contextmanager
+    def report_session(self, report_id: Union[str, UUID], for_write: bool = False) -> Iterator[Session]:
+        """Session on the shard holding a report; 404 if no shard has it, 503 if its city is moving."""
+        shard = self.locate(report_id)
+        if shard is None:
+            raise HTTPException(status_code=404, detail="Report not found")
+        with self.session(shard) as db:
+            if for_write and self.sharded:
+                city = db.execute(
+                    select(models.IssueTable.city).where(models.IssueTable.id == _as_uuid(report_id))
+                ).scalar()
+                self.check_writable(city)
+            yield db
+
+    # ---- scatter-gather ----
+
+    def scatter(self, fn: Callable[[Session], T], shards: Optional[List[str]] = None) -> Dict[str, T]:
+        """Run `fn` with a session on each shard in parallel; results keyed by shard, in shard order."""
+        names = list(shards) if shards is not None else self.names
+        if len(names) == 1:
+            with self.session(names[0]) as db:
+                return {names[0]: fn(db)}
+
+        def run(name: str) -> T:
+            with self.session(name) as db:
+                return fn(db)
+
+        futures = {name: self._pool.submit(run, name) for name in names}
+        return {name: future.result() for name, future in futures.items()}
+
+
+def fence(db: Session, city: Optional[str]) -> None:
+    """
+    Raise 503 unless `city` may be written on the shard of `db`; call it in the writing
+    transaction, right before the commit.
+
+    Every shard keeps city_shards entries for the cities it holds (on the default shard
+    they are the directory itself). A move locks the source's entry first and points it at
+    the target at the end, so a writer that routed on a stale directory, or checked the
+    lock just before it was set, fails here instead of committing a row the move has
+    already copied past. Flushes first, so on SQLite the check runs under the write lock;
+    on Postgres the FOR SHARE row lock makes the move's lock wait for open writers.
+    """
+    db.flush()
+    entry = db.execute(
+        select(models.CityShardTable.shard, models.CityShardTable.locked)
+        .where(models.CityShardTable.city == normalize_city(city))
+        .with_for_update(read=True)
+    ).first()
+    if entry is not None and (entry.locked or entry.shard != db.info.get("shard", DEFAULT_SHARD)):
+        raise HTTPException(
+            status_code=503,
+            detail="Reports for this city are being moved; retry shortly",
+            headers={"Retry-After": str(max(1, round(get_settings().shard_directory_ttl_seconds)))},
+        )
+
+
+def _as_uuid(value: Union[str, UUID]) -> UUID:
+    return value if isinstance(value, UUID) else UUID(str(value))
+
+
+def _holds_report(db: Session, report_id: Union[str, UUID]) -> bool:
+    report_id = _as_uuid(report_id)
+    for table in (models.IssueTable, models.ArchivedIssueTable):
+        if db.execute(select(table.id).where(table.id == report_id)).first() is not None:
+            return True
+    return False
+
+
+@lru_cache
+def get_router() -> ShardRouter:
+    """Get the process-wide shard router."""
+    settings = get_settings()
+    return ShardRouter(
+        urls=settings.shard_urls,
+        directory_ttl=settings.shard_directory_ttl_seconds,
+        scatter_threads=settings.shard_scatter_threads,
+    )
@@ -0,0 +1,156 @@
+"""
+CityPulse Startup
+Warm-up run from the FastAPI lifespan, before the first request is accepted:
+
+- pre-open a few pooled database connections on every shard and configure the ORM mappers
+- resolve the Backboard assistant once (validating a configured ASSISTANT_ID, or finding /
+  creating CPAssistant through assistant.create_assistant); app.serve does this in the
+  parent process instead, so its workers skip it
+- pre-open keep-alive connections in the shared Backboard HTTP session
+
+Every step is best-effort: a failure is logged and the app still starts, falling back to
+the lazy per-request behaviour.
+
+On shutdown the lifespan waits (up to SHUTDOWN_DRAIN_SECONDS) for in-flight AI enrichments
+tracked by `enrichments`, so a report whose Backboard call already ran is still persisted.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from sqlalchemy.orm import configure_mappers
+
+from app import database
+from app.ai_workflow import assistant
+from app.ai_workflow.workflow import get_http_session
+from app.config import get_settings, pool_limits
+from app.sharding import get_router
+
+logger = logging.getLogger(__name__)
+
+
+class InFlight:
+    """Counts units of work in progress so shutdown can wait for them."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._count = 0
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    def begin(self) -> None:
+        with self._cond:
+            self._count += 1
+
+    def end(self) -> None:
+        with self._cond:
+            self._count -= 1
+            if self._count == 0:
+                self._cond.notify_all()
+
+    @contextmanager
+    def track(self) -> Iterator[None]:
+        self.begin()
+        try:
+            yield
+        finally:
+            self.end()
+
+    def drain(self, timeout: float) -> bool:
+        """Block until nothing is in flight or `timeout` passes; True if drained."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._count == 0, timeout=timeout)
+
+
+# AI pipelines (report creation, clarification follow-ups and queued enrichments) in this process
+enrichments = InFlight()
+
+
+def resolve_assistant() -> Optional[str]:
+    """
+    Make sure ASSISTANT_ID names a usable assistant and return it.
+
+    A configured id that Backboard reports as missing is re-resolved by name (creating the
+    assistant if needed); if Backboard cannot be reached or the creation fails, the
+    configured id is kept as-is. Under app.serve this runs once in the parent, which
+    exports the result to its workers.
+    """
+    api_key = os.environ.get("BACKBOARD_API_KEY")
+    if not api_key:
+        logger.warning("BACKBOARD_API_KEY not set; skipping assistant resolution")
+        return None
+
+    configured = os.environ.get("ASSISTANT_ID")
+    if configured:
+        if assistant.validate_assistant(api_key, configured) is not False:
+            return configured
+        logger.warning("ASSISTANT_ID %s does not exist on Backboard; resolving CPAssistant by name", configured)
+        del os.environ["ASSISTANT_ID"]
+    resolved = assistant.create_assistant()
+    if not resolved and configured:
+        # Nothing better was found or created; keep the configured id rather than none.
+        logger.warning("Could not resolve CPAssistant; keeping ASSISTANT_ID %s", configured)
+        os.environ["ASSISTANT_ID"] = configured
+        return configured
+    return resolved
+
+
+def warm_backboard(assistant_id: str, connections: int) -> None:
+    """Open `connections` keep-alive connections in the shared Backboard session."""
+    api_key = os.environ.get("BACKBOARD_API_KEY")
+    if connections <= 0 or not api_key:
+        return
+    # Concurrent requests force the pool to open one connection each.
+    with ThreadPoolExecutor(max_workers=connections) as pool:
+        list(pool.map(lambda _: assistant.validate_assistant(api_key, assistant_id), range(connections)))
+
+
+def warm_up() -> None:
+    settings = get_settings()
+    if not settings.startup_warmup:
+        return
+    started = time.perf_counter()
+
+    try:
+        configure_mappers()
+        pool_size, _ = pool_limits(settings)
+        router = get_router()
+        opened = sum(
+            database.warm_pool(min(settings.startup_db_connections, pool_size), router.engine(name))
+            for name in router.names
+        )
+        logger.info("Opened %d database connections across %d shard(s)", opened, len(router.names))
+    except Exception:
+        logger.exception("Database warm-up failed; connections will be opened on demand")
+
+    try:
+        # app.serve resolved it once for all workers; N workers creating it would make N assistants.
+        assistant_id = os.environ.get("ASSISTANT_ID") if settings.assistant_resolved else resolve_assistant()
+        if assistant_id:
+            warm_backboard(assistant_id, settings.startup_backboard_connections)
+    except Exception:
+        logger.exception("Backboard warm-up failed; the assistant will be resolved per request")
+
+    logger.info("Startup warm-up finished in %.0f ms", (time.perf_counter() - started) * 1000)
+
+
+def drain() -> None:
+    """Wait for in-flight AI enrichments before the process exits."""
+    pending = enrichments.count
+    if pending == 0:
+        return
+    timeout = get_settings().shutdown_drain_seconds
+    logger.info("Waiting up to %.0fs for %d in-flight AI enrichments", timeout, pending)
+    if not enrichments.drain(timeout):
+        logger.warning("Shutting down with %d AI enrichments still running", enrichments.count)
+
+
+def shutdown() -> None:
+    get_http_session().close()
+    get_router().dispose()
@@ -0,0 +1,40 @@
+"""
+CityPulse Triage Maintenance
+Recomputes the stored triage_rank of every open report on every shard.
+
+The triage queue sorts by triage_rank, which crud writes whenever a report is created or
+classified. Run this once on a database that holds reports from before the column existed
+(their rank is NULL, so they sort last in /triage/next and /triage/claim), and again after
+changing TRIAGE_AGING_POINTS_PER_HOUR.
+
+    python -m app.triage rebuild-ranks
+"""
+import argparse
+import logging
+
+from app import crud
+from app.sharding import get_router
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Triage queue maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+    rebuild_parser = commands.add_parser("rebuild-ranks", help="Recompute triage_rank of every open report")
+    rebuild_parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    router = get_router()
+    try:
+        for shard in router.names:
+            with router.session(shard) as db:
+                updated = crud.rebuild_triage_ranks(db, args.batch_size)
+            logger.info("Rebuilt triage_rank of %d open reports on shard %s", updated, shard)
+    finally:
+        router.dispose()
+
+
+if __name__ == "__main__":
+    main()
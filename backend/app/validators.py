@@ -25,17 +25,22 @@ IMAGE_SIGNATURES = {
 }
 
 
-def is_valid_image(file: UploadFile) -> bool:
-    """Check if file content matches a known image signature."""
+def detect_image_type(file: UploadFile) -> Optional[str]:
+    """Return the MIME type matching the file's image signature, or None."""
     header = file.file.read(12)
     file.file.seek(0)
 
-    for signature in IMAGE_SIGNATURES:
+    for signature, mimetype in IMAGE_SIGNATURES.items():
         if header.startswith(signature):
-            if signature == b'RIFF':
-                return header[8:12] == b'WEBP'
-            return True
-    return False
+            if signature == b'RIFF' and header[8:12] != b'WEBP':
+                return None
+            return mimetype
+    return None
+
+
+def is_valid_image(file: UploadFile) -> bool:
+    """Check if file content matches a known image signature."""
+    return detect_image_type(file) is not None
 
 
 def validate_images(images: List[UploadFile]) -> None:
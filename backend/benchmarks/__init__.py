@@ -0,0 +1 @@
+# CityPulse benchmark suite (see benchmarks/README.md)
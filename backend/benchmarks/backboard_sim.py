@@ -0,0 +1,189 @@
+"""
+Local Backboard simulator
+Implements the assistants/threads/messages endpoints used by app.ai_workflow so the
+API can be load-tested without touching the real Backboard service.
+
+Run standalone:
+    python -m benchmarks.backboard_sim --port 8100 --latency-ms 40 --completion-ms 300
+"""
+import argparse
+import asyncio
+import json
+import random
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse
+
+from app.schemas import ClassificationEnum, PriorityEnum, SeverityEnum
+
+ASSISTANT_NAME = "CPAssistant"
+
+
+@dataclass
+class SimConfig:
+    """Knobs for the simulated service."""
+
+    latency_ms: float = 20.0        # added to every request
+    jitter_ms: float = 10.0         # uniform +/- jitter on top of latency_ms
+    error_rate: float = 0.0         # fraction of requests answered with a 500
+    completion_ms: float = 200.0    # time until the assistant message is COMPLETED
+    clarification_rate: float = 0.1 # fraction of analyses asking for clarification
+    seed: Optional[int] = None
+
+
+def _utc_now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def fake_analysis(rng: random.Random, clarification_rate: float) -> dict:
+    """Return a plausible analyze_report payload."""
+    needs_clarification = rng.random() < clarification_rate
+    analysis = {
+        "classification": rng.choice(list(ClassificationEnum)).value,
+        "severity": rng.choice(list(SeverityEnum)).value,
+        "priority": rng.choice(list(PriorityEnum)).value,
+        "priority_score": rng.randint(0, 100),
+        "needs_clarification": needs_clarification,
+    }
+    if needs_clarification:
+        analysis["clarification"] = "Could you share a clearer photo of the issue?"
+    return analysis
+
+
+def create_app(config: Optional[SimConfig] = None) -> FastAPI:
+    config = config or SimConfig()
+    rng = random.Random(config.seed)
+    assistants: Dict[str, dict] = {}
+    threads: Dict[str, dict] = {}
+    stats = {"requests": 0, "errors": 0}
+
+    app = FastAPI(title="Backboard simulator")
+
+    @app.middleware("http")
+    async def _simulate(request: Request, call_next):
+        if request.url.path in ("/health", "/_stats"):
+            return await call_next(request)
+        stats["requests"] += 1
+        delay = config.latency_ms + rng.uniform(-config.jitter_ms, config.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+        if rng.random() < config.error_rate:
+            stats["errors"] += 1
+            return JSONResponse(status_code=500, content={"detail": "simulated failure"})
+        return await call_next(request)
+
+    @app.get("/health")
+    async def health():
+        return {"status": "healthy", "service": "backboard-sim"}
+
+    @app.get("/_stats")
+    async def get_stats():
+        return {**stats, "assistants": len(assistants), "threads": len(threads)}
+
+    @app.get("/assistants")
+    async def list_assistants():
+        return list(assistants.values())
+
+    @app.post("/assistants")
+    async def create_assistant(request: Request):
+        body = await request.json()
+        assistant_id = str(uuid.uuid4())
+        assistants[assistant_id] = {
+            "assistant_id": assistant_id,
+            "name": body.get("name", ASSISTANT_NAME),
+            "created_at": _utc_now_iso(),
+        }
+        return assistants[assistant_id]
+
+    @app.get("/assistants/{assistant_id}")
+    async def get_assistant(assistant_id: str):
+        assistant = assistants.get(assistant_id)
+        if assistant is None:
+            raise HTTPException(status_code=404, detail="Assistant not found")
+        return assistant
+
+    @app.post("/assistants/{assistant_id}/threads")
+    async def create_thread(assistant_id: str):
+        thread_id = str(uuid.uuid4())
+        threads[thread_id] = {
+            "thread_id": thread_id,
+            "assistant_id": assistant_id,
+            "created_at": _utc_now_iso(),
+            "messages": [],
+        }
+        return {"thread_id": thread_id, "created_at": threads[thread_id]["created_at"]}
+
+    @app.post("/threads/{thread_id}/messages")
+    async def add_message(thread_id: str, request: Request):
+        thread = threads.get(thread_id)
+        if thread is None:
+            raise HTTPException(status_code=404, detail="Thread not found")
+        form = await request.form()
+        files = form.getlist("files")
+        # Drain uploads so the simulator sees the same bytes the real service would.
+        for upload in files:
+            if hasattr(upload, "read"):
+                await upload.read()
+        now = asyncio.get_running_loop().time()
+        thread["messages"].append(
+            {"role": "user", "status": "COMPLETED", "content": form.get("content", "")}
+        )
+        thread["messages"].append(
+            {
+                "role": "assistant",
+                "_ready_at": now + config.completion_ms / 1000,
+                "_content": json.dumps(fake_analysis(rng, config.clarification_rate)),
+            }
+        )
+        return {"thread_id": thread_id, "status": "IN_PROGRESS"}
+
+    @app.get("/threads/{thread_id}")
+    async def get_thread(thread_id: str):
+        thread = threads.get(thread_id)
+        if thread is None:
+            raise HTTPException(status_code=404, detail="Thread not found")
+        now = asyncio.get_running_loop().time()
+        messages = []
+        for message in thread["messages"]:
+            if message["role"] != "assistant":
+                messages.append(message)
+            elif now >= message["_ready_at"]:
+                messages.append({"role": "assistant", "status": "COMPLETED", "content": message["_content"]})
+            else:
+                messages.append({"role": "assistant", "status": "IN_PROGRESS", "content": None})
+        return {"thread_id": thread_id, "created_at": thread["created_at"], "messages": messages}
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run the local Backboard simulator")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=SimConfig.latency_ms)
+    parser.add_argument("--jitter-ms", type=float, default=SimConfig.jitter_ms)
+    parser.add_argument("--error-rate", type=float, default=SimConfig.error_rate)
+    parser.add_argument("--completion-ms", type=float, default=SimConfig.completion_ms)
+    parser.add_argument("--clarification-rate", type=float, default=SimConfig.clarification_rate)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    config = SimConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        completion_ms=args.completion_ms,
+        clarification_rate=args.clarification_rate,
+        seed=args.seed,
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
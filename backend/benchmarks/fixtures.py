@@ -0,0 +1,130 @@
+"""
+Synthetic data fixtures
+Seeds a Postgres or SQLite database with N IssueTable rows (and their IssueEventTable rows).
+
+Run standalone:
+    python -m benchmarks.fixtures --database-url sqlite:///bench.db -n 10000
+"""
+import argparse
+import os
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.schemas import ClassificationEnum, PriorityEnum, ReportStatus, SeverityEnum
+
+CITIES = ["Montreal", "Toronto", "Ottawa", "Quebec", "Laval", "Gatineau", "Sherbrooke", "Longueuil"]
+STREETS = ["Main St", "King St", "Queen St", "Rue Sainte-Catherine", "Bank St", "Yonge St", "Rue Wellington"]
+# Rough bounding box around the cities above, good enough for spatial workloads.
+LAT_RANGE = (43.5, 46.9)
+LON_RANGE = (-80.0, -71.0)
+EVENT_TYPES = ["created", "status_changed", "ai_enriched", "comment"]
+
+
+def synthetic_issue(rng: random.Random, now: datetime, max_age_days: int = 365) -> dict:
+    """Build one IssueTable row as a plain dict."""
+    created = now - timedelta(seconds=rng.randint(0, max_age_days * 86400))
+    needs_clarification = rng.random() < 0.1
+    city = rng.choice(CITIES)
+    return {
+        "id": uuid.UUID(int=rng.getrandbits(128), version=4),
+        "title": f"{rng.choice(list(ClassificationEnum)).value.replace('_', ' ')} report",
+        "description": "Synthetic report generated for benchmarking. " * rng.randint(1, 4),
+        "address": f"{rng.randint(1, 9999)} {rng.choice(STREETS)}",
+        "city": city,
+        "status": rng.choices(
+            [s.value for s in ReportStatus], weights=[40, 20, 35, 5]
+        )[0],
+        "latitude": rng.uniform(*LAT_RANGE),
+        "longitude": rng.uniform(*LON_RANGE),
+        "threadId": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+        "category": rng.choice(list(ClassificationEnum)).value,
+        "severity": rng.choice(list(SeverityEnum)).value,
+        "priority": rng.choice(list(PriorityEnum)).value,
+        "priority_score": rng.randint(0, 100),
+        "needs_clarification": needs_clarification,
+        "clarification": "Can you add a photo?" if needs_clarification else None,
+        "nbOfMatches": 0,
+        "creationTime": created,
+        "updated_at": created,
+    }
+
+
+def synthetic_events(rng: random.Random, issue: dict, count: int) -> List[dict]:
+    """Build `count` IssueEventTable rows for an issue."""
+    events = []
+    for i in range(count):
+        events.append({
+            "id": uuid.UUID(int=rng.getrandbits(128), version=4),
+            "reportId": issue["id"],
+            "eventType": EVENT_TYPES[i % len(EVENT_TYPES)],
+            "payload": None,
+            "creationTime": issue["creationTime"] + timedelta(minutes=i),
+        })
+    return events
+
+
+def seed(
+    engine: Engine,
+    n: int,
+    events_per_issue: int = 2,
+    batch_size: int = 1000,
+    seed: Optional[int] = 0,
+) -> List[uuid.UUID]:
+    """
+    Create the schema if needed and insert `n` synthetic issues.
+
+    Returns the ids of the inserted issues so scenarios can pick hot sets from them.
+    """
+    # crud.triage_rank and geogrid read app settings, which require DATABASE_URL even
+    # though everything here runs on `engine`.
+    os.environ.setdefault("DATABASE_URL", engine.url.render_as_string(hide_password=False))
+    from app import crud, geogrid, models
+    from app.database import Base
+
+    Base.metadata.create_all(engine)
+
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    ids: List[uuid.UUID] = []
+    issues_table = models.IssueTable.__table__
+    events_table = models.IssueEventTable.__table__
+
+    with engine.begin() as conn:
+        for start in range(0, n, batch_size):
+            issues = [synthetic_issue(rng, now) for _ in range(min(batch_size, n - start))]
+            for issue in issues:
+                issue["triage_rank"] = crud.triage_rank(issue["priority_score"], issue["creationTime"])
+            conn.execute(issues_table.insert(), issues)
+            if events_per_issue:
+                events = [e for issue in issues for e in synthetic_events(rng, issue, events_per_issue)]
+                conn.execute(events_table.insert(), events)
+            ids.extend(issue["id"] for issue in issues)
+
+    # Rows were inserted behind crud's back, so rebuild the map tile aggregates from scratch.
+    with Session(engine) as db:
+        geogrid.rebuild(db)
+    return ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed a database with synthetic reports")
+    parser.add_argument("--database-url", required=True)
+    parser.add_argument("-n", type=int, default=10_000)
+    parser.add_argument("--events-per-issue", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    ids = seed(engine, args.n, args.events_per_issue, args.batch_size, args.seed)
+    print(f"Seeded {len(ids)} issues into {engine.url.render_as_string(hide_password=True)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Benchmark harness
+Process management, load generation and latency statistics shared by the scenarios.
+"""
+import math
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+import requests
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_health(url: str, timeout: float = 20.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(url, timeout=1).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"Service at {url} did not become healthy within {timeout}s")
+
+
+@contextmanager
+def serve(args: List[str], port: int, env: Optional[Dict[str, str]] = None) -> Iterator[str]:
+    """Run `python <args>` from the backend directory and yield its base URL once healthy."""
+    proc_env = {**os.environ, **(env or {})}
+    proc = subprocess.Popen([sys.executable, *args], cwd=BACKEND_DIR, env=proc_env)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        wait_for_health(f"{base_url}/health")
+        yield base_url
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile over an already sorted list."""
+    if not sorted_values:
+        return float("nan")
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(name: str, latencies: List[float], errors: int, elapsed: float, **extra) -> dict:
+    """Machine-readable result for one scenario; latencies are in seconds, output in ms."""
+    ordered = sorted(latencies)
+    total = len(latencies) + errors
+    return {
+        "scenario": name,
+        "requests": total,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 4),
+        "throughput_rps": round(total / elapsed, 2) if elapsed > 0 else None,
+        "latency_ms": {
+            "p50": round(percentile(ordered, 50) * 1000, 3),
+            "p95": round(percentile(ordered, 95) * 1000, 3),
+            "p99": round(percentile(ordered, 99) * 1000, 3),
+            "max": round(ordered[-1] * 1000, 3) if ordered else None,
+        },
+        **extra,
+    }
+
+
+def run_load(
+    name: str,
+    call: Callable[[requests.Session, int], bool],
+    total: int,
+    concurrency: int,
+    **extra,
+) -> dict:
+    """
+    Fire `total` calls across `concurrency` threads and summarize them.
+
+    `call(session, i)` performs request number i and returns True on success.
+    Each worker thread keeps its own requests.Session so connections are reused.
+    """
+    local = threading.local()
+    latencies: List[float] = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one(i: int) -> None:
+        nonlocal errors
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        start = time.perf_counter()
+        try:
+            ok = call(session, i)
+        except requests.RequestException:
+            ok = False
+        duration = time.perf_counter() - start
+        with lock:
+            if ok:
+                latencies.append(duration)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - started
+    return summarize(name, latencies, errors, elapsed, concurrency=concurrency, **extra)
+
+
+def git_revision() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
@@ -0,0 +1,184 @@
+"""
+Load-test scenarios
+Starts the Backboard simulator and the API against a seeded database, runs the scripted
+scenarios and prints (or writes) one JSON document that can be diffed across commits.
+
+    python -m benchmarks.scenarios --rows 20000 --output bench.json
+    python -m benchmarks.scenarios --scenarios get_hot_set,update_storm --concurrency 32
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+from datetime import datetime, timezone
+from typing import Callable, Dict, List
+
+import requests
+from sqlalchemy import create_engine
+
+from benchmarks import fixtures
+from benchmarks.harness import free_port, git_revision, run_load, serve
+from app.schemas import ReportStatus
+
+# Smallest payload that passes validators.is_valid_image (PNG signature + padding).
+TINY_PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 56
+
+
+def create_burst(base_url: str, ids: List, args) -> dict:
+    """Concurrent POST /reports, each running the full (simulated) AI pipeline."""
+    def call(session: requests.Session, i: int) -> bool:
+        resp = session.post(
+            f"{base_url}/reports",
+            data={
+                "title": f"Bench report {i}",
+                "description": "Pothole in front of the bakery",
+                "address": f"{i} Main St",
+                "city": "Montreal",
+                "latitude": "45.5",
+                "longitude": "-73.57",
+            },
+            files=[("issueImages", ("photo.png", TINY_PNG, "image/png"))],
+            timeout=60,
+        )
+        return resp.status_code == 200
+
+    return run_load("create_burst", call, args.requests, args.concurrency)
+
+
+def list_reports(base_url: str, ids: List, args) -> dict:
+    """GET /reports, alternating between the unfiltered list and each status filter."""
+    statuses = [None] + [s.value for s in ReportStatus]
+
+    def call(session: requests.Session, i: int) -> bool:
+        status = statuses[i % len(statuses)]
+        params = {"status": status} if status else None
+        resp = session.get(f"{base_url}/reports", params=params, timeout=120)
+        return resp.status_code == 200
+
+    total = max(1, args.requests // 10)
+    return run_load("list_reports", call, total, min(args.concurrency, 4))
+
+
+def get_hot_set(base_url: str, ids: List, args) -> dict:
+    """GET /reports/{id} with a skewed distribution over a small hot set."""
+    rng = random.Random(args.seed)
+    hot = rng.sample(ids, min(args.hot_set, len(ids)))
+    # Zipf-like weights: the first ids in the hot set get most of the traffic.
+    weights = [1 / (rank + 1) for rank in range(len(hot))]
+    picks = rng.choices(hot, weights=weights, k=args.requests)
+
+    def call(session: requests.Session, i: int) -> bool:
+        resp = session.get(f"{base_url}/reports/{picks[i]}", timeout=30)
+        return resp.status_code == 200
+
+    return run_load("get_hot_set", call, args.requests, args.concurrency, hot_set=len(hot))
+
+
+def update_storm(base_url: str, ids: List, args) -> dict:
+    """Concurrent PUT /reports/{id} status flips over random rows."""
+    rng = random.Random(args.seed + 1)
+    targets = [rng.choice(ids) for _ in range(args.requests)]
+    statuses = [s.value for s in ReportStatus]
+
+    def call(session: requests.Session, i: int) -> bool:
+        report_id = str(targets[i])
+        resp = session.put(
+            f"{base_url}/reports/{report_id}",
+            json={"report_id": report_id, "status": statuses[i % len(statuses)]},
+            timeout=30,
+        )
+        return resp.status_code == 200
+
+    return run_load("update_storm", call, args.requests, args.concurrency)
+
+
+SCENARIOS: Dict[str, Callable] = {
+    "create_burst": create_burst,
+    "list_reports": list_reports,
+    "get_hot_set": get_hot_set,
+    "update_storm": update_storm,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run CityPulse load-test scenarios")
+    parser.add_argument("--database-url", default=None,
+                        help="Defaults to a throwaway SQLite file")
+    parser.add_argument("--rows", type=int, default=5000, help="Synthetic issues to seed")
+    parser.add_argument("--events-per-issue", type=int, default=2)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=500, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--hot-set", type=int, default=100)
+    parser.add_argument("--sim-latency-ms", type=float, default=20.0)
+    parser.add_argument("--sim-error-rate", type=float, default=0.0)
+    parser.add_argument("--sim-completion-ms", type=float, default=200.0)
+    parser.add_argument("--app-args", default="", help="Extra arguments passed to uvicorn")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="Write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    selected = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(selected) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    tmpdir = None
+    database_url = args.database_url
+    if database_url is None:
+        tmpdir = tempfile.TemporaryDirectory(prefix="citypulse-bench-")
+        database_url = f"sqlite:///{os.path.join(tmpdir.name, 'bench.db')}"
+
+    engine = create_engine(database_url)
+    dialect = engine.dialect.name
+    ids = fixtures.seed(engine, args.rows, args.events_per_issue, seed=args.seed)
+    engine.dispose()
+
+    sim_port, app_port = free_port(), free_port()
+    sim_args = [
+        "-m", "benchmarks.backboard_sim", "--port", str(sim_port),
+        "--latency-ms", str(args.sim_latency_ms),
+        "--error-rate", str(args.sim_error_rate),
+        "--completion-ms", str(args.sim_completion_ms),
+        "--seed", str(args.seed),
+    ]
+    app_env = {
+        "DATABASE_URL": database_url,
+        "BACKBOARD_API_URL": f"http://127.0.0.1:{sim_port}",
+        "BACKBOARD_API_KEY": "bench-key",
+        "ASSISTANT_ID": "bench-assistant",
+    }
+    app_args = ["-m", "uvicorn", "app.main:app", "--port", str(app_port), "--log-level", "warning"]
+    app_args += args.app_args.split()
+
+    results = []
+    try:
+        with serve(sim_args, sim_port), serve(app_args, app_port, env=app_env) as base_url:
+            for name in selected:
+                print(f"running {name}...", file=sys.stderr)
+                results.append(SCENARIOS[name](base_url, ids, args))
+    finally:
+        if tmpdir is not None:
+            tmpdir.cleanup()
+
+    report = {
+        "git_revision": git_revision(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "database": dialect,
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "database_url")},
+        "results": results,
+    }
+    payload = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(payload + "\n")
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main()
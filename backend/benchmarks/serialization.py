@@ -0,0 +1,127 @@
+"""
+Serialization micro-benchmarks
+Compares the original report response path (ORM objects -> Pydantic from_attributes ->
+FastAPI serialize_response/jsonable_encoder -> JSONResponse) with the lean path in
+app.serialization (row tuples -> orjson), and checks that both produce identical bytes.
+
+    python -m benchmarks.serialization --rows 100,1000,10000 --repeat 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, List
+
+from sqlalchemy import create_engine, select
+
+from benchmarks import fixtures
+from benchmarks.harness import git_revision
+
+
+def _time(fn: Callable[[], bytes], repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return {
+        "min_ms": round(min(samples) * 1000, 3),
+        "median_ms": round(statistics.median(samples) * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark report response serialization")
+    parser.add_argument("--rows", default="100,1000,10000", help="Comma-separated list sizes")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+    sizes: List[int] = [int(n) for n in args.rows.split(",")]
+
+    tmpdir = tempfile.TemporaryDirectory(prefix="citypulse-serial-")
+    database_url = f"sqlite:///{os.path.join(tmpdir.name, 'bench.db')}"
+    engine = create_engine(database_url)
+    fixtures.seed(engine, max(sizes), events_per_issue=0)
+
+    # Imported after seeding so app.database picks up the fixture database.
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import serialize_response
+    from fastapi.utils import create_response_field
+    from sqlalchemy.orm import Session
+
+    from app import models
+    from app.schemas import IssueOut
+    from app.serialization import issue_out_encoder
+
+    list_field = create_response_field(name="Response", type_=List[IssueOut])
+    loop = asyncio.new_event_loop()
+
+    results = []
+    with Session(engine) as db:
+        for size in sizes:
+            def original() -> bytes:
+                reports = (
+                    db.query(models.IssueTable)
+                    .order_by(models.IssueTable.creationTime.desc())
+                    .limit(size)
+                    .all()
+                )
+                content = loop.run_until_complete(
+                    serialize_response(field=list_field, response_content=reports)
+                )
+                return JSONResponse(content).body
+
+            def lean() -> bytes:
+                rows = db.execute(
+                    select(*[models.IssueTable.__table__.c[name] for name in issue_out_encoder.fields])
+                    .order_by(models.IssueTable.creationTime.desc())
+                    .limit(size)
+                ).all()
+                return issue_out_encoder.encode_many(rows)
+
+            def original_encode_only() -> bytes:
+                content = loop.run_until_complete(
+                    serialize_response(field=list_field, response_content=cached_reports)
+                )
+                return JSONResponse(content).body
+
+            cached_reports = (
+                db.query(models.IssueTable).order_by(models.IssueTable.creationTime.desc()).limit(size).all()
+            )
+            cached_rows = db.execute(
+                select(*[models.IssueTable.__table__.c[name] for name in issue_out_encoder.fields])
+                .order_by(models.IssueTable.creationTime.desc())
+                .limit(size)
+            ).all()
+
+            identical = original() == lean()
+            db.expire_all()
+            results.append({
+                "rows": size,
+                "identical_bytes": identical,
+                "query_and_encode": {"original": _time(original, args.repeat), "lean": _time(lean, args.repeat)},
+                "encode_only": {
+                    "original": _time(original_encode_only, args.repeat),
+                    "lean": _time(lambda: issue_out_encoder.encode_many(cached_rows), args.repeat),
+                },
+            })
+            print(f"{size} rows done", file=sys.stderr)
+
+    loop.close()
+    engine.dispose()
+    tmpdir.cleanup()
+
+    payload = json.dumps({"git_revision": git_revision(), "results": results}, indent=2)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(payload + "\n")
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main()
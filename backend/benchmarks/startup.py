@@ -0,0 +1,185 @@
+"""
+Startup benchmarks
+Measures what an autoscaled container pays before and right after it starts serving:
+
+- import_time: wall-clock time of `import app.main` in a fresh interpreter, plus the slowest
+  modules reported by `python -X importtime`
+- first_response: time from process spawn until /health answers, then the latency of the
+  first and second GET /reports/{id} and POST /reports, with the lifespan warm-up enabled
+  and disabled (STARTUP_WARMUP=false)
+
+    python -m benchmarks.startup --runs 5 --output startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import requests
+from sqlalchemy import create_engine
+
+from benchmarks import fixtures
+from benchmarks.harness import BACKEND_DIR, free_port, git_revision, serve
+from benchmarks.scenarios import TINY_PNG
+
+_IMPORT_SNIPPET = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+
+
+def import_time(env: Dict[str, str], runs: int, top: int) -> dict:
+    proc_env = {**os.environ, **env}
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", _IMPORT_SNIPPET],
+            cwd=BACKEND_DIR, env=proc_env, capture_output=True, text=True, check=True,
+        )
+        samples.append(float(out.stdout.strip()))
+
+    profile = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=BACKEND_DIR, env=proc_env, capture_output=True, text=True, check=True,
+    )
+    modules = []
+    for line in profile.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = [part.strip() for part in line[len("import time:"):].split("|")]
+        modules.append({"module": name, "self_ms": int(self_us) / 1000, "cumulative_ms": int(cumulative_us) / 1000})
+    modules.sort(key=lambda m: m["self_ms"], reverse=True)
+
+    return {
+        "scenario": "import_time",
+        "runs": runs,
+        "wall_ms": {
+            "min": round(min(samples) * 1000, 1),
+            "median": round(statistics.median(samples) * 1000, 1),
+        },
+        "slowest_modules": modules[:top],
+    }
+
+
+def _wait_ready(url: str, proc: subprocess.Popen, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("API process exited during startup")
+        try:
+            if requests.get(url, timeout=1).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.005)
+    raise RuntimeError(f"{url} did not become healthy within {timeout}s")
+
+
+def _timed(call) -> float:
+    start = time.perf_counter()
+    resp = call()
+    resp.raise_for_status()
+    return (time.perf_counter() - start) * 1000
+
+
+def first_response(env: Dict[str, str], report_id: str, warmup: bool) -> dict:
+    port = free_port()
+    proc_env = {**os.environ, **env, "STARTUP_WARMUP": "true" if warmup else "false"}
+    spawned = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=proc_env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        _wait_ready(f"{base_url}/health", proc)
+        ready_ms = (time.perf_counter() - spawned) * 1000
+
+        # A fresh client per call, as for independent users hitting a new container.
+        def get():
+            return requests.get(f"{base_url}/reports/{report_id}", timeout=30)
+
+        def post():
+            return requests.post(
+                f"{base_url}/reports",
+                data={"title": "Startup", "description": "Pothole", "address": "1 Main St", "city": "Montreal"},
+                files=[("issueImages", ("photo.png", TINY_PNG, "image/png"))],
+                timeout=60,
+            )
+
+        return {
+            "ready_ms": ready_ms,
+            "first_get_ms": _timed(get),
+            "second_get_ms": _timed(get),
+            "first_post_ms": _timed(post),
+            "second_post_ms": _timed(post),
+        }
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark import time and time to first response")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--top", type=int, default=15, help="Slowest modules to report")
+    parser.add_argument("--sim-latency-ms", type=float, default=20.0)
+    parser.add_argument("--sim-completion-ms", type=float, default=200.0)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.TemporaryDirectory(prefix="citypulse-startup-")
+    database_url = f"sqlite:///{os.path.join(tmpdir.name, 'bench.db')}"
+    engine = create_engine(database_url)
+    ids = fixtures.seed(engine, args.rows, events_per_issue=0)
+    engine.dispose()
+
+    sim_port = free_port()
+    sim_args = [
+        "-m", "benchmarks.backboard_sim", "--port", str(sim_port),
+        "--latency-ms", str(args.sim_latency_ms),
+        "--completion-ms", str(args.sim_completion_ms),
+    ]
+    env = {
+        "DATABASE_URL": database_url,
+        "BACKBOARD_API_URL": f"http://127.0.0.1:{sim_port}",
+        "BACKBOARD_API_KEY": "bench-key",
+        "ASSISTANT_ID": "bench-assistant",
+        "BLOB_STORE_PATH": os.path.join(tmpdir.name, "blobs"),
+    }
+
+    results = [import_time(env, args.runs, args.top)]
+    try:
+        with serve(sim_args, sim_port):
+            for warmup in (False, True):
+                runs: List[dict] = []
+                for i in range(args.runs):
+                    print(f"first_response warmup={warmup} run {i + 1}/{args.runs}", file=sys.stderr)
+                    runs.append(first_response(env, str(ids[i % len(ids)]), warmup))
+                results.append({
+                    "scenario": "first_response",
+                    "warmup": warmup,
+                    "runs": args.runs,
+                    "median_ms": {
+                        key: round(statistics.median(run[key] for run in runs), 1) for key in runs[0]
+                    },
+                })
+    finally:
+        tmpdir.cleanup()
+
+    payload = json.dumps({"git_revision": git_revision(), "results": results}, indent=2)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(payload + "\n")
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main()
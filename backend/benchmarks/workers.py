@@ -0,0 +1,94 @@
+"""
+Worker scaling benchmark
+Runs the API under `python -m app.serve` with an increasing number of worker processes and
+measures throughput of CPU-bound read traffic (full report lists and single-report reads),
+reporting the speedup over one worker.
+
+    python -m benchmarks.workers --workers 1,2,4,8 --rows 2000 --requests 400 --concurrency 32
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+from typing import List
+
+import requests
+from sqlalchemy import create_engine
+
+from benchmarks import fixtures
+from benchmarks.harness import free_port, git_revision, run_load, serve
+
+
+def _load(base_url: str, ids: List, args) -> List[dict]:
+    def list_call(session: requests.Session, i: int) -> bool:
+        return session.get(f"{base_url}/reports", timeout=120).status_code == 200
+
+    rng = random.Random(args.seed)
+    picks = rng.choices(ids, k=args.requests)
+
+    def get_call(session: requests.Session, i: int) -> bool:
+        return session.get(f"{base_url}/reports/{picks[i]}", timeout=30).status_code == 200
+
+    return [
+        run_load("list_reports", list_call, max(1, args.requests // 10), args.concurrency),
+        run_load("get_report", get_call, args.requests, args.concurrency),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure throughput scaling with worker count")
+    parser.add_argument("--workers", default=",".join(str(n) for n in (1, 2, 4) if n <= (os.cpu_count() or 1)) or "1")
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+    counts = [int(n) for n in args.workers.split(",")]
+
+    tmpdir = tempfile.TemporaryDirectory(prefix="citypulse-workers-")
+    database_url = f"sqlite:///{os.path.join(tmpdir.name, 'bench.db')}"
+    engine = create_engine(database_url)
+    ids = fixtures.seed(engine, args.rows, events_per_issue=0, seed=args.seed)
+    engine.dispose()
+
+    env = {
+        "DATABASE_URL": database_url,
+        "BLOB_STORE_PATH": os.path.join(tmpdir.name, "blobs"),
+        "STARTUP_WARMUP": "false",  # no Backboard needed for read traffic
+    }
+
+    results = []
+    try:
+        for workers in counts:
+            print(f"workers={workers}...", file=sys.stderr)
+            port = free_port()
+            app_args = ["-m", "app.serve", "--port", str(port), "--workers", str(workers), "--log-level", "warning"]
+            with serve(app_args, port, env=env) as base_url:
+                for entry in _load(base_url, ids, args):
+                    results.append({"workers": workers, **entry})
+    finally:
+        tmpdir.cleanup()
+
+    baseline = {r["scenario"]: r["throughput_rps"] for r in results if r["workers"] == counts[0]}
+    for entry in results:
+        base = baseline.get(entry["scenario"])
+        entry["speedup"] = round(entry["throughput_rps"] / base, 2) if base else None
+
+    payload = json.dumps({
+        "git_revision": git_revision(),
+        "cpu_count": os.cpu_count(),
+        "config": {"rows": args.rows, "requests": args.requests, "concurrency": args.concurrency},
+        "results": results,
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(payload + "\n")
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Shared fixtures. Every test gets fresh SQLite databases and fresh process-wide singletons
+(settings, engines, shard router, caches), configured through environment variables the
+same way the app is.
+"""
+import os
+import sys
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DATABASE_URL", "sqlite://")  # replaced per test by the `primary` fixture
+
+from app import admission, blobstore, cache, config, crud, database, enrichment, idempotency, sharding  # noqa: E402
+from app.database import Base  # noqa: E402
+from app.schemas import Report  # noqa: E402
+
+_SINGLETONS = (
+    config.get_settings,
+    database.get_engine,
+    sharding.get_router,
+    cache.get_shared_cache,
+    idempotency.get_idempotency_store,
+    admission.get_admission,
+    enrichment.get_enrichment_queue,
+    blobstore.get_blob_store,
+)
+
+
+def reset_singletons() -> None:
+    if sharding.get_router.cache_info().currsize:
+        sharding.get_router().dispose()
+    for getter in _SINGLETONS:
+        getter.cache_clear()
+
+
+@pytest.fixture
+def configure(monkeypatch):
+    """Set environment variables (settings) for the test and rebuild the singletons."""
+    def apply(**env):
+        for name, value in env.items():
+            monkeypatch.setenv(name, str(value))
+        reset_singletons()
+    yield apply
+    reset_singletons()
+
+
+@pytest.fixture
+def primary(tmp_path, configure):
+    """URL of the primary database, with the schema created."""
+    url = f"sqlite:///{tmp_path / 'primary.db'}"
+    configure(DATABASE_URL=url, BLOB_STORE_BACKEND="memory")
+    Base.metadata.create_all(database.get_engine())
+    return url
+
+
+@pytest.fixture
+def db(primary):
+    session = database.SessionLocal(bind=database.get_engine())
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def shards(tmp_path, primary, configure):
+    """Router over the primary plus shards s2 and s3, each its own SQLite file."""
+    urls = {name: f"sqlite:///{tmp_path / (name + '.db')}" for name in ("s2", "s3")}
+    configure(SHARD_URLS=__import__("json").dumps(urls), SHARD_DIRECTORY_TTL_SECONDS=0)
+    router = sharding.get_router()
+    for name in router.names:
+        Base.metadata.create_all(router.engine(name))
+    return router
+
+
+def ai_response(**overrides) -> dict:
+    response = {
+        "classification": "pothole",
+        "severity": "high",
+        "priority": "urgent",
+        "priority_score": 80,
+        "needs_clarification": False,
+        "clarification": None,
+    }
+    response.update(overrides)
+    return response
+
+
+def make_report(db, city: str = "Montreal", latitude: float = 45.5, longitude: float = -73.6, **ai):
+    """Persist a report through crud.create_report, as the API does."""
+    return crud.create_report(
+        db=db,
+        user_report=Report(
+            title="Pothole", description="Deep pothole", address="1 Main St",
+            city=city, latitude=latitude, longitude=longitude,
+        ),
+        ai_response=ai_response(**ai),
+        report_id=uuid.uuid4(),
+        thread_id="thread",
+        creation_time=datetime.now(timezone.utc),
+    )
@@ -0,0 +1,89 @@
+import asyncio
+
+from app.admission import Admission, AdmissionMiddleware
+
+
+def _admission(**overrides) -> Admission:
+    params = dict(max_inflight=1, max_waiting=1, memory_bytes=1 << 20, target=0.05, interval=0.5)
+    params.update(overrides)
+    return Admission(**params)
+
+
+def test_waiters_queue_in_order_and_overflow_is_rejected():
+    async def scenario():
+        admission = _admission()
+        assert await admission.acquire(10)
+        waiter = asyncio.ensure_future(admission.acquire(10))
+        await asyncio.sleep(0)
+        assert admission.waiting == 1
+        assert not await admission.acquire(10)  # queue full
+
+        admission.release(10)
+        assert await waiter
+        assert admission.inflight == 1 and admission.waiting == 0
+
+    asyncio.run(scenario())
+
+
+def test_wait_is_bounded_by_the_budget():
+    async def scenario():
+        admission = _admission(interval=0.05)
+        assert await admission.acquire(10)
+        assert not await admission.acquire(10)
+        assert admission.waiting == 0
+
+    asyncio.run(scenario())
+
+
+async def _call(middleware, headers=()):
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "POST", "path": "/reports", "headers": list(headers)}
+    await middleware(scope, receive, send)
+    return sent[0]["status"], scope.get("state", {})
+
+
+def _app(status: int, pipeline_seconds=None):
+    async def app(scope, receive, send):
+        if pipeline_seconds is not None:
+            scope["state"]["pipeline_seconds"] = pipeline_seconds
+        await send({"type": "http.response.start", "status": status, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+    return app
+
+
+def test_only_inline_pipeline_runs_feed_the_latency_signal():
+    async def scenario():
+        admission = _admission()
+        assert (await _call(AdmissionMiddleware(_app(200, 2.0), admission=admission)))[0] == 200
+        assert admission.latency == 2.0
+
+        # Validation errors and idempotent replays return quickly without running the AI.
+        await _call(AdmissionMiddleware(_app(422), admission=admission))
+        await _call(AdmissionMiddleware(_app(200), admission=admission))
+        assert admission.latency == 2.0
+        assert admission.inflight == 0 and admission.reserved == 0
+
+    asyncio.run(scenario())
+
+
+def test_slow_pipeline_defers_and_full_backlog_rejects():
+    async def scenario():
+        admission = _admission(defer_latency=1.0, max_deferred=2)
+        admission.record_latency(5.0)
+
+        status, state = await _call(AdmissionMiddleware(_app(202), backlog=lambda: 0, admission=admission))
+        assert status == 202 and state["defer_enrichment"] is True
+
+        status, _ = await _call(AdmissionMiddleware(_app(202), backlog=lambda: 2, admission=admission))
+        assert status == 503
+        assert admission.latency == 5.0  # the reject is not a pipeline run
+        assert admission.inflight == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,83 @@
+import json
+
+from sqlalchemy import select
+
+from app import backfill, crud, database, models
+from app.config import get_settings
+from conftest import ai_response, make_report
+
+UNCLASSIFIED = dict(classification=None, severity=None, priority=None, priority_score=None)
+
+
+def _classifier(failing: set):
+    def classify(row, limiter=None):
+        if row.id in failing:
+            return row.id, None, {}
+        return row.id, "thread", ai_response()
+    return classify
+
+
+def test_failed_reports_are_retried_not_skipped(db, monkeypatch):
+    reports = [make_report(db, **UNCLASSIFIED) for _ in range(5)]
+    stubborn = reports[1].id
+    flt = backfill.BackfillFilter(only_missing=True)
+
+    monkeypatch.setattr(backfill, "classify_stored", _classifier({stubborn}))
+    job = backfill.run(db, "job", flt, concurrency=2, rate=0, batch_size=2)
+    assert job.status == "running"
+    assert job.processed == 5 and job.updated == 4 and job.failed == 1
+    assert json.loads(job.failedIds) == [str(stubborn)]
+    assert db.get(models.IssueTable, stubborn).category is None
+
+    # The cursor is past every row; only the retry list brings the failed one back.
+    monkeypatch.setattr(backfill, "classify_stored", _classifier(set()))
+    job = backfill.run(db, "job", flt, concurrency=2, rate=0, batch_size=2)
+    assert job.status == "done"
+    assert job.failed == 0 and json.loads(job.failedIds) == []
+    assert db.get(models.IssueTable, stubborn).category == "pothole"
+
+
+def test_transient_failure_is_retried_in_the_same_run(db, monkeypatch):
+    report = make_report(db, **UNCLASSIFIED)
+    attempts = []
+
+    def flaky(row, limiter=None):
+        attempts.append(row.id)
+        return _classifier({report.id} if len(attempts) == 1 else set())(row)
+
+    monkeypatch.setattr(backfill, "classify_stored", flaky)
+    job = backfill.run(db, "job", backfill.BackfillFilter(only_missing=True), rate=0)
+    assert attempts == [report.id, report.id]
+    assert job.status == "done" and job.updated == 1
+
+
+def test_reports_changed_during_classification_are_not_overwritten(db, monkeypatch):
+    moved, deleted, untouched = (make_report(db, **UNCLASSIFIED).id for _ in range(3))
+    seen = []
+
+    def classify(row, limiter=None):
+        if row.id not in seen:
+            seen.append(row.id)
+            # A citizen edits one report and deletes another while Backboard is busy.
+            with database.SessionLocal(bind=database.get_engine()) as other:
+                if row.id == moved:
+                    crud.update_report(other, moved, new_latitude=45.7, new_longitude=-73.4)
+                elif row.id == deleted:
+                    crud.delete_report(other, deleted)
+        return row.id, "thread", ai_response()
+
+    monkeypatch.setattr(backfill, "classify_stored", classify)
+    job = backfill.run(db, "job", backfill.BackfillFilter(only_missing=True), rate=0, batch_size=3)
+
+    assert job.status == "done" and job.updated == 2
+    assert seen.count(moved) == 1 and len(seen) == 3
+    db.expire_all()
+    report = db.get(models.IssueTable, moved)
+    assert (report.latitude, report.category) == (45.7, "pothole")  # the edit survived; retried after it
+    assert db.get(models.IssueTable, deleted) is None
+    assert db.get(models.IssueTable, untouched).category == "pothole"
+
+    cells = db.execute(select(models.GeoGridCellTable)).scalars().all()
+    assert all(cell.count >= 0 for cell in cells)
+    assert sum(cell.count for cell in cells) == 2 * (get_settings().tile_max_grid_zoom + 1)
+    assert {cell.category for cell in cells if cell.count} == {"pothole"}
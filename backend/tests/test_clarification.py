@@ -0,0 +1,35 @@
+import pytest
+from fastapi import HTTPException
+
+from app import crud, main
+from app.schemas import ReportStatus
+from conftest import ai_response, make_report
+
+QUESTION = "Could you share a clearer photo?"
+
+
+def test_answer_is_applied_once_per_question(db):
+    report = make_report(db, needs_clarification=True, clarification=QUESTION)
+    assert report.status == ReportStatus.WAITING.value
+
+    changed = crud.apply_clarification(db, report, QUESTION, "it is a pothole", ai_response(severity="low"))
+    assert "status" in changed and "severity" in changed
+    assert report.status == ReportStatus.NEW.value
+
+    assert crud.apply_clarification(db, report, QUESTION, "again", ai_response()) is None
+
+
+def test_concurrent_answer_gets_409_and_no_transaction_spans_the_ai_call(db, monkeypatch):
+    report = make_report(db, needs_clarification=True, clarification=QUESTION)
+
+    def follow_up(thread_id, answer, images):
+        assert not db.in_transaction()
+        # Another request answers the same question while this one waits on Backboard.
+        with main.get_router().report_session(report.id, for_write=True) as other:
+            crud.apply_clarification(other, crud.get_report(other, report.id), QUESTION, "first", ai_response())
+        return ai_response()
+
+    monkeypatch.setattr(main, "run_backboard_follow_up", follow_up)
+    with pytest.raises(HTTPException) as error:
+        main._answer_clarification(db, report.id, "second", [])
+    assert error.value.status_code == 409
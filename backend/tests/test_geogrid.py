@@ -0,0 +1,60 @@
+from sqlalchemy import func, select
+
+from app import crud, geogrid, models
+from app.config import get_settings
+from conftest import make_report
+
+
+def _cells(db):
+    return {
+        (c.zoom, c.cellX, c.cellY, c.category, c.severity): c.count
+        for c in db.execute(select(models.GeoGridCellTable)).scalars()
+    }
+
+
+def test_merge_deltas_combines_shared_cells_and_drops_no_ops():
+    # A few hundred metres apart: the same cell at every low zoom.
+    old = ("pothole", "high", 45.5000, -73.6000)
+    new = ("pothole", "high", 45.5010, -73.6010)
+    rows = geogrid._cell_deltas(old, -1) + geogrid._cell_deltas(new, +1)
+
+    merged = geogrid.merge_deltas(rows)
+
+    keys = [tuple(row[name] for name in geogrid._PK) for row in merged]
+    assert keys == sorted(set(keys))
+    assert len(merged) < len(rows)
+    assert all(row["count"] in (-1, 0, 1) for row in merged)
+    zooms = {row["zoom"] for row in merged if row["count"] == 0}
+    assert 0 in zooms  # same cell, position moved: only the coordinate sums change
+
+
+def test_merge_deltas_drops_rows_that_cancel_out():
+    key = ("pothole", "high", 45.5, -73.6)
+    assert geogrid.merge_deltas(geogrid._cell_deltas(key, -1) + geogrid._cell_deltas(key, +1)) == []
+
+
+def test_apply_change_keeps_counts_consistent(db):
+    report = make_report(db)
+    levels = get_settings().tile_max_grid_zoom + 1
+    assert sum(_cells(db).values()) == levels
+
+    crud.update_report(db, report.id, new_latitude=45.501, new_longitude=-73.601)
+    cells = _cells(db)
+    assert sum(cells.values()) == levels
+    assert all(count in (0, 1) for count in cells.values())
+
+    crud.delete_report(db, report.id)
+    assert sum(_cells(db).values()) == 0
+    assert geogrid.purge_empty_cells(db) > 0
+    assert db.execute(select(func.count()).select_from(models.GeoGridCellTable)).scalar() == 0
+
+
+def test_rebuild_restores_cells_of_existing_reports(db):
+    make_report(db)
+    make_report(db, latitude=45.6, longitude=-73.7, severity="low")
+    expected = _cells(db)
+    db.query(models.GeoGridCellTable).delete()
+    db.commit()
+
+    assert geogrid.rebuild(db) == 2
+    assert _cells(db) == expected
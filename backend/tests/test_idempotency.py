@@ -0,0 +1,101 @@
+import json
+import time
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from app import models
+from app.cache import MemoryCache
+from app.idempotency import STATUS_COMPLETED, STATUS_IN_PROGRESS, IdempotencyStore, _as_aware, _utc_now
+
+
+@pytest.fixture
+def store():
+    return IdempotencyStore(ttl_seconds=3600, wait_seconds=0.5, cache=MemoryCache(100), lease_seconds=60)
+
+
+def test_completed_key_is_replayed(db, store):
+    claim = store.begin(db, "key-1", "hash")
+    assert claim.replay is None
+    store.complete(db, claim, None, {"id": "report"})
+
+    assert store.begin(db, "key-1", "hash").replay == {"id": "report"}
+    fresh = IdempotencyStore(ttl_seconds=3600, wait_seconds=0.5, cache=MemoryCache(100))
+    assert fresh.begin(db, "key-1", "hash").replay == {"id": "report"}  # from the table
+
+
+def test_reused_key_with_other_payload_is_rejected(db, store):
+    store.complete(db, store.begin(db, "key-1", "hash"), None, {"id": "report"})
+    with pytest.raises(HTTPException) as error:
+        store.begin(db, "key-1", "other")
+    assert error.value.status_code == 422
+
+
+def test_running_claim_holds_a_lease_and_completion_the_ttl(db, store):
+    claim = store.begin(db, "key-1", "hash")
+    row = db.get(models.IdempotencyKeyTable, "key-1")
+    assert row.status == STATUS_IN_PROGRESS
+    assert _as_aware(row.expiresAt) <= _utc_now() + timedelta(seconds=60)
+
+    store.complete(db, claim, None, {"id": "report"})
+    db.refresh(row)
+    assert row.status == STATUS_COMPLETED
+    assert _as_aware(row.expiresAt) > _utc_now() + timedelta(seconds=3000)
+
+
+def test_live_claim_in_another_process_blocks_a_duplicate(db, store):
+    store.begin(db, "key-1", "hash")
+    other = IdempotencyStore(ttl_seconds=3600, wait_seconds=0.3, cache=MemoryCache(100), lease_seconds=60)
+    with pytest.raises(HTTPException) as error:
+        other.begin(db, "key-1", "hash")
+    assert error.value.status_code == 409
+
+
+def test_stale_claim_is_taken_over(db, store):
+    store.begin(db, "key-1", "hash")  # the worker holding it then dies
+    row = db.get(models.IdempotencyKeyTable, "key-1")
+    row.expiresAt = _utc_now() - timedelta(seconds=1)
+    db.commit()
+
+    other = IdempotencyStore(ttl_seconds=3600, wait_seconds=0.3, cache=MemoryCache(100), lease_seconds=60)
+    other._last_purge = time.monotonic()  # purge just ran; the claim path must recover the key itself
+    assert other.begin(db, "key-1", "hash").replay is None
+    db.refresh(row)
+    assert row.status == STATUS_IN_PROGRESS
+    assert _as_aware(row.expiresAt) > _utc_now()
+    assert not other._take_over(db, "key-1", "hash", "token")  # only one taker wins
+
+
+def test_running_claim_renews_its_lease(db):
+    store = IdempotencyStore(ttl_seconds=3600, wait_seconds=0.3, cache=MemoryCache(100), lease_seconds=0.3)
+    claim = store.begin(db, "key-1", "hash")
+    time.sleep(0.6)  # two lease lengths: only the heartbeat keeps the key
+
+    other = IdempotencyStore(ttl_seconds=3600, wait_seconds=0.2, cache=MemoryCache(100), lease_seconds=0.3)
+    other._last_purge = time.monotonic()
+    with pytest.raises(HTTPException) as error:
+        other.begin(db, "key-1", "hash")
+    assert error.value.status_code == 409
+
+    store.complete(db, claim, None, {"id": "report"})
+    assert other.begin(db, "key-1", "hash").replay == {"id": "report"}
+
+
+def test_taken_over_claim_cannot_store_its_response(db, store):
+    claim = store.begin(db, "key-1", "hash")
+    row = db.get(models.IdempotencyKeyTable, "key-1")
+    row.expiresAt = _utc_now() - timedelta(seconds=1)
+    db.commit()
+    other = IdempotencyStore(ttl_seconds=3600, wait_seconds=0.3, cache=MemoryCache(100), lease_seconds=60)
+    other._last_purge = time.monotonic()
+    takeover = other.begin(db, "key-1", "hash")
+
+    store.complete(db, claim, None, {"id": "first"})
+    db.refresh(row)
+    assert row.status == STATUS_IN_PROGRESS
+    assert row.claimToken == takeover.token
+
+    other.complete(db, takeover, None, {"id": "second"})
+    db.refresh(row)
+    assert json.loads(row.response) == {"id": "second"}
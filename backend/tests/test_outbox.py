@@ -0,0 +1,97 @@
+import json
+from datetime import timedelta
+
+from sqlalchemy import select
+
+from app import archive, backfill, crud, models, outbox, rebalance
+from app.schemas import ReportStatus
+from conftest import ai_response, make_report
+
+
+def _events(db, report_id=None):
+    stmt = select(models.OutboxTable).order_by(models.OutboxTable.id)
+    if report_id is not None:
+        stmt = stmt.where(models.OutboxTable.reportId == report_id)
+    return [(row.eventType, json.loads(row.payload)) for row in db.execute(stmt).scalars()]
+
+
+def test_every_write_path_publishes_an_event(db, monkeypatch):
+    report_id = make_report(db, classification=None, severity=None, priority=None, priority_score=None).id
+
+    monkeypatch.setattr(backfill, "classify_stored", lambda row, limiter=None: (row.id, "thread", ai_response()))
+    backfill.run(db, "job", backfill.BackfillFilter(only_missing=True), rate=0)
+
+    crud.claim_reports(db, crew="crew-1", limit=1, lease_seconds=60)
+    crud.release_report(db, report_id, crew="crew-1")
+    crud.claim_reports(db, crew="crew-1", limit=1, lease_seconds=60)
+    crud.update_report(db, report_id, new_status=ReportStatus.RESOLVED.value)
+    archive.archive_resolved(db, older_than=timedelta(0))
+
+    events = _events(db, report_id)
+    assert [event for event, _ in events] == [
+        outbox.CREATED, outbox.UPDATED, outbox.UPDATED, outbox.UPDATED, outbox.UPDATED,
+        outbox.UPDATED, outbox.ARCHIVED,
+    ]
+    assert events[1][1]["category"] == "pothole"  # backfill
+    assert events[2][1]["status"] == ReportStatus.IN_PROGRESS.value  # claim
+    assert events[3][1]["status"] == ReportStatus.NEW.value  # release
+    assert events[-1][1]["status"] == ReportStatus.RESOLVED.value
+
+
+def test_move_waits_for_consumers_then_announces_from_the_target(shards, monkeypatch):
+    source = shards.shard_for_city("Montreal", for_write=True)
+    target = next(name for name in shards.names if name != source)
+    with shards.session(source) as db:
+        report_id = make_report(db, city="Montreal").id
+        db.add(models.OutboxOffsetTable(consumer="gis", position=0))
+        db.commit()
+
+    # The consumer catches up only while the move is waiting for it.
+    waits = []
+
+    def deliver(seconds):
+        waits.append(seconds)
+        if not seconds:
+            return  # the settle wait
+        with shards.session(source) as db:
+            db.get(models.OutboxOffsetTable, "gis").position = 10**6
+            db.commit()
+
+    monkeypatch.setattr(rebalance.time, "sleep", deliver)
+    rebalance.move(shards, "Montreal", target, settle_seconds=0)
+    assert waits[-1] == 1.0  # it did have to wait
+
+    with shards.session(target) as db:
+        assert [event for event, _ in _events(db)] == [outbox.MOVED]
+        assert _events(db)[0][1]["id"] == str(report_id)
+
+
+def test_ready_rows_stop_at_an_open_gap():
+    rows = [models.OutboxTable(id=id) for id in (1, 2, 4, 5)]
+    assert [row.id for row in outbox.ready_rows(rows, 0, lambda expected, row: False)] == [1, 2]
+    assert [row.id for row in outbox.ready_rows(rows, 0, lambda expected, row: True)] == [1, 2, 4, 5]
+
+
+class _ListSink(outbox.Sink):
+    def __init__(self):
+        self.events = []
+
+    def deliver(self, events):
+        self.events.extend(events)
+
+
+def test_relay_delivers_past_a_rolled_back_id_on_sqlite(shards):
+    shard = shards.shard_for_city("Montreal", for_write=True)
+    with shards.session(shard) as db:
+        first = make_report(db, city="Montreal").id
+        make_report(db, city="Montreal")
+        crud.update_report(db, first, new_status=ReportStatus.RESOLVED.value)
+        # As if the middle event had been rolled back: a hole in the ids
+        db.execute(models.OutboxTable.__table__.delete().where(models.OutboxTable.id == 2))
+        db.commit()
+
+    sink = _ListSink()
+    relay = outbox.Relay("gis", sink, shards, batch_size=10, settle_seconds=3600)
+    assert relay.run_once() == 2
+    assert [(event["shard"], event["id"]) for event in sink.events] == [(shard, 1), (shard, 3)]
+    assert relay.run_once() == 0
@@ -0,0 +1,43 @@
+import io
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from app import crud, main
+from app.blobstore import get_blob_store
+from conftest import ai_response
+
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(56)
+
+
+def _upload(data: bytes) -> UploadFile:
+    return UploadFile(file=io.BytesIO(data), filename="photo.png")
+
+
+def test_failed_classification_stores_no_images(shards, monkeypatch):
+    def fail(description, issueImages):
+        raise HTTPException(status_code=502, detail="AI workflow failed")
+
+    monkeypatch.setattr(main, "_classify", fail)
+    with pytest.raises(HTTPException) as error:
+        main._run_report_pipeline(main.Report(
+            title="Pothole", description="Deep", address="1 Main St", city="Montreal",
+        ), "Deep", [_upload(PNG)])
+
+    assert error.value.status_code == 502
+    assert get_blob_store()._blobs == {}
+
+
+def test_classified_report_links_its_images(shards, monkeypatch):
+    monkeypatch.setattr(main, "_classify", lambda description, issueImages: (
+        "thread", datetime.now(timezone.utc), ai_response(),
+    ))
+    report = main._run_report_pipeline(main.Report(
+        title="Pothole", description="Deep", address="1 Main St", city="Montreal",
+    ), "Deep", [_upload(PNG)])
+
+    assert len(get_blob_store()._blobs) == 1
+    with shards.report_session(report.id) as db:
+        assert [image.size for image in crud.get_report_images(db, report.id)] == [len(PNG)]
@@ -0,0 +1,24 @@
+from app import config
+
+
+def test_default_worker_count_follows_the_cpu_quota(monkeypatch):
+    monkeypatch.setattr(config.os, "sched_getaffinity", lambda pid: set(range(64)), raising=False)
+    quota = {"/sys/fs/cgroup/cpu.max": "200000 100000"}
+    monkeypatch.setattr(config, "_read", lambda path: quota.get(path, ""))
+    assert config.available_cpus() == 2
+
+    quota.clear()
+    settings = config.Settings(database_url="sqlite://")
+    assert config.worker_count(settings) == 8  # 64 CPUs, no quota: bounded
+    assert config.worker_count(config.Settings(database_url="sqlite://", web_workers=3)) == 3
+
+
+def test_connection_budget_is_shared_by_workers_and_shards():
+    settings = config.Settings(
+        database_url="sqlite://", web_workers=4, db_connection_budget=80,
+        shard_urls={"s2": "sqlite://", "s3": "sqlite://", "s4": "sqlite://"},
+    )
+    assert config.pool_limits(settings) == (5, 0)  # 80 // (4 workers x 4 shards)
+
+    settings = config.Settings(database_url="sqlite://", web_workers=1, db_connection_budget=1000)
+    assert config.pool_limits(settings) == (5, 10)  # never above the pool settings
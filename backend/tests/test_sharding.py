@@ -0,0 +1,141 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import func, select, update
+
+from app import crud, main, models, rebalance, sharding
+from app.routing import triage
+from app.schemas import TriageClaim
+from conftest import make_report
+
+
+def _create(router, city, **kwargs):
+    shard = router.shard_for_city(city, for_write=True)
+    with router.session(shard) as db:
+        report = make_report(db, city=city, **kwargs)
+    router.remember(report.id, shard)
+    return report, shard
+
+
+def _count(router, shard, table=models.IssueTable):
+    with router.session(shard) as db:
+        return db.execute(select(func.count()).select_from(table)).scalar()
+
+
+def _cities_on_distinct_shards(router):
+    """A few city names that hash to different shards."""
+    by_shard = {}
+    for n in range(200):
+        by_shard.setdefault(router.hashed_shard(f"city {n}"), f"City {n}")
+        if len(by_shard) == len(router.names):
+            return by_shard
+    raise AssertionError("hash never reached every shard")
+
+
+def test_new_city_is_placed_once_and_recorded_on_its_shard(shards):
+    first = shards.shard_for_city("Montréal", for_write=True)
+    assert shards.shard_for_city("  MONTREAL ", for_write=True) == first
+    assert shards.directory(refresh=True)["montreal"] == (first, False)
+    with shards.session(first) as db:
+        assert db.get(models.CityShardTable, "montreal").shard == first
+
+
+def test_lists_and_lookups_gather_from_every_shard(shards):
+    created = {shard: _create(shards, city)[0] for shard, city in _cities_on_distinct_shards(shards).items()}
+    assert all(_count(shards, shard) == 1 for shard in shards.names)
+
+    listed = json.loads(main.list_reports(status=None, include_archived=False).body)
+    assert len(listed) == len(shards.names)
+    assert [row["creationTime"] for row in listed] == sorted((row["creationTime"] for row in listed), reverse=True)
+
+    for shard, report in created.items():
+        shards._locations = type(shards._locations)(10)  # forget cached locations
+        assert json.loads(main.get_report(report.id).body)["id"] == str(report.id)
+        assert shards.locate(report.id) == shard
+
+
+def test_write_fails_at_the_fence_while_the_city_is_locked(shards):
+    report, shard = _create(shards, "Montreal")
+    rebalance._place(shards, "montreal", [shard], shard=shard, locked=True)
+
+    with shards.session(shard) as db:
+        with pytest.raises(HTTPException) as error:
+            make_report(db, city="Montreal")
+        assert error.value.status_code == 503
+        with pytest.raises(HTTPException):
+            crud.update_report(db, report.id, new_title="renamed")
+    assert _count(shards, shard) == 1
+    with shards.session(shard) as db:
+        assert crud.get_report(db, report.id).title == "Pothole"
+
+
+def test_triage_claims_and_releases_fail_at_the_fence_while_the_city_is_locked(shards):
+    report, shard = _create(shards, "Montreal")
+    with shards.session(shard) as db:
+        assert len(crud.claim_reports(db, crew="crew-1", limit=1, lease_seconds=60)) == 1
+    rebalance._place(shards, "montreal", [shard], shard=shard, locked=True)
+
+    with shards.session(shard) as db:
+        with pytest.raises(HTTPException) as error:
+            crud.release_report(db, report.id, crew="crew-1")
+        assert error.value.status_code == 503
+        assert crud.get_report(db, report.id).claimed_by == "crew-1"
+        db.execute(
+            update(models.IssueTable)
+            .where(models.IssueTable.id == report.id)
+            .values(lease_expires_at=datetime.now(timezone.utc) - timedelta(seconds=1))
+        )
+        db.commit()
+        with pytest.raises(HTTPException):
+            crud.claim_reports(db, crew="crew-2", limit=1, lease_seconds=60)
+        assert crud.get_report(db, report.id).claimed_by == "crew-1"
+
+
+def test_move_copies_everything_and_deletes_only_copies(shards, monkeypatch):
+    reports = [_create(shards, "Montreal")[0] for _ in range(5)]
+    source = shards.shard_for_city("Montreal")
+    target = next(name for name in shards.names if name != source)
+    with shards.session(source) as db:
+        crud.update_report(db, reports[0].id, new_title="before the move")
+
+    # A writer that passed the fence just before the lock commits after the first copy.
+    late = []
+    copy_reports = rebalance._copy_reports
+
+    def copy_then_commit_late(src, dst, ids):
+        versions = copy_reports(src, dst, ids)
+        if not late:
+            with shards.session(source) as db, monkeypatch.context() as patch:
+                patch.setattr(sharding, "fence", lambda db, city: None)
+                late.append(make_report(db, city="Montreal").id)
+                crud.update_report(db, reports[1].id, new_title="during the move")
+        return versions
+
+    monkeypatch.setattr(rebalance, "_copy_reports", copy_then_commit_late)
+    assert rebalance.move(shards, "Montréal", target, batch_size=2, settle_seconds=0) == 6
+
+    assert _count(shards, source) == 0
+    assert _count(shards, target) == 6
+    assert shards.directory(refresh=True)["montreal"] == (target, False)
+    with shards.session(target) as db:
+        assert crud.get_report(db, late[0]) is not None
+        assert crud.get_report(db, reports[1].id).title == "during the move"
+        assert db.execute(select(func.sum(models.GeoGridCellTable.count)).where(
+            models.GeoGridCellTable.zoom == 0
+        )).scalar() == 6
+    with shards.session(source) as db:
+        assert not db.execute(select(func.sum(models.GeoGridCellTable.count))).scalar()
+
+    # A process still routing on the old directory is turned away by the source's entry.
+    with shards.session(source) as db:
+        with pytest.raises(HTTPException):
+            make_report(db, city="Montreal")
+    _create(shards, "Montreal")
+    assert _count(shards, target) == 7
+
+
+def test_claiming_for_an_unknown_city_does_not_place_it(shards):
+    assert triage.claim_work_items(TriageClaim(crew="crew-1", city="Atlantis")) == []
+    assert "atlantis" not in shards.directory()
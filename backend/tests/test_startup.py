@@ -0,0 +1,27 @@
+import os
+
+from app import startup
+
+
+def test_stale_assistant_id_is_kept_when_recreation_fails(monkeypatch):
+    monkeypatch.setenv("BACKBOARD_API_KEY", "key")
+    monkeypatch.setenv("ASSISTANT_ID", "stale")
+    monkeypatch.setattr(startup.assistant, "validate_assistant", lambda api_key, assistant_id: False)
+    monkeypatch.setattr(startup.assistant, "create_assistant", lambda: None)
+
+    assert startup.resolve_assistant() == "stale"
+    assert os.environ["ASSISTANT_ID"] == "stale"
+
+
+def test_workers_reuse_the_assistant_resolved_by_serve(configure, monkeypatch):
+    configure(ASSISTANT_RESOLVED="true", ASSISTANT_ID="resolved", STARTUP_DB_CONNECTIONS=0)
+
+    def resolve_again():
+        raise AssertionError("a worker must not resolve (and maybe create) the assistant")
+
+    monkeypatch.setattr(startup, "resolve_assistant", resolve_again)
+    warmed = []
+    monkeypatch.setattr(startup, "warm_backboard", lambda assistant_id, connections: warmed.append(assistant_id))
+
+    startup.warm_up()
+    assert warmed == ["resolved"]
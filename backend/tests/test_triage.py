@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import update
+
+from app import crud, models
+from app.schemas import ReportStatus
+from conftest import make_report
+
+
+def test_queue_orders_by_priority_and_hides_claimed_reports(db):
+    low = make_report(db, priority_score=20).id
+    high = make_report(db, priority_score=90).id
+
+    assert [report.id for report in crud.get_triage_queue(db, limit=10)] == [high, low]
+
+    claimed = crud.claim_reports(db, crew="crew-1", limit=1, lease_seconds=60)
+    assert [report.id for report in claimed] == [high]
+    assert claimed[0].claimed_by == "crew-1"
+    assert claimed[0].status == ReportStatus.IN_PROGRESS.value
+    assert [report.id for report in crud.get_triage_queue(db, limit=10)] == [low]
+
+
+def test_claim_is_exclusive_until_the_lease_expires(db):
+    report_id = make_report(db).id
+    assert len(crud.claim_reports(db, crew="crew-1", limit=5, lease_seconds=60)) == 1
+    assert crud.claim_reports(db, crew="crew-2", limit=5, lease_seconds=60) == []
+
+    # crew-1 went quiet: its lease runs out and the report is up for grabs again
+    db.execute(
+        update(models.IssueTable)
+        .where(models.IssueTable.id == report_id)
+        .values(lease_expires_at=datetime.now(timezone.utc) - timedelta(seconds=1))
+    )
+    db.commit()
+    reclaimed = crud.claim_reports(db, crew="crew-2", limit=5, lease_seconds=60)
+    assert [report.id for report in reclaimed] == [report_id]
+    assert reclaimed[0].claimed_by == "crew-2"
+
+    # The old holder can no longer release it
+    assert crud.release_report(db, report_id, crew="crew-1") is None
+
+
+def test_release_puts_the_report_back_in_the_queue(db):
+    report_id = make_report(db).id
+    crud.claim_reports(db, crew="crew-1", limit=1, lease_seconds=60)
+
+    released = crud.release_report(db, report_id, crew="crew-1")
+    assert released.claimed_by is None
+    assert released.lease_expires_at is None
+    assert released.status == ReportStatus.NEW.value
+    assert [report.id for report in crud.get_triage_queue(db, limit=10)] == [report_id]
+
+
+def test_city_scope_matches_every_spelling_of_the_city(db):
+    accented = make_report(db, city="Montréal").id
+    plain = make_report(db, city="montreal ").id
+    make_report(db, city="Laval")
+
+    for city in ("Montreal", "MONTRÉAL"):
+        assert {report.id for report in crud.get_triage_queue(db, limit=10, city=city)} == {accented, plain}
+    assert crud.get_triage_queue(db, limit=10, city="Quebec") == []
+
+
+def test_rebuild_fills_missing_ranks(db):
+    report_id = make_report(db, priority_score=90).id
+    make_report(db, priority_score=20)
+    db.execute(update(models.IssueTable).values(triage_rank=None))
+    db.commit()
+
+    assert crud.rebuild_triage_ranks(db) == 2
+    assert crud.get_triage_queue(db, limit=1)[0].id == report_id
+    assert all(report.triage_rank is not None for report in crud.get_triage_queue(db, limit=10))